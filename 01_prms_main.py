@@ -13,17 +13,34 @@ This file is self-contained and has a dependency-free fallback reports window.
 
 
 import datetime
-import sqlite3
 import os
 import sys
 import hashlib
 import json
-import datetime
 import calendar as pycalendar
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 import csv
+import queue
 import matplotlib.pyplot as plt
+from concurrent.futures import ThreadPoolExecutor
+import backfill
+from patient_store import PatientStore, day_number
+from search_query import (
+    FIELD_LABELS,
+    GENDER_CHOICES,
+    TYPE_CHOICES,
+    QueryError,
+    compile_query,
+)
+from query_cache import DetailCache
+from reminders import ReminderQueue
+from backup import BackupService
+from change_watcher import ChangeWatcher
+from write_queue import WriteQueue
+from triage import URGENT, TriageQueue, overdue_days, triage_rows
+from validation import DISEASES, ValidationError, validate_record
+from ai_helpers import RISK_LEVELS
 
 
 
@@ -36,37 +53,15 @@ SIDEBAR_IMAGE = "/mnt/data/84bdbd41-643f-4a9c-a0fc-05bd5d7f2011.png"
 SIDEBAR_BLUE = "#174f86"
 
 
-def get_conn():
-    return sqlite3.connect(DB_FILE, timeout=10)
+STORE = PatientStore(DB_FILE)
 
 
 def init_db():
-    import sqlite3
+    STORE.ensure_schema()
 
-    with sqlite3.connect(DB_FILE, timeout=15) as conn:
+    with STORE.transaction() as conn:
         cur = conn.cursor()
 
-        # Enable WAL mode (prevents locks)
-        cur.execute("PRAGMA journal_mode=WAL;")
-        cur.execute("PRAGMA foreign_keys=ON;")
-
-        cur.execute(
-            """
-        CREATE TABLE IF NOT EXISTS patients (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            age INTEGER,
-            gender TEXT,
-            phone TEXT,
-            disease TEXT,
-            chronic INTEGER,
-            admission_date TEXT,
-            notes TEXT,
-            followup_date TEXT
-        )
-        """
-        )
-
         # Insert sample data ONLY if table is empty
         cur.execute("SELECT COUNT(*) FROM patients")
         if cur.fetchone()[0] == 0:
@@ -401,166 +396,9 @@ def init_db():
                 ('Priya Singh', 38, 'Female', '9880237780', 'Depression', 1, '2022-10-13','',None)
             ]
 
-            cur.executemany(
-                """
-                INSERT INTO patients
-                (name, age, gender, phone, disease, chronic, admission_date, notes, followup_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
-                sample,
-            )
+            STORE.insert_rows(conn, sample)
 
-    conn.commit()
-    conn.close()
-
-
-DISEASES = sorted(
-    list(
-        {
-            "Hypertension",
-            "Diabetes",
-            "Coronary Artery Disease",
-            "Asthma",
-            "Chronic Obstructive Pulmonary Disease",
-            "COPD",
-            "Pneumonia",
-            "Bronchitis",
-            "Influenza",
-            "Common Cold",
-            "COVID-19",
-            "SARS-CoV-2 Infection",
-            "Tuberculosis",
-            "Hepatitis A",
-            "Hepatitis B",
-            "Hepatitis C",
-            "HIV/AIDS",
-            "Malaria",
-            "Dengue",
-            "Typhoid",
-            "Cholera",
-            "Urinary Tract Infection",
-            "UTI",
-            "Kidney Stones",
-            "Chronic Kidney Disease",
-            "CKD",
-            "Gastritis",
-            "Peptic Ulcer",
-            "Gastroesophageal Reflux Disease",
-            "GERD",
-            "Irritable Bowel Syndrome",
-            "IBS",
-            "Celiac Disease",
-            "Appendicitis",
-            "Pancreatitis",
-            "Stroke",
-            "Ischemic Stroke",
-            "Hemorrhagic Stroke",
-            "Migraine",
-            "Tension Headache",
-            "Epilepsy",
-            "Seizure Disorder",
-            "Parkinson's Disease",
-            "Alzheimer's Disease",
-            "Dementia",
-            "Multiple Sclerosis",
-            "Rheumatoid Arthritis",
-            "Osteoarthritis",
-            "Gout",
-            "Anemia",
-            "Iron Deficiency Anemia",
-            "Leukemia",
-            "Lymphoma",
-            "Breast Cancer",
-            "Lung Cancer",
-            "Colorectal Cancer",
-            "Prostate Cancer",
-            "Skin Cancer",
-            "Basal Cell Carcinoma",
-            "Melanoma",
-            "Psoriasis",
-            "Eczema",
-            "Dermatitis",
-            "Depression",
-            "Anxiety Disorder",
-            "Bipolar Disorder",
-            "Schizophrenia",
-            "Obsessive Compulsive Disorder",
-            "OCD",
-            "Autism Spectrum Disorder",
-            "Attention Deficit Hyperactivity Disorder",
-            "ADHD",
-            "Hypothyroidism",
-            "Hyperthyroidism",
-            "Goiter",
-            "Polycystic Ovary Syndrome",
-            "PCOS",
-            "Endometriosis",
-            "Infertility",
-            "Preeclampsia",
-            "Gestational Diabetes",
-            "Premature Birth Complication",
-            "Chickenpox",
-            "Measles",
-            "Mumps",
-            "Rubella",
-            "Whooping Cough",
-            "Pertussis",
-            "Ear Infection",
-            "Otitis Media",
-            "Sinusitis",
-            "Allergic Rhinitis",
-            "Allergy",
-            "Food Allergy",
-            "Anaphylaxis",
-            "Liver Cirrhosis",
-            "Fatty Liver Disease",
-            "Nonalcoholic Fatty Liver Disease",
-            "NAFLD",
-            "Alcoholic Liver Disease",
-            "Peripheral Arterial Disease",
-            "Varicose Veins",
-            "Deep Vein Thrombosis",
-            "DVT",
-            "Pulmonary Embolism",
-            "Sepsis",
-            "Cellulitis",
-            "Skin Infection",
-            "Appendicitis",
-            "Acute Respiratory Distress Syndrome",
-            "ARDS",
-            "Acute Bronchiolitis",
-            "Bronchiectasis",
-            "Eye Infection",
-            "Conjunctivitis",
-            "Glaucoma",
-            "Cataract",
-            "Periodontal Disease",
-            "Tooth Decay",
-            "Oral Cancer",
-            "Laryngitis",
-            "Thyroid Cancer",
-            "Pancreatic Cancer",
-            "Endocarditis",
-            "Myocarditis",
-            "Arrhythmia",
-            "Atrial Fibrillation",
-            "Heart Failure",
-            "Congestive Heart Failure",
-            "Heart Attack",
-            "Myocardial Infarction",
-            "Rheumatic Fever",
-            "Sickle Cell Disease",
-            "Hemophilia",
-            "Vitiligo",
-            "Nutritional Deficiency",
-            "Obesity",
-            "Metabolic Syndrome",
-        }
-    )
-)
 
-GENDER_CHOICES = ["Male", "Female", "Other"]
-TYPE_CHOICES = ["Chronic", "Acute"]
 SEARCH_FIELDS = [
     "ID",
     "Name",
@@ -570,6 +408,7 @@ SEARCH_FIELDS = [
     "Disease",
     "Type",
     "Admission Date",
+    "Risk",
 ]
 
 
@@ -876,21 +715,7 @@ class PRMSApp(tk.Tk):
             )
             return
 
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute(
-            """
-                SELECT admission_date, disease
-                FROM patients
-                WHERE LOWER(name) = LOWER(?)
-                AND phone = ?
-                ORDER BY admission_date
-            """,
-            (name, phone),
-        )
-
-        rows = cur.fetchall()
-        conn.close()
+        rows = self.store.visit_history(name, phone)
 
         if not rows:
             messagebox.showinfo(
@@ -901,7 +726,7 @@ class PRMSApp(tk.Tk):
             return
 
         msg = ""
-        for i, (adm, disease) in enumerate(rows, start=1):
+        for i, (adm, disease, _chronic) in enumerate(rows, start=1):
             msg += f"Visit {i}: {adm} | {disease}\n"
 
         messagebox.showinfo("Patient Visit History", msg, parent=self)
@@ -988,17 +813,54 @@ class PRMSApp(tk.Tk):
         self.style = ttk.Style(self)
         self.style.theme_use("clam")
         self._configure_styles()
+        self.store = STORE
+        self.detail_cache = DetailCache()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        # long-running maintenance (backfills) off the UI thread
+        self._jobs = ThreadPoolExecutor(max_workers=1)
         init_db()
 
         today = datetime.date.today()
         self.sidebar_year = today.year
         self.sidebar_month = today.month
         self._sidebar_cal_frame = None
+        self._page_more = False
+        self._page_pending = False
+        self.reminders = ReminderQueue()
+        self._reminder_job = None
+        self._reminder_win = None
+        self.triage = TriageQueue()
+        self._triage_job = None
+        # patients written while the triage queue is being (re)loaded
+        self._triage_pending = set()
+        self._triage_win = None
+        self._reports_win = None
+        # read-only copy the reports read from, started with the first report
+        self._snapshots = None
+        # every add/update/delete goes through one writer thread; its
+        # callbacks are handed back to Tk through _ui_calls
+        self.writer = WriteQueue(self.store)
+        self._ui_calls = queue.Queue()
+        # (change count, rows) behind the fallback reports window
+        self._fallback_report = None
 
         self._build_ui()
         self.load_records()
         self.protocol("WM_DELETE_WINDOW", self.on_close)
         self._update_clock()
+        self.after_idle(self._load_reminders)
+        self.after_idle(self._start_backfill)
+        # queued behind the backfill, so it sees the filled-in columns
+        self.after_idle(self._reload_triage)
+        # rows written by other workstations, patched into the table
+        self._watcher = ChangeWatcher(self.store)
+        self._watcher.start()
+        self.after(500, self._drain_changes)
+        self.after(50, self._drain_ui_calls)
+        # online backups: daily, and on demand from the sidebar
+        self._backups = BackupService(DB_FILE)
+        self._backups.start()
+        self.after(1000, self._check_backups)
 
     def _configure_styles(self):
         self.H1 = ("Segoe UI", 22, "bold")
@@ -1103,23 +965,8 @@ class PRMSApp(tk.Tk):
                     self._chart_open_recently = False
 
     def _show_disease_chart(self):
-        
-
         # ✅ USE SAME DB AS MAIN APP
-        conn = sqlite3.connect(DB_FILE)
-        cur = conn.cursor()
-
-        cur.execute(
-            """
-           SELECT disease, COUNT(*)
-           FROM patients
-           WHERE disease IS NOT NULL AND disease != ''
-           GROUP BY disease
-           ORDER BY COUNT(*) DESC
-        """
-        )
-        data = cur.fetchall()
-        conn.close()
+        data = self.store.disease_counts()
 
         if not data:
             messagebox.showinfo("Chart", "No data to plot.")
@@ -1153,7 +1000,9 @@ class PRMSApp(tk.Tk):
         sidebar = tk.Frame(parent, bg=SIDEBAR_BLUE, width=260)
         sidebar.pack(side="left", fill="y")
 
-        dashboard_btn = ttk.Button(sidebar, text="🏠 Dashboard")
+        dashboard_btn = ttk.Button(
+            sidebar, text="🏠 Dashboard", command=self.show_dashboard
+        )
         dashboard_btn.pack(fill="x", padx=20, pady=8)
 
         reports_btn = ttk.Button(sidebar, text="📊 Reports", command=self.open_reports)
@@ -1228,6 +1077,8 @@ class PRMSApp(tk.Tk):
 
         csv_btn = ttk.Button(sidebar, text="⬇ Export CSV", command=self.export_csv)
         csv_btn.pack(pady=10, padx=20, fill="x")
+        backup_btn = ttk.Button(sidebar, text="💾 Backup Now", command=self.backup_now)
+        backup_btn.pack(pady=(0, 10), padx=20, fill="x")
 
         self._sidebar_cal_frame = tk.Frame(sidebar, bg=SIDEBAR_BLUE)
         self._sidebar_cal_frame.pack(side="bottom", anchor="w", padx=8, pady=(4, 12))
@@ -1298,6 +1149,218 @@ class PRMSApp(tk.Tk):
             pass
         self.after(1000, self._update_clock)
 
+    def _start_backfill(self):
+        # fill derived columns (follow-up dates, ...) of older rows in the
+        # background; resumes where a previous session stopped
+        self._backfill_job = self._jobs.submit(self._run_backfills)
+        self.after(500, self._check_backfill)
+
+    def _run_backfills(self):
+        # worker thread: no tkinter calls in here
+        updated = backfill.run_all(self.store)
+        updated["risk"] = backfill.recompute_risk(self.store, missing_only=True)
+        return updated
+
+    def _check_backfill(self):
+        job = self._backfill_job
+        if not job.done():
+            self.after(500, self._check_backfill)
+            return
+        try:
+            updated = job.result()
+        except Exception as e:
+            print("Warning: backfill failed:", e)
+            return
+        if any(updated.values()):
+            self._load_reminders()
+            self._refresh_sidebar_calendar()
+
+    # --- follow-up reminders: one after() timer armed for the next due one ---
+    def _load_reminders(self):
+        try:
+            self.reminders.load(self.store)
+        except Exception as e:
+            print("Warning: failed to load follow-up reminders:", e)
+        self._arm_reminders()
+
+    def _arm_reminders(self):
+        if self._reminder_job is not None:
+            self.after_cancel(self._reminder_job)
+        delay = self.reminders.seconds_until_next()
+        self._reminder_job = self.after(int(delay * 1000), self._fire_reminders)
+
+    def _merge_reminder(self, patient_id, followup_date):
+        head = self.reminders.next_due()
+        self.reminders.update(patient_id, followup_date)
+        # only re-arm when the earliest reminder changed
+        if self.reminders.next_due() != head:
+            self._arm_reminders()
+
+    def _fire_reminders(self):
+        self._reminder_job = None
+        if self.reminders.expired():
+            self._load_reminders()
+            return
+        due = self.reminders.pop_due()
+        if due:
+            try:
+                self._show_reminders(self.store.followup_rows(due))
+            except Exception as e:
+                print("Warning: failed to show follow-up reminders:", e)
+        self._arm_reminders()
+
+    def _show_reminders(self, rows):
+        """One list for every reminder that fell due; later batches are
+        appended while it is open."""
+        win = self._reminder_win
+        if win is None or not win.winfo_exists():
+            win = tk.Toplevel(self)
+            win.title("Follow-ups due")
+            win.geometry("640x320")
+            win.transient(self)
+            cols = ("ID", "Name", "Phone", "Disease", "Follow-up")
+            tree = ttk.Treeview(win, columns=cols, show="headings", height=8)
+            for c, w in zip(cols, (60, 180, 120, 160, 100)):
+                tree.heading(c, text=c)
+                tree.column(c, width=w, anchor="w")
+            tree.pack(fill="both", expand=True, padx=12, pady=(12, 6))
+
+            def open_selected(ev=None):
+                sel = tree.selection()
+                if sel and sel[0] in self.tree.get_children():
+                    self.tree.selection_set(sel[0])
+                    self.tree.see(sel[0])
+
+            tree.bind("<Double-1>", open_selected)
+            ttk.Button(win, text="Close", command=win.destroy).pack(pady=(0, 12))
+            win.tree = tree
+            self._reminder_win = win
+        for pid, name, phone, disease, followup in rows:
+            if not win.tree.exists(str(pid)):
+                win.tree.insert(
+                    "",
+                    "end",
+                    iid=str(pid),
+                    values=(pid, name, phone or "", disease or "", followup),
+                )
+        win.lift()
+
+    # --- triage queue: top patients by priority, kept up to date on writes ---
+    def _reload_triage(self):
+        if self._triage_job is not None:
+            return
+        self._triage_pending = set()
+        self._triage_job = self._jobs.submit(self._load_triage)
+        self.after(200, self._check_triage)
+
+    def _load_triage(self):
+        # worker thread: builds a fresh queue, swapped in by _check_triage
+        size = self.triage.size
+        top = TriageQueue(size, self.triage.capacity - size)
+        top.load(self.store)
+        return top
+
+    def _check_triage(self):
+        job = self._triage_job
+        if not job.done():
+            self.after(200, self._check_triage)
+            return
+        self._triage_job = None
+        try:
+            self.triage = job.result()
+        except Exception as e:
+            print("Warning: failed to load triage queue:", e)
+            return
+        try:
+            self.triage.refresh(self.store, *self._triage_pending)
+        except Exception as e:
+            print("Warning: failed to update triage queue:", e)
+        self._triage_pending = set()
+        self._fill_triage()
+
+    def _merge_triage(self, *patient_ids):
+        if self._triage_job is not None:
+            self._triage_pending.update(patient_ids)
+            return
+        try:
+            self.triage.refresh(self.store, *patient_ids)
+        except Exception as e:
+            print("Warning: failed to update triage queue:", e)
+        if self.triage.stale():
+            self._reload_triage()
+        else:
+            self._fill_triage()
+
+    def show_dashboard(self):
+        win = self._triage_win
+        if win is None or not win.winfo_exists():
+            win = tk.Toplevel(self)
+            win.title("Triage")
+            win.geometry("820x420")
+            win.transient(self)
+            cols = ("#", "ID", "Name", "Phone", "Disease", "Risk", "Overdue", "Why")
+            tree = ttk.Treeview(win, columns=cols, show="headings", height=14)
+            for c, w in zip(cols, (40, 60, 160, 110, 150, 70, 70, 160)):
+                tree.heading(c, text=c)
+                tree.column(c, width=w, anchor="w")
+            tree.pack(fill="both", expand=True, padx=12, pady=(12, 6))
+
+            def open_selected(ev=None):
+                sel = tree.selection()
+                if sel and sel[0] in self.tree.get_children():
+                    self.tree.selection_set(sel[0])
+                    self.tree.see(sel[0])
+
+            tree.bind("<Double-1>", open_selected)
+            win.status = ttk.Label(win, text="")
+            win.status.pack(anchor="w", padx=12)
+            ttk.Button(win, text="Close", command=win.destroy).pack(pady=(0, 12))
+            win.tree = tree
+            self._triage_win = win
+        if self.triage.stale():
+            self._reload_triage()
+        self._fill_triage()
+        win.lift()
+
+    def _fill_triage(self):
+        win = self._triage_win
+        if win is None or not win.winfo_exists():
+            return
+        win.tree.delete(*win.tree.get_children())
+        if self._triage_job is not None:
+            win.status.config(text="Loading…")
+            return
+        today = day_number(datetime.date.today())
+        try:
+            rows = triage_rows(self.store, [pid for pid, _ in self.triage.top()])
+        except Exception as e:
+            print("Warning: failed to read triage rows:", e)
+            rows = []
+        for rank, row in enumerate(rows, 1):
+            pid, name, phone, disease, risk, advice, followup, followup_day = row
+            overdue = overdue_days(followup_day, today)
+            why = []
+            if advice == URGENT:
+                why.append("red flag in notes")
+            if overdue:
+                why.append(f"follow-up {followup}")
+            win.tree.insert(
+                "",
+                "end",
+                iid=str(pid),
+                values=(
+                    rank,
+                    pid,
+                    name,
+                    phone or "",
+                    disease or "",
+                    RISK_LEVELS[risk] if risk is not None else "",
+                    f"{overdue} d" if overdue else "",
+                    ", ".join(why),
+                ),
+            )
+        win.status.config(text=f"Top {len(rows)} patients by priority")
+
     def _render_sidebar_calendar(self, parent_frame, year=None, month=None):
         # clean
         for w in parent_frame.winfo_children():
@@ -1351,6 +1414,15 @@ class PRMSApp(tk.Tk):
         )
         hdr.pack(side="left", padx=(6, 0))
 
+        # admissions / follow-ups per day for the heatmap (cached per month)
+        try:
+            counts = self.store.calendar_counts(year, month)
+        except Exception as e:
+            print("Warning: failed to read calendar counts:", e)
+            counts = {}
+        self._calendar_generation = self.store.generation()
+        peak = max((adm for adm, _ in counts.values()), default=0)
+
         cal = pycalendar.monthcalendar(year, month)
         days_frame = tk.Frame(parent_frame, bg=SIDEBAR_BLUE)
         days_frame.pack(anchor="w", pady=(6, 0))
@@ -1371,11 +1443,13 @@ class PRMSApp(tk.Tk):
                         row=r, column=c, padx=2, pady=1
                     )
                 else:
+                    adm_count, fu_count = counts.get(day, (0, 0))
                     lbl = tk.Label(
                         days_frame,
                         text=str(day),
-                        bg="#2a66a9",
-                        fg="white",
+                        bg=self._heat_color(adm_count, peak),
+                        # follow-ups due that day are shown in yellow
+                        fg="#ffd54f" if fu_count else "white",
                         width=3,
                         font=("Helvetica", 11, "bold"),
                     )
@@ -1388,8 +1462,49 @@ class PRMSApp(tk.Tk):
 
                         return handler
 
+                    def make_click(d=day, yr=year, mo=month):
+                        return lambda ev=None: self._show_day_patients(
+                            datetime.date(yr, mo, d)
+                        )
+
+                    lbl.bind("<Button-1>", make_click())
                     lbl.bind("<Double-Button-1>", make_handler())
 
+        tk.Label(
+            parent_frame,
+            text="shade = admissions · yellow = follow-ups",
+            bg=SIDEBAR_BLUE,
+            fg="white",
+            font=("Helvetica", 9),
+        ).pack(anchor="w", padx=(6, 0), pady=(4, 0))
+
+    def _heat_color(self, count, peak):
+        # blend the plain day colour towards orange as admissions grow
+        if not count or not peak:
+            return "#2a66a9"
+        t = 0.25 + 0.75 * count / peak
+        lo = (0x2A, 0x66, 0xA9)
+        hi = (0xE4, 0x57, 0x2E)
+        return "#%02x%02x%02x" % tuple(int(a + (b - a) * t) for a, b in zip(lo, hi))
+
+    def _show_day_patients(self, day):
+        """List the patients admitted or due for follow-up on `day`."""
+        n = day_number(day)
+        # both columns are indexed, so this is a two-index OR lookup
+        self.load_records(
+            where="admission_day = ? OR followup_day = ?", params=(n, n)
+        )
+
+    def _refresh_sidebar_calendar(self):
+        if getattr(self, "_calendar_generation", None) == self.store.generation():
+            return
+        if self._sidebar_cal_frame:
+            self._render_sidebar_calendar(
+                self._sidebar_cal_frame,
+                year=self.sidebar_year,
+                month=self.sidebar_month,
+            )
+
     def _change_sidebar_month(self, delta):
         m = self.sidebar_month + delta
         y = self.sidebar_year
@@ -1702,6 +1817,11 @@ class PRMSApp(tk.Tk):
         search_btn.pack(side="left", padx=(0, 6))
         search_clear_btn = ttk.Button(search_frame, text="✖", command=self.clear_search)
         search_clear_btn.pack(side="left")
+        # searches read only the hot table unless asked for the archives
+        self.archive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            search_frame, text="Include archive", variable=self.archive_var
+        ).pack(side="left", padx=(8, 0))
 
     def _vcmd_phone(self, new_value):
         # allow empty or up to 10 digits while typing; final validation occurs on save
@@ -1747,6 +1867,8 @@ class PRMSApp(tk.Tk):
             )
             if not fpath:
                 return
+            # export every match, not just the pages loaded so far
+            self._load_all_pages()
             # gather headers from tree headings
             cols = [self.tree.heading(c)["text"] for c in self.tree["columns"]]
             with open(fpath, "w", newline="", encoding="utf-8") as fh:
@@ -1764,6 +1886,30 @@ class PRMSApp(tk.Tk):
         except Exception as e:
             messagebox.showerror("Export CSV", str(e), parent=self)
 
+    def backup_now(self):
+        self._backups.run_now()
+        self.statusbar.config(text=f"Backing up {DB_FILE} ...")
+
+    def _check_backups(self):
+        try:
+            while True:
+                result = self._backups.results.get_nowait()
+                if not result.manual:
+                    continue
+                self._update_status()
+                if result.error is not None:
+                    messagebox.showerror("Backup", str(result.error), parent=self)
+                else:
+                    messagebox.showinfo(
+                        "Backup",
+                        f"Backup verified and saved to:\n{result.path}\n"
+                        f"({result.size / 1e6:.1f} MB in {result.seconds:.1f}s)",
+                        parent=self,
+                    )
+        except queue.Empty:
+            pass
+        self.after(1000, self._check_backups)
+
     def _build_table(self, parent):
         cols = (
             "id",
@@ -1774,6 +1920,7 @@ class PRMSApp(tk.Tk):
             "disease",
             "type",
             "admission_date",
+            "risk",
         )
         self.tree = ttk.Treeview(
             parent, columns=cols, show="headings", selectmode="browse", height=12
@@ -1791,18 +1938,22 @@ class PRMSApp(tk.Tk):
             "disease": 260,
             "type": 140,
             "admission_date": 170,
+            "risk": 110,
         }
         for c in cols:
             heading = c.replace("_", " ").title()
             self.tree.heading(c, text=heading)
             self.tree.column(c, width=initial.get(c, 120), anchor="w", stretch=True)
             self.tree.grid(row=0, column=0, sticky="nsew")
+        # highest risk first, through the risk index
+        self.tree.heading("risk", command=self._sort_by_risk)
         parent.columnconfigure(0, weight=1)  # tree column stretches
         parent.rowconfigure(0, weight=1)
         parent.rowconfigure(1, weight=0)
 
         vsb = ttk.Scrollbar(parent, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscroll=vsb.set)
+        self._tree_vsb = vsb
+        self.tree.configure(yscrollcommand=self._on_tree_yscroll)
         vsb.grid(row=0, column=1, sticky="ns", padx=(6, 2))
         vsb.grid(row=0, column=1, sticky="ns", padx=(6, 2))
         # Horizontal scrollbar
@@ -1811,6 +1962,8 @@ class PRMSApp(tk.Tk):
         hsb.grid(row=1, column=0, sticky="ew", pady=(2, 0))
 
         self.tree.bind("<Double-1>", self.on_tree_double)
+        self.tree.bind("<Return>", self.on_tree_double)
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
         parent.bind("<Configure>", lambda e: self._adjust_columns_responsive())
 
     def _adjust_columns_responsive(self):
@@ -1827,6 +1980,7 @@ class PRMSApp(tk.Tk):
                 "disease": 0.22,
                 "type": 0.08,
                 "admission_date": 0.13,
+                "risk": 0.08,
             }
             s = sum(weights.values())
             for col, w in weights.items():
@@ -1835,45 +1989,192 @@ class PRMSApp(tk.Tk):
         except Exception:
             pass
 
-    def load_records(self, where=None, params=()):
+    def load_records(
+        self, where=None, params=(), hits=None, order_key="id", archive=False
+    ):
+        """Show the first page of matches; later pages load on scroll."""
+        # keep the calendar heatmap in step with writes
+        self._refresh_sidebar_calendar()
         for r in self.tree.get_children():
             self.tree.delete(r)
-        conn = get_conn()
-        cur = conn.cursor()
-        q = "SELECT id, name, age, gender, phone, disease, chronic, admission_date FROM patients"
-        if where:
-            q += " WHERE " + where
-        q += " ORDER BY id"
-        cur.execute(q, params)
-        rows = cur.fetchall()
-        i = 0
+        self._page_where = where
+        self._page_params = tuple(params)
+        self._page_hits = hits
+        self._page_order = order_key
+        self._page_archive = archive
+        self._page_cursor = None
+        self._page_more = True
+        self._page_pending = False
+        self._match_total = None
+        self._load_next_page()
+        # counting can scan the whole table (and every archive) before
+        # the cap applies: it runs on the jobs thread, not on this one
+        query = (where, self._page_params, hits, archive)
+        self._jobs.submit(
+            self._count_matches, query, self._on_ui(self._matches_counted, query)
+        )
+
+    def _load_next_page(self):
+        self._page_pending = False
+        if not self._page_more:
+            return
+        rows, cursor = self.store.search_page(
+            self._page_where,
+            self._page_params,
+            after=self._page_cursor,
+            hits=self._page_hits,
+            order_key=self._page_order,
+            archive=self._page_archive,
+        )
+        self._page_cursor = cursor
+        self._page_more = cursor is not None
+        i = len(self.tree.get_children())
         for row in rows:
-            _id, name, age, gender, phone, disease, chronic, adm = row
-            type_label = "Chronic" if chronic == 1 else "Acute"
             tag = "oddrow" if i % 2 == 0 else "evenrow"
             self.tree.insert(
-                "",
-                "end",
-                iid=str(_id),
-                values=(
-                    _id,
-                    name,
-                    age or "",
-                    gender or "",
-                    phone or "",
-                    disease or "",
-                    type_label,
-                    adm or "",
-                ),
-                tags=(tag,),
+                "", "end", iid=str(row[0]), values=self._row_values(row), tags=(tag,)
             )
             i += 1
-        conn.close()
+        self._update_status()
+
+    def _row_values(self, row):
+        _id, name, age, gender, phone, disease, chronic, adm, risk = row[:9]
+        type_label = "Chronic" if chronic == 1 else "Acute"
+        return (
+            _id,
+            name,
+            age or "",
+            gender or "",
+            phone or "",
+            disease or "",
+            type_label,
+            adm or "",
+            RISK_LEVELS[risk] if risk is not None else "",
+        )
+
+    # --- writes from other workstations (ChangeWatcher thread -> queue) ---
+    def _drain_changes(self):
+        try:
+            while True:
+                kind, ids, rows = self._watcher.events.get_nowait()
+                if kind == "reload":
+                    self.load_records(
+                        self._page_where,
+                        self._page_params,
+                        self._page_hits,
+                        self._page_order,
+                        self._page_archive,
+                    )
+                else:
+                    self._patch_rows(ids, rows)
+        except queue.Empty:
+            pass
+        except Exception as e:
+            print("Warning: failed to apply changes:", e)
+        self.after(500, self._drain_changes)
+
+    def _patch_rows(self, ids, rows):
+        """Update, remove or append just the rows that changed."""
+        by_id = {row[0]: row for row in rows}
+        # new rows are only appended to the plain listing once it is
+        # fully loaded; in a search they wait for the next search
+        filtered = self._page_where is not None or self._page_hits is not None
+        append = not filtered and self._page_order == "id" and not self._page_more
+        # in a search, a row edited so that it no longer matches leaves it
+        shown = [pid for pid in by_id if self.tree.exists(str(pid))]
+        if filtered and shown:
+            matching = {
+                row[0]
+                for row in self.store.list_rows(
+                    shown, self._page_where, self._page_params, self._page_hits
+                )
+            }
+        else:
+            matching = set(shown)
+        for pid in ids:
+            iid = str(pid)
+            row = by_id.get(pid)
+            exists = self.tree.exists(iid)
+            if row is None or (exists and pid not in matching):
+                if exists:
+                    self.tree.delete(iid)
+            elif exists:
+                self.tree.item(iid, values=self._row_values(row))
+            elif append:
+                n = len(self.tree.get_children())
+                tag = "oddrow" if n % 2 == 0 else "evenrow"
+                self.tree.insert(
+                    "", "end", iid=iid, values=self._row_values(row), tags=(tag,)
+                )
+        # one query for the whole batch, not one per id
+        self._merge_triage(*ids)
+        for pid, _name, _phone, _disease, followup in self.store.followup_rows(ids):
+            self._merge_reminder(pid, followup)
+        for pid in ids:
+            if pid not in by_id:
+                self._merge_reminder(pid, None)
+        self._update_status()
+
+    def _sort_by_risk(self):
+        # same filter as the current listing, re-paged by risk_rank; rows
+        # not scored yet are left out, a NULL key cannot be paged past
+        where = "risk_rank IS NOT NULL"
+        if self._page_where:
+            where = "(" + self._page_where + ") AND " + where
+        self.load_records(
+            where=where,
+            params=self._page_params,
+            hits=self._page_hits,
+            order_key="risk_rank",
+            archive=self._page_archive,
+        )
+
+    def _load_all_pages(self):
+        while self._page_more:
+            self._load_next_page()
+
+    def _current_query(self):
+        return (
+            self._page_where,
+            self._page_params,
+            self._page_hits,
+            self._page_archive,
+        )
+
+    def _count_matches(self, query, callback):
+        # jobs thread: skip counts for a search that has since been replaced
+        if query != self._current_query():
+            return
+        where, params, hits, archive = query
+        try:
+            total = self.store.count_capped(where, params, hits=hits, archive=archive)
+        except Exception as e:
+            callback(None, e)
+        else:
+            callback(total, None)
+
+    def _matches_counted(self, total, error, query):
+        if error is not None:
+            print("Warning: failed to count matches:", error)
+            return
+        if query != self._current_query():
+            return
+        self._match_total = total
         self._update_status()
 
     def _update_status(self):
-        total = len(self.tree.get_children())
-        self.statusbar.config(text=f"DB: {DB_FILE} · Rows: {total}")
+        loaded = len(self.tree.get_children())
+        total = getattr(self, "_match_total", None)
+        if total is None:
+            rows = f"{loaded}"
+        else:
+            count, exact = total
+            rows = f"{loaded} of {count if exact else f'{count}+'} results"
+        text = f"DB: {DB_FILE} · Rows: {rows}"
+        pending = self.writer.depth()
+        if pending:
+            text += f" · {pending} writes pending"
+        self.statusbar.config(text=text)
 
     def clear_form(self):
         """Clear inputs and ensure autocomplete widget cleared and popup hidden."""
@@ -1927,175 +2228,52 @@ class PRMSApp(tk.Tk):
             pass
         self.load_records()
 
-    def _validate_phone(self, phone):
-        return phone.isdigit() and len(phone) == 10
-
-    def _validate_name_strict(self, name):
-        # Reject if any digit in name; require at least one alphabetic character.
-        if any(ch.isdigit() for ch in name):
-            return False, "Name must not contain digits."
-        if not any(ch.isalpha() for ch in name):
-            return False, "Name must contain alphabetic characters."
-        return True, ""
-
-    def _validate_disease_strict(self, disease):
-        # Require exact match with one of DISEASES (case-insensitive match allowed)
-        if not disease:
-            return False, "Disease is required."
-        for d in DISEASES:
-            if d.lower() == disease.lower():
-                return True, d  # return canonical form
-        return False, "Disease must be chosen from suggestions (select one)."
-
-    def add_record(self):
-        """Add with validation and duplicate-check guard."""
+    def _form_fields(self):
+        """The form as the dict validation.validate_record() takes."""
+        # disease: prefer external var, fallback to widget.get()
         try:
-            name = self.name_var.get().strip()
-            age_str = self.age_var.get().strip()
-            gender = self.gender_var.get().strip()
-            phone = self.phone_var.get().strip()
-
-            # disease: prefer external var, fallback to widget.get()
+            disease = self.disease_var.get().strip()
+        except Exception:
+            disease = ""
+        if not disease and hasattr(self, "disease_entry"):
             try:
-                disease = self.disease_var.get().strip()
+                disease = self.disease_entry.get().strip()
             except Exception:
-                disease = ""
-            if not disease and hasattr(self, "disease_entry"):
-                try:
-                    disease = self.disease_entry.get().strip()
-                except Exception:
-                    disease = disease or ""
-
-            chronic = self.chronic_var.get().strip()
-            adm = self.adm_var.get().strip()
-
-            if not name:
-                messagebox.showerror(
-                    "Validation error", "Name is required.", parent=self
-                )
-                return
-
-            ok_name, reason = self._validate_name_strict(name)
-            if not ok_name:
-                messagebox.showerror("Validation error", reason, parent=self)
-                return
-
-            if gender not in ("Male", "Female", "Other"):
-                messagebox.showerror(
-                    "Validation error",
-                    "Please select a gender: Male / Female / Other.",
-                    parent=self,
-                )
-                return
-
-            if age_str:
-                try:
-                    age_val = int(age_str)
-                    if age_val <= 0 or age_val > 120:
-                        messagebox.showerror(
-                            "Validation error",
-                            "Age must be between 1 and 120.",
-                            parent=self,
-                        )
-                        return
-                    age = age_val
-                except ValueError:
-                    messagebox.showerror(
-                        "Validation error", "Age must be a valid integer.", parent=self
-                    )
-                    return
-            else:
-                age = None
-
-            if phone:
-                if not self._validate_phone(phone):
-                    messagebox.showerror(
-                        "Validation error",
-                        "Phone number must be exactly 10 digits (digits only).",
-                        parent=self,
-                    )
-                    return
+                disease = disease or ""
+        return {
+            "name": self.name_var.get(),
+            "age": self.age_var.get(),
+            "gender": self.gender_var.get(),
+            "phone": self.phone_var.get(),
+            "disease": disease,
+            "type": self.chronic_var.get(),
+            "admission_date": self.adm_var.get(),
+            "notes": self.notes_text.get("1.0", "end"),
+        }
 
-            ok_disease, d_or_msg = self._validate_disease_strict(disease)
-            if not ok_disease:
-                messagebox.showerror("Validation error", d_or_msg, parent=self)
-                return
-            disease_canonical = d_or_msg
+    def _validated_form(self):
+        """Record tuple from the form (the same checks as the API), or
+        None after showing what is wrong."""
+        try:
+            return validate_record(self._form_fields())
+        except ValidationError as e:
+            messagebox.showerror("Validation error", str(e), parent=self)
+            return None
 
-            if chronic not in TYPE_CHOICES:
-                messagebox.showerror(
-                    "Validation error",
-                    f"Type must be one of: {', '.join(TYPE_CHOICES)}.",
-                    parent=self,
-                )
+    def add_record(self):
+        """Add with validation and duplicate-check guard."""
+        try:
+            record = self._validated_form()
+            if record is None:
                 return
-            chronic_flag = 1 if chronic == "Chronic" else 0
-
-            if adm:
-                # --- Clean/validate admission date ---
-                # --- Clean/validate admission date (normalize) ---
-                adm = adm.strip() if isinstance(adm, str) else adm
-                from datetime import datetime
-
-                date_valid = True
-                try:
-                    # ensure the value has correct format YYYY-MM-DD
-                    if adm:
-                        datetime.strptime(adm, "%Y-%m-%d")
-                    else:
-                        date_valid = False
-                except Exception:
-                    date_valid = False
-
-                if not date_valid:
-                    # Option A: warn and continue (current behavior)
-                    messagebox.showwarning(
-                        "Warning",
-                        f"Admission date '{adm}' is invalid or empty. Expected YYYY-MM-DD. Proceeding anyway.",
-                        parent=self,
-                    )
-            # Option B (strict): stop saving
-            # messagebox.showerror("Invalid date", "Admission date must be YYYY-MM-DD", parent=self); return
+            name, age, _gender, phone, disease_canonical, _chronic, adm = record[:7]
+            followup_date = record[-1]
 
             # --- Unified duplicate detection (phone strong match + similar name+age+disease) ---
             try:
-                conn = get_conn()
-                cur = conn.cursor()
-                dup_list = []
-
-                # 1) Strong phone match (exact)
-                if phone:
-                    cur.execute(
-                        "SELECT id, name, age, disease, admission_date FROM patients WHERE phone = ? LIMIT 5",
-                        (phone,),
-                    )
-                    for r in cur.fetchall():
-                        dup_list.append(
-                            {
-                                "type": "phone",
-                                "id": r[0],
-                                "text": f"{r[1]} | age {r[2]} | {r[3]} | adm {r[4]}",
-                            }
-                        )
-
-                # 2) Similar records: lower(name) + disease + age (if age provided)
-                if name and disease_canonical:
-                    age_param = age if age is not None else -1
-                    cur.execute(
-                        "SELECT id, name, phone, admission_date FROM patients "
-                        "WHERE lower(name)=? AND disease=? AND (age=? OR age IS NULL) LIMIT 10",
-                        (name.lower(), disease_canonical, age_param),
-                    )
-                for r in cur.fetchall():
-                    dup_list.append(
-                        {
-                            "type": "similar",
-                            "id": r[0],
-                            "text": f"{r[1]} | phone {r[2]} | adm {r[3]}",
-                        }
-                    )
-
-                conn.close()
+                dup_list = self.store.find_duplicates(
+                    name, phone, disease_canonical, age, adm
+                )
 
                 if dup_list:
                     # Build the human-friendly lines list for popup
@@ -2155,69 +2333,12 @@ class PRMSApp(tk.Tk):
                 # If duplicate check fails for any reason, continue but log warning
                 print("Warning: duplicate check failed:", e)
 
-            # --- Suggest followup and store it ---
-
-            import ai_helpers
-
-            days = ai_helpers.suggest_followup_days(disease_canonical)
-
-            try:
-                from datetime import datetime, timedelta
-
-                followup_date = (
-                    (datetime.strptime(adm, "%Y-%m-%d") + timedelta(days=days))
-                    .date()
-                    .isoformat()
-                )
-            except Exception:
-                from datetime import date, timedelta
-
-                followup_date = (date.today() + timedelta(days=days)).isoformat()
-
-            notes = self.notes_text.get("1.0", "end").strip()
-            followup_date = ai_helpers.suggest_followup_date(adm, disease_canonical)
-
-            # insert
-            try:
-                conn = get_conn()
-                cur = conn.cursor()
-                cur.execute(
-                    "INSERT INTO patients (name, age, gender, phone, disease, chronic, admission_date, notes) VALUES (?,?,?,?,?,?,?,?)",
-                    (
-                        name,
-                        (
-                            int(age)
-                            if (isinstance(age, str) and age.strip().isdigit())
-                            else (age if isinstance(age, int) else None)
-                        ),
-                        gender,
-                        phone,
-                        disease_canonical,
-                        1 if chronic == "Chronic" else 0,
-                        adm,
-                        notes,
-                    ),
-                )
-                conn.commit()
-                conn.close()
-            except Exception as exc:
-                messagebox.showerror(
-                    "Error", f"Failed to add record: {exc}", parent=self
-                )
-                import traceback
-
-                traceback.print_exc(file=sys.stderr)
-                try:
-                    conn.close()
-                except Exception:
-                    pass
-                return
-
-            self.load_records()
-            self.clear_form()
-            messagebox.showinfo(
-                "Added", f"➕ Patient added. Follow-up: {followup_date}", parent=self
+            # insert on the writer thread; _record_added finishes up
+            self.writer.insert(
+                record,
+                callback=self._on_ui(self._record_added, followup_date),
             )
+            self._update_status()
         except Exception as exc:
             messagebox.showerror(
                 "Unexpected Error", f"Failed to add record: {exc}", parent=self
@@ -2226,6 +2347,18 @@ class PRMSApp(tk.Tk):
 
             traceback.print_exc(file=sys.stderr)
 
+    def _record_added(self, new_id, error, followup_date):
+        if error is not None:
+            messagebox.showerror("Error", f"Failed to add record: {error}", parent=self)
+            return
+        self._merge_reminder(new_id, followup_date)
+        self._merge_triage(new_id)
+        self.load_records()
+        self.clear_form()
+        messagebox.showinfo(
+            "Added", f"➕ Patient added. Follow-up: {followup_date}", parent=self
+        )
+
     def perform_search(self):
         field = (self.search_field_var.get() or "").strip()
         text = (self.search_var.get() or "").strip()
@@ -2238,117 +2371,38 @@ class PRMSApp(tk.Tk):
             )
             return
 
+        archive = self.archive_var.get()
         if text == "":
-            self.load_records()
+            self.load_records(archive=archive)
             return
 
-        where = None
-        params = ()
-
-        if field == "ID":
-            try:
-                iid = int(text)
-            except Exception:
-                messagebox.showerror(
-                    "Search error", "ID must be an integer.", parent=self
-                )
-                return
-            where = "id = ?"
-            params = (iid,)
-        elif field == "Name":
-            if any(ch.isdigit() for ch in text):
-                messagebox.showerror(
-                    "Search error",
-                    "Name search cannot contain numbers. Enter alphabetic characters only.",
-                    parent=self,
-                )
-                return
-            where = "name LIKE ?"
-            params = (f"%{text}%",)
-        elif field == "Age":
-            if "-" in text:
-                parts = text.split("-", 1)
-                try:
-                    a = int(parts[0].strip())
-                    b = int(parts[1].strip())
-                    where = "age BETWEEN ? AND ?"
-                    params = (min(a, b), max(a, b))
-                except Exception:
-                    messagebox.showerror(
-                        "Search error",
-                        "Age range invalid. Use e.g. 20-30 or a single age like 45.",
-                        parent=self,
-                    )
-                    return
-            else:
-                try:
-                    a = int(text)
-                    where = "age = ?"
-                    params = (a,)
-                except Exception:
-                    messagebox.showerror(
-                        "Search error",
-                        "Age must be a number or range (20-30).",
-                        parent=self,
-                    )
-                    return
-        elif field == "Gender":
-            if text not in GENDER_CHOICES:
-                allowed = ", ".join(GENDER_CHOICES)
-                messagebox.showerror(
-                    "Search error", f"Gender must be one of: {allowed}.", parent=self
-                )
-                return
-            where = "LOWER(gender) = LOWER(?)"
-            params = (text,)
-        elif field == "Phone":
-            where = "phone LIKE ?"
-            params = (f"%{text}%",)
-        elif field == "Disease":
-            if text.isdigit():
-                messagebox.showerror(
-                    "Search error",
-                    "Disease search cannot be numeric. Type a disease name.",
-                    parent=self,
-                )
-                return
-            where = "disease LIKE ?"
-            params = (f"%{text}%",)
-        elif field == "Type":
-            if text not in TYPE_CHOICES:
-                allowed = ", ".join(TYPE_CHOICES)
-                messagebox.showerror(
-                    "Search error", f"Type must be one of: {allowed}.", parent=self
-                )
-                return
-            where = "chronic = ?"
-            params = (1 if text == "Chronic" else 0,)
-        elif field == "Admission Date":
-            txt = text
-            if len(txt) >= 4:
-                where = "admission_date LIKE ?"
-                params = (f"{txt}%",)
-            else:
-                messagebox.showerror(
-                    "Search error",
-                    "Enter a year-month (YYYY-MM) or full date (YYYY-MM-DD) or YYYY.",
-                    parent=self,
-                )
-                return
-        else:
-            where = "(name LIKE ? OR disease LIKE ?)"
-            params = (f"%{text}%", f"%{text}%")
+        # "disease:diabetes age:50-70 ..." or plain text for the chosen field;
+        # the archives have no trigram index, so they get LIKE scans
+        try:
+            q = compile_query(
+                text,
+                FIELD_LABELS.get(field, "any"),
+                self.store.has_trigram() and not archive,
+                datetime.date.today(),
+            )
+        except QueryError as e:
+            messagebox.showerror("Search error", str(e), parent=self)
+            return
 
         try:
-            self.load_records(where=where, params=params)
+            self.load_records(
+                where=q.where,
+                params=q.params,
+                hits=q.hits,
+                order_key=q.order_key,
+                archive=archive,
+            )
         except Exception as e:
             messagebox.showerror(
                 "Search error", f"Failed to run search: {e}", parent=self
             )
 
     def update_record(self):
-        import ai_helpers
-
         sel = self.tree.selection()
         if not sel:
             messagebox.showwarning(
@@ -2357,121 +2411,30 @@ class PRMSApp(tk.Tk):
             return
         iid = sel[0]
 
-        name = self.name_var.get().strip()
-        if not name:
-            messagebox.showerror("Validation", "Name is required.", parent=self)
-            return
-
-        ok_name, reason = self._validate_name_strict(name)
-        if not ok_name:
-            messagebox.showerror("Validation error", reason, parent=self)
-            return
-
-        gender = self.gender_var.get().strip()
-        if gender not in GENDER_CHOICES:
-            messagebox.showerror(
-                "Validation",
-                "Please select a gender: Male / Female / Other.",
-                parent=self,
-            )
-            return
-
-        age_str = self.age_var.get().strip()
-        if age_str:
-            age = int(age_str)
-            if age <= 0 or age > 120:
-                messagebox.showerror("Validation", "Age must be 1–120", parent=self)
-                return
-            else:
-                age = None
-
-        try:
-            age = int(age_str) if age_str != "" else None
-        except Exception:
-            age = None
-
-        phone = self.phone_var.get().strip()
-        if phone and not self._validate_phone(phone):
-            messagebox.showerror(
-                "Validation",
-                "Phone number must be exactly 10 digits (digits only).",
-                parent=self,
-            )
+        record = self._validated_form()
+        if record is None:
             return
+        followup_date = record[-1]
+        self.writer.update(
+            int(iid),
+            record,
+            callback=self._on_ui(self._record_updated, int(iid), followup_date),
+        )
+        self._update_status()
 
-        disease = ""
-        try:
-            disease = self.disease_var.get().strip()
-        except Exception:
-            pass
-        if not disease and hasattr(self, "disease_entry"):
-            try:
-                disease = self.disease_entry.get().strip()
-            except Exception:
-                disease = disease or ""
-        ok_disease, d_or_msg = self._validate_disease_strict(disease)
-        if not ok_disease:
-            messagebox.showerror("Validation", d_or_msg, parent=self)
+    def _record_updated(self, changed, error, patient_id, followup_date):
+        if error is not None:
+            messagebox.showerror("Update failed", str(error), parent=self)
             return
-        disease_canonical = d_or_msg
-
-        chronic = self.chronic_var.get().strip()
-        if chronic not in TYPE_CHOICES:
-            messagebox.showerror(
-                "Validation",
-                f"Type must be one of: {', '.join(TYPE_CHOICES)}.",
-                parent=self,
-            )
+        if not changed:
+            self._record_missing("Update", patient_id)
             return
-        chronic_flag = 1 if chronic == "Chronic" else 0
-
-        adm = self.adm_var.get().strip()
-        notes = self.notes_text.get("1.0", "end").strip()
-        followup_date = ai_helpers.suggest_followup_date(adm, disease_canonical)
-        try:
-            conn = get_conn()
-            cur = conn.cursor()
-
-            cur.execute(
-                """
-                UPDATE patients SET
-                name = ?,
-                age = ?,
-                gender = ?,
-                phone = ?,
-                disease = ?,
-                chronic = ?,
-                admission_date = ?,
-                notes = ?,
-                followup_date = ?
-                WHERE id = ?
-                """,
-                (
-                    name,
-                    age,
-                    gender,
-                    phone,
-                    disease_canonical,
-                    chronic_flag,
-                    adm,
-                    notes,
-                    followup_date,
-                    iid,
-                ),
-            )
-
-            conn.commit()
-            self.load_records()
-            messagebox.showinfo(
-                "Updated", "✅ Patient record updated successfully.", parent=self
-            )
-        except Exception as e:
-            messagebox.showerror("Update failed", str(e), parent=self)
-        finally:
-            try:
-                conn.close()
-            except Exception:
-                pass
+        self._merge_reminder(patient_id, followup_date)
+        self._merge_triage(patient_id)
+        self.load_records()
+        messagebox.showinfo(
+            "Updated", "✅ Patient record updated successfully.", parent=self
+        )
 
     def delete_record(self):
         sel = self.tree.selection()
@@ -2481,15 +2444,62 @@ class PRMSApp(tk.Tk):
         iid = sel[0]
         if not messagebox.askyesno("Confirm", f"Delete patient id {iid}?", parent=self):
             return
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("DELETE FROM patients WHERE id=?", (int(iid),))
-        conn.commit()
-        conn.close()
+        self.writer.delete(
+            int(iid), callback=self._on_ui(self._record_deleted, int(iid))
+        )
+        self._update_status()
+
+    def _record_deleted(self, deleted, error, patient_id):
+        if error is not None:
+            messagebox.showerror("Delete failed", str(error), parent=self)
+            return
+        if not deleted:
+            self._record_missing("Delete", patient_id)
+            return
+        self._merge_reminder(patient_id, None)
+        self._merge_triage(patient_id)
         self.load_records()
         self.clear_form()
         messagebox.showinfo("Deleted", "🗑️ Patient deleted.", parent=self)
 
+    def _record_missing(self, title, patient_id):
+        # the write matched no row in the hot table: the record is either
+        # archived or was deleted by another workstation since it was shown
+        if self.store.get(patient_id) is not None:
+            messagebox.showwarning(
+                title, "Archived records are read-only.", parent=self
+            )
+            return
+        self._merge_reminder(patient_id, None)
+        self._merge_triage(patient_id)
+        self.load_records()
+        self.clear_form()
+        messagebox.showwarning(
+            title,
+            "This record no longer exists (deleted on another workstation).",
+            parent=self,
+        )
+
+    # --- writer thread -> Tk ---
+    def _on_ui(self, fn, *args):
+        """A callback(result, error), for the writer or the jobs thread,
+        that runs fn on the Tk thread."""
+        return lambda result, error: self._ui_calls.put(
+            lambda: fn(result, error, *args)
+        )
+
+    def _drain_ui_calls(self):
+        try:
+            while True:
+                call = self._ui_calls.get_nowait()
+                try:
+                    call()
+                except Exception as e:
+                    print("Warning: write completion failed:", e)
+        except queue.Empty:
+            pass
+        self.after(50, self._drain_ui_calls)
+
     def on_tree_double(self, event):
         sel = self.tree.selection()
         if not sel:
@@ -2538,36 +2548,17 @@ class PRMSApp(tk.Tk):
         # Clear notes box
         self.notes_text.delete("1.0", "end")
 
-        # Get selected row ID
-        selected = self.tree.focus()
-        vals = self.tree.item(selected, "values")
-
-        # Fetch notes directly from DB (NOT tree column)
-        conn = get_conn()
-        cur = conn.cursor()
-        cur.execute("SELECT notes FROM patients WHERE id = ?", (vals[0],))
-        row = cur.fetchone()
-        conn.close()
+        # Notes and history come from one detail query (usually prefetched)
+        detail = self._patient_detail(int(vals[0]))
+        if not detail:
+            return
 
-        if row and row[0]:
-            self.notes_text.insert("1.0", row[0])
+        if detail["notes"]:
+            self.notes_text.insert("1.0", detail["notes"])
         try:
             patient_name = vals[1]
-            patient_phone = vals[4]
-
-            conn = get_conn()
-            cur = conn.cursor()
-            cur.execute(
-                """
-                        SELECT admission_date, disease, chronic
-                        FROM patients
-                        WHERE name = ? AND phone = ?
-                        ORDER BY admission_date
-                        """,
-                (patient_name, patient_phone),
-            )
-            visits = cur.fetchall()
-            conn.close()
+
+            visits = detail["history"]
             if len(visits) > 1:
                 history_text = ""
                 for i, v in enumerate(visits, 1):
@@ -2578,14 +2569,51 @@ class PRMSApp(tk.Tk):
                         f"Disease: {v[1]}\n"
                         f"Type: {visit_type}\n\n"
                     )
-                    messagebox.showinfo(
-                        f"Visit History – {patient_name}",
-                        history_text.strip(),
-                        parent=self,
-                    )
+                messagebox.showinfo(
+                    f"Visit History – {patient_name}",
+                    history_text.strip(),
+                    parent=self,
+                )
         except Exception:
             pass
 
+    def _patient_detail(self, patient_id):
+        generation = self.store.generation()
+        detail = self.detail_cache.get(patient_id, generation)
+        if detail is None:
+            detail = self.store.patient_detail(patient_id)
+            if detail:
+                self.detail_cache.put(patient_id, generation, detail)
+        return detail
+
+    def _on_tree_select(self, event=None):
+        """Prefetch the selected row and its neighbours in the background."""
+        sel = self.tree.selection()
+        if not sel:
+            return
+        iid = sel[0]
+        generation = self.store.generation()
+        # adopt the current generation so stale entries are dropped first
+        self.detail_cache.get(int(iid), generation)
+        wanted = [
+            int(i)
+            for i in (iid, self.tree.prev(iid), self.tree.next(iid))
+            if i and int(i) not in self.detail_cache
+        ]
+        if wanted:
+            self._prefetcher.submit(self._prefetch_details, wanted, generation)
+
+    def _prefetch_details(self, patient_ids, generation):
+        # runs on the prefetch thread (its own sqlite connection)
+        for patient_id in patient_ids:
+            try:
+                detail = self.store.patient_detail(patient_id)
+            except Exception as e:
+                print("Warning: detail prefetch failed:", e)
+                return
+            if detail:
+                self.detail_cache.put(patient_id, generation, detail)
+
     def on_reset(self):
         self.load_records()
         self.clear_form()
@@ -2595,6 +2623,12 @@ class PRMSApp(tk.Tk):
         if messagebox.askyesno(
             "Confirm Exit", "Do you really want to exit the application?", parent=self
         ):
+            self._watcher.stop()
+            self._backups.stop()
+            if self._snapshots is not None:
+                self._snapshots.stop()
+            # let queued writes reach the database before exiting
+            self.writer.close(timeout=10)
             try:
                 try:
                     self.quit()
@@ -2615,17 +2649,37 @@ class PRMSApp(tk.Tk):
         else:
             return
 
+    def _report_snapshots(self):
+        if self._snapshots is None:
+            from snapshot import SnapshotService
+
+            self._snapshots = SnapshotService(self.store)
+            self._snapshots.start()
+        return self._snapshots
+
     def open_reports(self):
         """
         Try to open external prms_reports.ReportsWindow if available.
         If import fails, open an internal lightweight fallback reports window.
         """
+        # an open window keeps itself up to date; just bring it forward
+        win = self._reports_win
+        if win is not None and win.winfo_exists():
+            win.refresh()
+            win.deiconify()
+            win.lift()
+            return
         # Preferred: external module (unchanged behavior)
         try:
             import prms_reports
 
             try:
-                prms_reports.ReportsWindow(self, db_path=DB_FILE)
+                self._reports_win = prms_reports.ReportsWindow(
+                    self,
+                    db_path=DB_FILE,
+                    store=self.store,
+                    snapshots=self._report_snapshots(),
+                )
                 return
             except Exception as e:
                 messagebox.showwarning(
@@ -2638,30 +2692,18 @@ class PRMSApp(tk.Tk):
 
         # Fallback: dependency-free reports window using tkinter canvas & labels
         try:
-            conn = get_conn()
-            cur = conn.cursor()
-
-            # Gender counts
-            cur.execute("SELECT gender, COUNT(*) FROM patients GROUP BY gender")
-            gender_rows = cur.fetchall()
-
-            # Chronic vs Acute
-            cur.execute("SELECT chronic, COUNT(*) FROM patients GROUP BY chronic")
-            type_rows = cur.fetchall()
-
-            # Top diseases
-            cur.execute(
-                "SELECT disease, COUNT(*) as cnt FROM patients GROUP BY disease ORDER BY cnt DESC LIMIT 12"
-            )
-            disease_rows = cur.fetchall()
-
-            # Monthly counts (YYYY-MM)
-            cur.execute(
-                "SELECT substr(admission_date,1,7) as ym, COUNT(*) FROM patients WHERE admission_date IS NOT NULL AND admission_date != '' GROUP BY ym ORDER BY ym"
-            )
-            month_rows = cur.fetchall()
-
-            conn.close()
+            # reuse the last rows while nothing has been written anywhere
+            version = self.store.change_count()
+            cached = self._fallback_report
+            if cached is None or cached[0] != version:
+                cached = self._fallback_report = (
+                    version,
+                    self.store.gender_counts(),
+                    self.store.type_counts(),
+                    self.store.disease_counts(limit=12),
+                    self.store.monthly_counts(),
+                )
+            _, gender_rows, type_rows, disease_rows, month_rows = cached
         except Exception as e:
             messagebox.showerror(
                 "Reports error", f"Failed to read DB for reports: {e}", parent=self
@@ -2788,6 +2830,15 @@ class PRMSApp(tk.Tk):
         ttk.Label(
             summary_frame, text=f"Total patients: {total_rows}", font=self.SM
         ).pack(anchor="w", pady=(2, 2))
+        try:
+            unique, repeat = self.store.person_counts()
+            ttk.Label(
+                summary_frame,
+                text=f"Unique patients: {unique} ({repeat} with repeat visits)",
+                font=self.SM,
+            ).pack(anchor="w", pady=(2, 2))
+        except Exception:
+            pass
 
         win.update_idletasks()
         canvas_outer.configure(scrollregion=canvas_outer.bbox("all"))
@@ -1,15 +1,24 @@
 # ai_helpers.py
 # Local-only simple AI helpers
 
-import sqlite3
 import os
 from datetime import date, timedelta
 
-import os
-
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DB_FILE = os.path.join(BASE_DIR, "prms_patients.db")
 
+_store = None
+
+
+def get_store():
+    # imported here: patient_store uses the risk rules below on every write
+    from patient_store import PatientStore
+
+    global _store
+    if _store is None:
+        _store = PatientStore(DB_FILE)
+    return _store
+
 
 import re
 
@@ -154,15 +163,21 @@ def summarize_notes(text):
 
 
 # --- 3) Risk Flag (rule-based) ---
+HIGH_RISK_DISEASES = {
+    "Heart Failure",
+    "Stroke",
+    "Coronary Artery Disease",
+    "Chronic Kidney Disease",
+    "Liver Cirrhosis",
+    "Lung Cancer",
+}
+
+# stored as risk_rank: index into this tuple, so sorting puts High first
+RISK_LEVELS = ("High", "Medium", "Low")
+
+
 def risk_flag(age, disease, is_chronic):
-    high = {
-        "Heart Failure",
-        "Stroke",
-        "Coronary Artery Disease",
-        "Chronic Kidney Disease",
-        "Liver Cirrhosis",
-        "Lung Cancer",
-    }
+    high = HIGH_RISK_DISEASES
     try:
         age = int(age)
     except:
@@ -234,19 +249,22 @@ def predict_diseases(text, top=3):
 
 
 # --- New: Admission / bed recommendation (uses risk_flag) ---
+RED_FLAGS = [
+    "chest pain",
+    "shortness of breath",
+    "breathless",
+    "low bp",
+    "unconscious",
+    "severe bleeding",
+]
+
+
 def admission_recommendation(age, disease, is_chronic, notes=""):
     try:
         age = int(age)
     except Exception:
         age = 0
-    red_flags = [
-        "chest pain",
-        "shortness of breath",
-        "breathless",
-        "low bp",
-        "unconscious",
-        "severe bleeding",
-    ]
+    red_flags = RED_FLAGS
     t = (notes or "").lower()
     if any(k in t for k in red_flags):
         return "Recommend urgent admission"
@@ -256,6 +274,49 @@ def admission_recommendation(age, disease, is_chronic, notes=""):
     return "Outpatient / Monitor"
 
 
+# --- Vectorized versions for re-scoring the whole table ---
+def risk_rank_array(ages, diseases, chronic):
+    """
+    risk_flag over whole columns at once, as RISK_LEVELS indexes
+    (0 High, 1 Medium, 2 Low).
+
+    ages must already be ints (risk_flag's int(age), 0 when that fails),
+    diseases strings, chronic truth values.
+    """
+    import numpy as np
+
+    ages = np.asarray(ages, dtype=np.int64)
+    chronic = np.asarray(chronic, dtype=bool)
+    diseases = np.asarray(diseases, dtype=object)
+    high = (
+        np.isin(diseases, list(HIGH_RISK_DISEASES))
+        | (chronic & (ages >= 55))
+        | (ages >= 65)
+    )
+    medium = chronic | (ages >= 50)
+    return np.where(high, 0, np.where(medium, 1, 2))
+
+
+def admission_recommendation_array(ranks, notes):
+    """admission_recommendation for whole columns, given risk_rank_array()
+    and the notes (None for none)."""
+    import numpy as np
+
+    ranks = np.asarray(ranks)
+    # note by note: a fixed-width string array would be sized to the
+    # longest note times the row count
+    urgent = np.fromiter(
+        (bool(n) and any(f in n.lower() for f in RED_FLAGS) for n in notes),
+        dtype=bool,
+        count=len(ranks),
+    )
+    return np.where(
+        urgent,
+        "Recommend urgent admission",
+        np.where(ranks == 0, "Recommend admission", "Outpatient / Monitor"),
+    )
+
+
 # --- New: Follow-up suggestion mapping ---
 FOLLOWUP_MAP = {
     "Dengue-like": 7,
@@ -356,20 +417,7 @@ def find_similar_patients(age, disease):
         age = int(age)
     except:
         return []
-    conn = sqlite3.connect(DB_FILE)
-    cur = conn.cursor()
-    cur.execute(
-        """
-    SELECT id, name, age, gender, phone, disease, admission_date
-    FROM patients
-    WHERE disease = ?
-      AND ABS(age - ?) <= 5
-    """,
-        (disease, age),
-    )
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    return get_store().find_similar(age, disease)
 
 
 def suggest_followup_date(admission_date, disease):
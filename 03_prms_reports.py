@@ -7,15 +7,20 @@ Install: python3 -m pip install matplotlib numpy
 """
 
 import os
-import sqlite3
 import datetime
+import math
+import time
 import textwrap
+from collections import namedtuple
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
 
+from patient_store import PatientStore
+from report_stats import GENDERS, engine_for
+
 
 def generate_insights(stats):
     insights = []
@@ -40,16 +45,442 @@ def generate_insights(stats):
         ]
         if top:
             insights.append("Top diseases: " + ", ".join([t[0] for t in top]))
+    if stats.get("repeat_patients"):
+        insights.append(
+            f"{stats['repeat_patients']} of {stats['unique_patients']} patients "
+            "have repeat visits."
+        )
     if not insights:
         insights.append("No significant trends detected.")
     return insights
 
 
+def wrap_labels(names, width=20):
+    """Wrap long labels to multiple lines so they don't get clipped."""
+    return [textwrap.fill(n, width=width) for n in names]
+
+
+# --- charts ---
+# draw(ax, stats) draws one chart on an empty Axes and returns the artists
+# to keep (None when there is nothing to update, e.g. "No data");
+# update(ax, artists, stats) changes them to new stats in place and
+# returns False when the chart's shape changed and it must be redrawn.
+def _pie(ax, labels, sizes, startangle=0):
+    wedges, texts, autotexts = ax.pie(
+        sizes,
+        labels=labels,
+        autopct="%1.1f%%",
+        startangle=startangle,
+        textprops={"fontsize": 10},
+    )
+    return {
+        "labels": labels,
+        "startangle": startangle,
+        "wedges": wedges,
+        "texts": texts,
+        "autotexts": autotexts,
+    }
+
+
+def _update_pie(artists, labels, sizes):
+    """Move the wedges and their labels the way ax.pie() places them."""
+    total = float(sum(sizes))
+    if artists is None or artists["labels"] != labels or not total:
+        return False
+    theta = artists["startangle"]
+    for wedge, text, auto, size in zip(
+        artists["wedges"], artists["texts"], artists["autotexts"], sizes
+    ):
+        span = 360.0 * size / total
+        wedge.set_theta1(theta)
+        wedge.set_theta2(theta + span)
+        mid = math.radians(theta + span / 2)
+        x, y = math.cos(mid), math.sin(mid)
+        text.set_position((1.1 * x, 1.1 * y))
+        text.set_horizontalalignment("left" if x > 0 else "right")
+        auto.set_position((0.6 * x, 0.6 * y))
+        auto.set_text("%1.1f%%" % (100.0 * size / total))
+        theta += span
+    return True
+
+
+def _update_bars(ax, artists, names, values, horizontal=False):
+    """New bar lengths for the same categories; rescales the value axis."""
+    if artists is None or artists["names"] != names:
+        return False
+    for bar, v in zip(artists["bars"], values):
+        if horizontal:
+            bar.set_width(v)
+        else:
+            bar.set_height(v)
+    ax.relim()
+    ax.autoscale_view()
+    return True
+
+
+def _gender_series(stats):
+    return list(stats["gender_counts"].keys()), list(stats["gender_counts"].values())
+
+
+def draw_gender(ax, stats):
+    labels, sizes = _gender_series(stats)
+    artists = None
+    if sum(sizes) == 0:
+        ax.text(0.5, 0.5, "No gender data available", ha="center", va="center")
+    else:
+        artists = _pie(ax, labels, sizes, startangle=140)
+    ax.set_title("Gender Distribution", fontsize=12)
+    return artists
+
+
+def update_gender(ax, artists, stats):
+    return _update_pie(artists, *_gender_series(stats))
+
+
+def draw_type(ax, stats):
+    vals = [stats["chronic"], stats["acute"]]
+    labels2 = ["Chronic", "Acute"]
+    artists = None
+    if sum(vals) == 0:
+        ax.text(0.5, 0.5, "No chronic/acute data", ha="center", va="center")
+    else:
+        artists = _pie(ax, labels2, vals)
+    ax.set_title("Chronic vs Acute Cases", fontsize=12)
+    return artists
+
+
+def update_type(ax, artists, stats):
+    vals = [stats["chronic"], stats["acute"]]
+    return _update_pie(artists, ["Chronic", "Acute"], vals)
+
+
+def _top_diseases(stats, n):
+    return sorted(stats["disease_counts"].items(), key=lambda x: x[1], reverse=True)[
+        :n
+    ]
+
+
+def draw_top_diseases(ax, stats):
+    # wrap labels; the caller enlarges the left margin
+    items = _top_diseases(stats, 20)
+    if not items:
+        ax.text(0.5, 0.5, "No disease data", ha="center", va="center")
+        return None
+    names = [i[0] for i in items]
+    vals = [i[1] for i in items]
+    wrapped = wrap_labels(names, width=22)
+    y = np.arange(len(wrapped))
+    bars = ax.barh(y, vals)
+    ax.set_yticks(y)
+    ax.set_yticklabels(wrapped, fontsize=10)
+    ax.invert_yaxis()
+    ax.set_xlabel("Number of patients", fontsize=11)
+    ax.set_title("Top 20 Diseases", fontsize=12)
+    return {"names": names, "bars": bars}
+
+
+def update_top_diseases(ax, artists, stats):
+    items = _top_diseases(stats, 20)
+    return _update_bars(
+        ax, artists, [i[0] for i in items], [i[1] for i in items], horizontal=True
+    )
+
+
+def _gender_split(stats, top_diseases):
+    by_disease = stats["gender_by_disease"]
+    return [
+        [by_disease.get(d, {}).get(g, 0) for d in top_diseases] for g in GENDERS
+    ]
+
+
+def draw_disease_by_gender(ax, stats):
+    top_diseases = [d for d, _ in _top_diseases(stats, 10)]
+    if not top_diseases:
+        ax.text(0.5, 0.5, "No data", ha="center", va="center")
+        return None
+    x = np.arange(len(top_diseases))
+    bottom = np.zeros(len(top_diseases))
+    colors = ["#4daf4a", "#377eb8", "#ff7f00"]
+    stacks = []
+    for i, (g, vals) in enumerate(zip(GENDERS, _gender_split(stats, top_diseases))):
+        stacks.append(
+            ax.bar(x, vals, bottom=bottom, label=g, color=colors[i % len(colors)])
+        )
+        bottom = bottom + np.array(vals)
+    wrapped = wrap_labels(top_diseases, width=18)
+    ax.set_xticks(x)
+    ax.set_xticklabels(wrapped, rotation=30, ha="right", fontsize=10)
+    ax.set_title("Disease by Gender (Top 10)", fontsize=12)
+    ax.legend()
+    return {"names": top_diseases, "stacks": stacks}
+
+
+def update_disease_by_gender(ax, artists, stats):
+    top_diseases = [d for d, _ in _top_diseases(stats, 10)]
+    if artists is None or artists["names"] != top_diseases:
+        return False
+    bottom = np.zeros(len(top_diseases))
+    for bars, vals in zip(artists["stacks"], _gender_split(stats, top_diseases)):
+        for bar, b, v in zip(bars, bottom, vals):
+            bar.set_xy((bar.get_x(), b))
+            bar.set_height(v)
+            # ax.bar() pins autoscaling to each bar's bottom
+            bar.sticky_edges.y[:] = [b]
+        bottom = bottom + np.array(vals)
+    ax.relim()
+    ax.autoscale_view()
+    return True
+
+
+def draw_ages(ax, stats, title="Age Distribution"):
+    bins = stats["age_bins"]
+    hist = stats["age_hist"]
+    if not hist.any():
+        ax.text(0.5, 0.5, "No age data", ha="center", va="center")
+        return None
+    # counts are already binned; one weighted sample per bin
+    _, _, patches = ax.hist(bins[:-1], bins=bins, weights=hist)
+    ax.set_xlabel("Age", fontsize=11)
+    ax.set_ylabel("Number of patients", fontsize=11)
+    ax.set_title(title, fontsize=12)
+    ax.tick_params(axis="x", labelsize=10)
+    ax.tick_params(axis="y", labelsize=10)
+    return {"names": list(bins), "bars": patches}
+
+
+def update_ages(ax, artists, stats):
+    if not stats["age_hist"].any():
+        return False
+    return _update_bars(ax, artists, list(stats["age_bins"]), stats["age_hist"])
+
+
+def draw_monthly(ax, stats, title="Patient entries per month (last 12 months)"):
+    months = list(stats["monthly_counts"].keys())
+    vals = list(stats["monthly_counts"].values())
+    if sum(vals) == 0:
+        ax.text(0.5, 0.5, "No monthly entries", ha="center", va="center")
+        return None
+    x = np.arange(len(months))
+    bars = ax.bar(x, vals)
+    ax.set_xticks(x)
+    ax.set_xticklabels(months, rotation=45, ha="right", fontsize=10)
+    ax.set_ylabel("Number of entries", fontsize=11)
+    ax.set_title(title, fontsize=12)
+    ax.tick_params(axis="y", labelsize=10)
+    return {"names": months, "bars": bars}
+
+
+def update_monthly(ax, artists, stats):
+    vals = list(stats["monthly_counts"].values())
+    if sum(vals) == 0:
+        return False
+    return _update_bars(ax, artists, list(stats["monthly_counts"].keys()), vals)
+
+
+def _top_avg_ages(stats):
+    avg = stats["avg_age_by_disease"]
+    return sorted(avg.items(), key=lambda x: x[1], reverse=True)[:10]
+
+
+def draw_avg_age(ax, stats):
+    items = _top_avg_ages(stats)
+    if not items:
+        ax.text(0.5, 0.5, "No average age data", ha="center", va="center")
+        return None
+    names = [i[0] for i in items]
+    vals = [i[1] for i in items]
+    wrapped = wrap_labels(names, width=18)
+    x = np.arange(len(wrapped))
+    bars = ax.bar(x, vals)
+    ax.set_xticks(x)
+    ax.set_xticklabels(wrapped, rotation=35, ha="right", fontsize=10)
+    ax.set_ylabel("Average age", fontsize=11)
+    ax.set_title("Average Age by Disease (top diseases)", fontsize=12)
+    ax.tick_params(axis="y", labelsize=10)
+    return {"names": names, "bars": bars}
+
+
+def update_avg_age(ax, artists, stats):
+    items = _top_avg_ages(stats)
+    return _update_bars(ax, artists, [i[0] for i in items], [i[1] for i in items])
+
+
+# inputs(stats) is the part of the stats a chart shows; the chart is only
+# touched on refresh when it changed
+ChartSpec = namedtuple("ChartSpec", "title subtitle figsize adjust draw update inputs")
+
+CHARTS = [
+    ChartSpec(
+        "Gender Distribution",
+        "Share of Male / Female / Other patients.",
+        (10, 2.8),
+        {"bottom": 0.15},
+        draw_gender,
+        update_gender,
+        lambda s: s["gender_counts"],
+    ),
+    ChartSpec(
+        "Chronic vs Acute",
+        "Percentage split between chronic and acute patients.",
+        (10, 2.8),
+        {"bottom": 0.15},
+        draw_type,
+        update_type,
+        lambda s: (s["chronic"], s["acute"]),
+    ),
+    ChartSpec(
+        "Top Diseases",
+        "Most common diseases in the database (top 20).",
+        (10, 5),
+        {"left": 0.28, "bottom": 0.12},
+        draw_top_diseases,
+        update_top_diseases,
+        lambda s: _top_diseases(s, 20),
+    ),
+    ChartSpec(
+        "Disease by Gender",
+        "Stacked bar showing gender composition per disease (top 10).",
+        (10, 4.2),
+        {"bottom": 0.20},
+        draw_disease_by_gender,
+        update_disease_by_gender,
+        lambda s: s["gender_by_disease"],
+    ),
+    ChartSpec(
+        "Age Distribution",
+        "Histogram of patient ages (bins of 5 years).",
+        (10, 3.4),
+        {"bottom": 0.12},
+        draw_ages,
+        update_ages,
+        lambda s: s["age_hist"].tolist(),
+    ),
+    ChartSpec(
+        "Patient entries per month",
+        "Count of patient admissions across the last 12 months.",
+        (10, 3.6),
+        {"bottom": 0.25},
+        draw_monthly,
+        update_monthly,
+        lambda s: s["monthly_counts"],
+    ),
+    ChartSpec(
+        "Average age by disease",
+        "Shows average patient age for top diseases (requires ≥2 samples per disease).",
+        (10, 3.8),
+        {"bottom": 0.22},
+        draw_avg_age,
+        update_avg_age,
+        _top_avg_ages,
+    ),
+]
+
+
+# A4 landscape, in inches
+PDF_PAGE = (11.69, 8.27)
+
+
+def _summary_page(stats, insights, month):
+    fig = Figure(figsize=PDF_PAGE)
+    fig.text(0.06, 0.93, f"PRMS report — {month}", fontsize=20, weight="bold")
+    fig.text(
+        0.06,
+        0.89,
+        "Generated " + datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
+        fontsize=10,
+        color="#555555",
+    )
+    text = "\n".join(textwrap.fill("• " + i, width=110) for i in insights)
+    fig.text(0.06, 0.84, text, fontsize=11, va="top")
+
+    rows = [
+        ["Records", stats["total"]],
+        ["Distinct patients", stats["unique_patients"]],
+        ["Patients with repeat visits", stats["repeat_patients"]],
+        ["Chronic", stats["chronic"]],
+        ["Acute", stats["acute"]],
+    ]
+    rows += [[f"Gender: {g}", c] for g, c in stats["gender_counts"].items()]
+    rows += [[f"Admissions {m}", c] for m, c in stats["monthly_counts"].items()][-3:]
+    rows += [
+        [f"Disease: {d}", c] for d, c in list(stats["disease_counts"].items())[:5]
+    ]
+    ax = fig.add_axes([0.06, 0.05, 0.55, 0.6])
+    ax.axis("off")
+    table = ax.table(
+        cellText=[[label, f"{value:,}"] for label, value in rows],
+        colLabels=["Summary", "Count"],
+        colWidths=[0.7, 0.3],
+        cellLoc="left",
+        loc="upper left",
+    )
+    table.auto_set_font_size(False)
+    table.set_fontsize(10)
+    table.scale(1, 1.3)
+    return fig
+
+
+def _disease_page(name, detail):
+    fig = Figure(figsize=PDF_PAGE)
+    genders = ", ".join(f"{g} {c:,}" for g, c in detail["gender_counts"].items())
+    fig.suptitle(
+        f"{name} — {detail['total']:,} records "
+        f"({detail['chronic']:,} chronic, {detail['acute']:,} acute; {genders})",
+        fontsize=13,
+    )
+    draw_ages(fig.add_subplot(211), detail, title=f"Age Distribution — {name}")
+    draw_monthly(
+        fig.add_subplot(212), detail, title=f"Admissions per month — {name}"
+    )
+    return fig
+
+
+def _pdf_pages(engine, disease_pages, month):
+    """Figures for the PDF, one at a time: each is built only after the
+    previous one has been written and released."""
+    stats = engine.compute()
+    yield _summary_page(stats, generate_insights(stats), month)
+    for spec in CHARTS:
+        fig = Figure(figsize=PDF_PAGE)
+        spec.draw(fig.add_subplot(111), stats)
+        fig.tight_layout()
+        fig.subplots_adjust(**spec.adjust)
+        yield fig
+    names = list(stats["disease_counts"])[:disease_pages]
+    for name, detail in engine.disease_breakdown(names).items():
+        yield _disease_page(name, detail)
+
+
+def write_pdf_report(path, store, disease_pages=10, month=None):
+    """
+    Write the summary, every chart and one page per top disease into a
+    single PDF, streamed through PdfPages.  Returns the number of pages.
+    """
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    month = month or datetime.date.today().strftime("%Y-%m")
+    pages = 0
+    with PdfPages(path, metadata={"Title": f"PRMS report {month}"}) as pdf:
+        for fig in _pdf_pages(engine_for(store), disease_pages, month):
+            pdf.savefig(fig)
+            # drop the artists now; only one page is ever held in memory
+            fig.clear()
+            pages += 1
+    return pages
+
+
 DEFAULT_DB = os.path.join(os.path.expanduser("~"), "prms_patients.db")
+# how often an open window looks for writes (PRAGMA data_version: no I/O)
+WATCH_MS = 2000
 
 
-def get_conn(db_path):
-    return sqlite3.connect(os.path.expanduser(db_path))
+def freshness_text(age, behind):
+    """Header text for a report drawn from a snapshot."""
+    minutes = int(age // 60)
+    when = "just now" if minutes < 1 else f"{minutes} min ago"
+    if behind:
+        return f"Snapshot taken {when} · {behind} changes since"
+    return f"Snapshot taken {when} · up to date"
 
 
 class ScrollableFrame(ttk.Frame):
@@ -76,15 +507,66 @@ class ScrollableFrame(ttk.Frame):
         self.canvas = canvas
 
 
+class ChartPanel:
+    """
+    One chart in the window.  The Figure, Axes, canvas and artists live as
+    long as the window; refresh() updates the artists' data in place and
+    redraws only when the chart's inputs changed.
+    """
+
+    def __init__(self, window, spec, stats):
+        self.spec = spec
+        self.fig = Figure(figsize=spec.figsize, dpi=110, constrained_layout=False)
+        self.ax = self.fig.add_subplot(111)
+        self.artists = spec.draw(self.ax, stats)
+        self.inputs = spec.inputs(stats)
+        self.canvas = window.add_chart(
+            spec.title, spec.subtitle, self.fig, adjust_kwargs=spec.adjust
+        )
+
+    def refresh(self, stats):
+        """True when the chart changed and was redrawn."""
+        inputs = self.spec.inputs(stats)
+        if inputs == self.inputs:
+            return False
+        self.inputs = inputs
+        if not self.spec.update(self.ax, self.artists, stats):
+            # different categories or shape: draw again on the same Axes
+            self.ax.clear()
+            self.artists = self.spec.draw(self.ax, stats)
+            try:
+                self.fig.tight_layout()
+                self.fig.subplots_adjust(**self.spec.adjust)
+            except Exception:
+                pass
+        self.canvas.draw_idle()
+        return True
+
+
 class ReportsWindow(tk.Toplevel):
-    def __init__(self, parent, db_path=DEFAULT_DB):
+    def __init__(self, parent, db_path=DEFAULT_DB, store=None, snapshots=None):
         super().__init__(parent)
         self.parent = parent
         self.db_path = os.path.expanduser(db_path)
+        # share the app's store (and its query cache) when one is passed in
+        self.store = store or PatientStore(self.db_path)
+        # with a snapshot.SnapshotService the charts read its read-only
+        # copy instead, and follow it as new snapshots are published
+        self.snapshots = snapshots
+        self._snapshot = None
+        self._fresh_label = None
+        if snapshots is not None and snapshots.current is not None:
+            self._snapshot = snapshots.current
+            self.store = self._snapshot.store
         self.title("📊 Reports — Patient Analytics")
         self.geometry("1100x800")
         self.configure(background="#f7f7fb")
         self._figs = []
+        self._panels = []
+        self._insights_label = None
+        self._shown = None
+        self._generation = None
+        self._watch_job = None
 
         header = ttk.Frame(self, padding=(8, 8))
         header.pack(fill="x")
@@ -94,6 +576,11 @@ class ReportsWindow(tk.Toplevel):
         ttk.Label(header, text=f"DB: {self.db_path}", font=("Helvetica", 10)).pack(
             side="right"
         )
+        if snapshots is not None:
+            self._fresh_label = ttk.Label(
+                header, text="", font=("Helvetica", 10), foreground="#555555"
+            )
+            self._fresh_label.pack(side="right", padx=(0, 16))
 
         # scrollable area for vertical charts
         self.scroll = ScrollableFrame(self)
@@ -102,12 +589,19 @@ class ReportsWindow(tk.Toplevel):
         # footer
         footer = ttk.Frame(self, padding=(8, 8))
         footer.pack(fill="x")
-        ttk.Button(footer, text="🔁 Refresh", command=self.render).pack(
+        ttk.Button(footer, text="🔁 Refresh", command=self.refresh).pack(
             side="left", padx=6
         )
         ttk.Button(
             footer, text="💾 Export All Charts", command=self.export_charts
         ).pack(side="left", padx=6)
+        ttk.Button(footer, text="📄 Export PDF", command=self.export_pdf).pack(
+            side="left", padx=6
+        )
+        if snapshots is not None:
+            ttk.Button(
+                footer, text="📸 Re-snapshot", command=self.snapshots.run_now
+            ).pack(side="left", padx=6)
         ttk.Button(footer, text="Close", command=self.destroy).pack(
             side="right", padx=6
         )
@@ -117,101 +611,67 @@ class ReportsWindow(tk.Toplevel):
         except Exception as e:
             messagebox.showerror("Reports Error", f"Failed to render reports: {e}")
             self.destroy()
+            return
+        self._show_freshness()
+        self._watch_job = self.after(WATCH_MS, self._watch)
 
-    def gather_stats(self):
-        conn = get_conn(self.db_path)
-        cur = conn.cursor()
-
-        # gender counts
-        cur.execute("SELECT gender, COUNT(1) FROM patients GROUP BY gender")
-        gender_counts = {
-            row[0] if row[0] else "Unknown": row[1] for row in cur.fetchall()
-        }
-
-        # chronic/acute
-        cur.execute("SELECT chronic, COUNT(1) FROM patients GROUP BY chronic")
-        chronic = 0
-        acute = 0
-        for flag, cnt in cur.fetchall():
-            if flag == 1:
-                chronic = cnt
-            else:
-                acute = cnt
-
-        # disease counts
-        cur.execute(
-            "SELECT disease, COUNT(1) FROM patients GROUP BY disease ORDER BY COUNT(1) DESC"
-        )
-        disease_counts = {row[0]: row[1] for row in cur.fetchall() if row[0]}
-
-        # monthly counts (YYYY-MM)
-        cur.execute(
-            "SELECT admission_date FROM patients WHERE admission_date IS NOT NULL AND admission_date != ''"
-        )
-        monthly = {}
-        for (ad,) in cur.fetchall():
-            if not ad:
-                continue
-            key = ad.strip()[:7]
-            if len(key) >= 7 and key[4] == "-":
-                key = key[:7]
-            else:
-                key = datetime.date.today().strftime("%Y-%m")
-            monthly[key] = monthly.get(key, 0) + 1
-
-        # age list and avg age per disease
-        cur.execute("SELECT age, disease FROM patients WHERE age IS NOT NULL")
-        ages = []
-        ages_by_disease = {}
-        for age, disease in cur.fetchall():
-            if age is None:
-                continue
+    def _show_freshness(self):
+        if self._fresh_label is None:
+            return
+        if self.snapshots.busy:
+            text = "Taking a new snapshot…"
+        elif self._snapshot is None:
+            text = "Live data (no snapshot yet)"
+        else:
+            behind = self.snapshots.live.change_count() - self._snapshot.changes
+            text = freshness_text(time.time() - self._snapshot.taken_at, behind)
+        self._fresh_label.config(text=text)
+
+    def _watch(self):
+        self._watch_job = None
+        if self.snapshots is not None:
+            # snapshot mode: the copy never changes, switch to newer ones
             try:
-                a = int(age)
-            except Exception:
-                continue
-            ages.append(a)
-            if disease:
-                ages_by_disease.setdefault(disease, []).append(a)
-
-        conn.close()
-
-        # prepare monthly for last 12 months
-        today = datetime.date.today()
-        last12 = []
-        for n in range(11, -1, -1):
-            yr = today.year
-            mo = today.month - n
-            while mo <= 0:
-                mo += 12
-                yr -= 1
-            last12.append(f"{yr:04d}-{mo:02d}")
-        monthly_counts = {k: monthly.get(k, 0) for k in last12}
-
-        avg_age_by_disease = {
-            d: sum(lst) / len(lst)
-            for d, lst in ages_by_disease.items()
-            if len(lst) >= 2
-        }
-
-        return {
-            "gender_counts": gender_counts,
-            "chronic": chronic,
-            "acute": acute,
-            "disease_counts": disease_counts,
-            "monthly_counts": monthly_counts,
-            "ages": ages,
-            "avg_age_by_disease": avg_age_by_disease,
-        }
+                current = self.snapshots.current
+                if current is not None and current is not self._snapshot:
+                    self._snapshot = current
+                    self.store = current.store
+                    self.refresh()
+                self._show_freshness()
+            except Exception as e:
+                print("Warning: reports snapshot refresh failed:", e)
+            self._watch_job = self.after(WATCH_MS, self._watch)
+            return
+        # data_version moves on any commit by another connection, our own
+        # writes bump the store's counter; only then is the persistent
+        # change count read, and the charts refreshed if it moved
+        try:
+            generation = self.store.generation()
+            if generation != self._generation:
+                self._generation = generation
+                shown = self._shown["version"] if self._shown else None
+                if self.store.change_count() != shown:
+                    self.refresh()
+        except Exception as e:
+            print("Warning: reports auto-refresh failed:", e)
+        self._watch_job = self.after(WATCH_MS, self._watch)
+
+    def destroy(self):
+        if self._watch_job is not None:
+            self.after_cancel(self._watch_job)
+            self._watch_job = None
+        super().destroy()
+
+    def gather_stats(self):
+        # column arrays are read once and reused until the data changes
+        return engine_for(self.store).compute()
 
     def clear_reports_area(self):
         for w in self.scroll.frame.winfo_children():
             w.destroy()
         self._figs = []
-
-    def _wrap_labels(self, names, width=20):
-        """Wrap long labels to multiple lines so they don't get clipped."""
-        return [textwrap.fill(n, width=width) for n in names]
+        self._panels = []
+        self._insights_label = None
 
     def add_chart(self, title, subtitle, fig, adjust_kwargs=None):
         container = ttk.Frame(self.scroll.frame, padding=(8, 8))
@@ -249,187 +709,28 @@ class ReportsWindow(tk.Toplevel):
             ttk.Label(
                 banner, text="Auto Insights:", font=("Helvetica", 12, "bold")
             ).pack(side="left")
-            ttk.Label(
+            self._insights_label = ttk.Label(
                 banner, text="  ".join(insights[:3]), font=("Helvetica", 10)
-            ).pack(side="left", padx=(6, 0))
-
-        # 1. Gender pie
-        fig = Figure(figsize=(10, 2.8), dpi=110, constrained_layout=False)
-        ax = fig.add_subplot(111)
-        labels = list(stats["gender_counts"].keys())
-        sizes = list(stats["gender_counts"].values())
-        if sum(sizes) == 0:
-            ax.text(0.5, 0.5, "No gender data available", ha="center", va="center")
-        else:
-            ax.pie(
-                sizes,
-                labels=labels,
-                autopct="%1.1f%%",
-                startangle=140,
-                textprops={"fontsize": 10},
             )
-        ax.set_title("Gender Distribution", fontsize=12)
-        self.add_chart(
-            "Gender Distribution",
-            "Share of Male / Female / Other patients.",
-            fig,
-            adjust_kwargs={"bottom": 0.15},
-        )
-
-        # 2. Chronic vs Acute
-        fig = Figure(figsize=(10, 2.8), dpi=110, constrained_layout=False)
-        ax = fig.add_subplot(111)
-        vals = [stats["chronic"], stats["acute"]]
-        labels2 = ["Chronic", "Acute"]
-        if sum(vals) == 0:
-            ax.text(0.5, 0.5, "No chronic/acute data", ha="center", va="center")
-        else:
-            ax.pie(vals, labels=labels2, autopct="%1.1f%%", textprops={"fontsize": 10})
-        ax.set_title("Chronic vs Acute Cases", fontsize=12)
-        self.add_chart(
-            "Chronic vs Acute",
-            "Percentage split between chronic and acute patients.",
-            fig,
-            adjust_kwargs={"bottom": 0.15},
-        )
-
-        # 3. Top 20 diseases (horizontal bar) — wrap labels & enlarge left margin
-        fig = Figure(figsize=(10, 5), dpi=110, constrained_layout=False)
-        ax = fig.add_subplot(111)
-        items = sorted(
-            stats["disease_counts"].items(), key=lambda x: x[1], reverse=True
-        )[:20]
-        if not items:
-            ax.text(0.5, 0.5, "No disease data", ha="center", va="center")
-        else:
-            names = [i[0] for i in items]
-            vals = [i[1] for i in items]
-            wrapped = self._wrap_labels(names, width=22)
-            y = np.arange(len(wrapped))
-            ax.barh(y, vals)
-            ax.set_yticks(y)
-            ax.set_yticklabels(wrapped, fontsize=10)
-            ax.invert_yaxis()
-            ax.set_xlabel("Number of patients", fontsize=11)
-            ax.set_title("Top 20 Diseases", fontsize=12)
-        self.add_chart(
-            "Top Diseases",
-            "Most common diseases in the database (top 20).",
-            fig,
-            adjust_kwargs={"left": 0.28, "bottom": 0.12},
-        )
+            self._insights_label.pack(side="left", padx=(6, 0))
 
-        # 4. Disease by gender (stacked bar) for top 10 diseases — rotate labels and adjust bottom
-        fig = Figure(figsize=(10, 4.2), dpi=110, constrained_layout=False)
-        ax = fig.add_subplot(111)
-        top_diseases = [
-            d
-            for d, _ in sorted(
-                stats["disease_counts"].items(), key=lambda x: x[1], reverse=True
-            )[:10]
-        ]
-        if not top_diseases:
-            ax.text(0.5, 0.5, "No data", ha="center", va="center")
-        else:
-            genders = ["Male", "Female", "Other"]
-            counts_by_gender = {g: [] for g in genders}
-            conn = get_conn(self.db_path)
-            cur = conn.cursor()
-            for d in top_diseases:
-                cur.execute(
-                    "SELECT gender, COUNT(1) FROM patients WHERE disease = ? GROUP BY gender",
-                    (d,),
-                )
-                rowmap = {r[0] if r[0] else "Unknown": r[1] for r in cur.fetchall()}
-                for g in genders:
-                    counts_by_gender[g].append(rowmap.get(g, 0))
-            conn.close()
-            x = np.arange(len(top_diseases))
-            bottom = np.zeros(len(top_diseases))
-            colors = ["#4daf4a", "#377eb8", "#ff7f00"]
-            for i, g in enumerate(genders):
-                vals = counts_by_gender[g]
-                ax.bar(x, vals, bottom=bottom, label=g, color=colors[i % len(colors)])
-                bottom = bottom + np.array(vals)
-            wrapped = self._wrap_labels(top_diseases, width=18)
-            ax.set_xticks(x)
-            ax.set_xticklabels(wrapped, rotation=30, ha="right", fontsize=10)
-            ax.set_title("Disease by Gender (Top 10)", fontsize=12)
-            ax.legend()
-        self.add_chart(
-            "Disease by Gender",
-            "Stacked bar showing gender composition per disease (top 10).",
-            fig,
-            adjust_kwargs={"bottom": 0.20},
-        )
+        self._panels = [ChartPanel(self, spec, stats) for spec in CHARTS]
+        self._shown = stats
 
-        # 5. Age distribution (histogram) — bigger bins and margins
-        fig = Figure(figsize=(10, 3.4), dpi=110, constrained_layout=False)
-        ax = fig.add_subplot(111)
-        ages = stats["ages"]
-        if not ages:
-            ax.text(0.5, 0.5, "No age data", ha="center", va="center")
-        else:
-            bins = range(0, 101, 5)
-            ax.hist(ages, bins=bins)
-            ax.set_xlabel("Age", fontsize=11)
-            ax.set_ylabel("Number of patients", fontsize=11)
-            ax.set_title("Age Distribution", fontsize=12)
-            ax.tick_params(axis="x", labelsize=10)
-            ax.tick_params(axis="y", labelsize=10)
-        self.add_chart(
-            "Age Distribution",
-            "Histogram of patient ages (bins of 5 years).",
-            fig,
-            adjust_kwargs={"bottom": 0.12},
-        )
-
-        # 6. Patient entries per month (last 12 months) — rotate x labels and give bottom margin
-        fig = Figure(figsize=(10, 3.6), dpi=110, constrained_layout=False)
-        ax = fig.add_subplot(111)
-        months = list(stats["monthly_counts"].keys())
-        vals = list(stats["monthly_counts"].values())
-        if sum(vals) == 0:
-            ax.text(0.5, 0.5, "No monthly entries", ha="center", va="center")
-        else:
-            x = np.arange(len(months))
-            ax.bar(x, vals)
-            ax.set_xticks(x)
-            ax.set_xticklabels(months, rotation=45, ha="right", fontsize=10)
-            ax.set_ylabel("Number of entries", fontsize=11)
-            ax.set_title("Patient entries per month (last 12 months)", fontsize=12)
-            ax.tick_params(axis="y", labelsize=10)
-        self.add_chart(
-            "Patient entries per month",
-            "Count of patient admissions across the last 12 months.",
-            fig,
-            adjust_kwargs={"bottom": 0.25},
-        )
-
-        # 7. Average age by top diseases (top 10) — rotate labels & adjust bottom
-        fig = Figure(figsize=(10, 3.8), dpi=110, constrained_layout=False)
-        ax = fig.add_subplot(111)
-        avg = stats["avg_age_by_disease"]
-        items = sorted(avg.items(), key=lambda x: x[1], reverse=True)[:10]
-        if not items:
-            ax.text(0.5, 0.5, "No average age data", ha="center", va="center")
-        else:
-            names = [i[0] for i in items]
-            vals = [i[1] for i in items]
-            wrapped = self._wrap_labels(names, width=18)
-            x = np.arange(len(wrapped))
-            ax.bar(x, vals)
-            ax.set_xticks(x)
-            ax.set_xticklabels(wrapped, rotation=35, ha="right", fontsize=10)
-            ax.set_ylabel("Average age", fontsize=11)
-            ax.set_title("Average Age by Disease (top diseases)", fontsize=12)
-            ax.tick_params(axis="y", labelsize=10)
-        self.add_chart(
-            "Average age by disease",
-            "Shows average patient age for top diseases (requires ≥2 samples per disease).",
-            fig,
-            adjust_kwargs={"bottom": 0.22},
-        )
+    def refresh(self):
+        """Update the charts built by render() with fresh stats."""
+        if not self._panels:
+            self.render()
+            return
+        stats = self.gather_stats()
+        if stats is self._shown:
+            # nothing written since: the engine handed back the same result
+            return
+        self._shown = stats
+        if self._insights_label is not None:
+            self._insights_label.config(text="  ".join(generate_insights(stats)[:3]))
+        for panel in self._panels:
+            panel.refresh(stats)
 
     def export_charts(self):
         folder = filedialog.askdirectory(title="Select folder to save charts")
@@ -443,6 +744,22 @@ class ReportsWindow(tk.Toplevel):
         except Exception as e:
             messagebox.showerror("Export error", f"Failed to save charts: {e}")
 
+    def export_pdf(self):
+        month = datetime.date.today().strftime("%Y-%m")
+        path = filedialog.asksaveasfilename(
+            title="Save monthly PDF report",
+            defaultextension=".pdf",
+            initialfile=f"prms_report_{month}.pdf",
+            filetypes=[("PDF", "*.pdf")],
+        )
+        if not path:
+            return
+        try:
+            pages = write_pdf_report(path, self.store, month=month)
+            messagebox.showinfo("Export", f"Saved {pages} pages to {path}")
+        except Exception as e:
+            messagebox.showerror("Export error", f"Failed to write PDF: {e}")
+
 
 def generate_longitudinal_summary(patient_visits, trend_result):
     if not patient_visits:
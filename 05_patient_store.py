@@ -0,0 +1,1431 @@
+# patient_store.py
+"""
+Headless data-access layer for PRMS (no tkinter imports here).
+
+The GUI (prms_main), the reports window (prms_reports) and ai_helpers all
+read and write the patients table through PatientStore, so the same code
+can be batched, reused from scripts and benchmarked without a display.
+
+Connections run in autocommit mode and every write goes through an explicit
+BEGIN IMMEDIATE ... COMMIT block.  SQL strings are module constants so the
+sqlite3 statement cache keeps them prepared between calls.
+
+Table listings, searches and aggregates are served from a QueryCache that
+stays valid until PRAGMA data_version or the store's own write counter
+changes, so repeated navigation does not hit the database again.
+"""
+
+import datetime
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+import ai_helpers
+import dedupe
+from query_cache import QueryCache
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_FILE = os.path.join(BASE_DIR, "prms_patients.db")
+
+# rows per transaction for the *_many helpers
+BATCH_SIZE = 5000
+
+# keyset page size for the main table and the cap for "N of M" counts
+PAGE_SIZE = 200
+COUNT_CAP = 10000
+
+# column order used by insert_many / update_many records
+COLUMNS = (
+    "name",
+    "age",
+    "gender",
+    "phone",
+    "disease",
+    "chronic",
+    "admission_date",
+    "notes",
+    "followup_date",
+)
+
+# columns kept in the patients row; notes live in patient_notes so scans
+# of the table don't read them (the old notes column is left NULL)
+ROW_COLUMNS = tuple(c for c in COLUMNS if c != "notes")
+NOTES_INDEX = COLUMNS.index("notes")
+
+# columns written by insert/update: the record plus values derived from it
+WRITE_COLUMNS = ROW_COLUMNS + ("person_id", "risk_rank", "admission_rec")
+
+# notes of at least this many UTF-8 bytes are stored zlib-compressed
+NOTES_COMPRESS_MIN = 256
+
+# columns shown in the main table
+LIST_COLUMNS = (
+    "id, name, age, gender, phone, disease, chronic, admission_date, risk_rank"
+)
+
+# yearly archives of old admissions (see archive.py), one file per
+# admission year next to the database; the day numbers are stored there,
+# not generated
+ARCHIVE_PREFIX = "prms_archive_"
+_ARCHIVE_RE = re.compile(re.escape(ARCHIVE_PREFIX) + r"(\d{4})\.db")
+ARCHIVE_COLUMNS = (
+    ("id",) + WRITE_COLUMNS + ("admission_day", "followup_day")
+)
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {0}.patients (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    age INTEGER,
+    gender TEXT,
+    phone TEXT,
+    disease TEXT,
+    chronic INTEGER,
+    admission_date TEXT,
+    followup_date TEXT,
+    person_id INTEGER,
+    risk_rank INTEGER,
+    admission_rec TEXT,
+    admission_day INTEGER,
+    followup_day INTEGER
+);
+CREATE INDEX IF NOT EXISTS {0}.idx_archive_person ON patients(person_id);
+CREATE INDEX IF NOT EXISTS {0}.idx_archive_phone ON patients(phone);
+CREATE INDEX IF NOT EXISTS {0}.idx_archive_disease_age ON patients(disease, age);
+CREATE INDEX IF NOT EXISTS {0}.idx_archive_admission_day ON patients(admission_day);
+CREATE INDEX IF NOT EXISTS {0}.idx_archive_risk ON patients(risk_rank);
+CREATE TABLE IF NOT EXISTS {0}.patient_notes (
+    patient_id INTEGER PRIMARY KEY,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    body BLOB NOT NULL
+);
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    age INTEGER,
+    gender TEXT,
+    phone TEXT,
+    disease TEXT,
+    chronic INTEGER,
+    admission_date TEXT,
+    notes TEXT,
+    followup_date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_patients_phone ON patients(phone);
+CREATE INDEX IF NOT EXISTS idx_patients_disease_age ON patients(disease, age);
+DROP INDEX IF EXISTS idx_patients_disease;
+"""
+
+
+# --- schema migrations (tracked with PRAGMA user_version) ---
+def _add_column(conn, table, column, decl):
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(%s)" % table)}
+    if column not in cols:
+        conn.execute("ALTER TABLE %s ADD COLUMN %s %s" % (table, column, decl))
+
+
+def _migrate_persons(conn):
+    # every patients row is one visit; persons gives each patient a stable
+    # integer id so history lookups are index joins, not name matching
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS persons (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            name_key TEXT NOT NULL,
+            phone TEXT NOT NULL DEFAULT '',
+            UNIQUE (name_key, phone)
+        )
+        """
+    )
+    _add_column(conn, "patients", "person_id", "INTEGER REFERENCES persons(id)")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_patients_person "
+        "ON patients(person_id, admission_date)"
+    )
+
+
+def _migrate_dup_keys(conn):
+    # blocking keys for fuzzy duplicate detection (see dedupe.py); rows
+    # that predate the table are filled in by backfill_dup_keys()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS dup_keys (
+            key TEXT NOT NULL,
+            patient_id INTEGER NOT NULL,
+            PRIMARY KEY (key, patient_id)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_dup_keys_patient ON dup_keys(patient_id)"
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_patients_dup_keys_delete
+        AFTER DELETE ON patients BEGIN
+            DELETE FROM dup_keys WHERE patient_id = old.id;
+        END
+        """
+    )
+    conn.execute(
+        "INSERT OR IGNORE INTO store_meta (key, value) "
+        "VALUES ('dup_keys_backfill', 0)"
+    )
+
+
+def _migrate_trigram(conn):
+    # substring search on name/phone/disease: an external-content FTS5
+    # table with the trigram tokenizer answers LIKE '%x%' from an index.
+    # SQLite older than 3.34 has no trigram tokenizer; searches then keep
+    # scanning the table.
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS patients_fts USING fts5("
+            "name, phone, disease, content='patients', content_rowid='id', "
+            "tokenize='trigram')"
+        )
+    except sqlite3.OperationalError:
+        return
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_patients_fts_insert
+        AFTER INSERT ON patients BEGIN
+            INSERT INTO patients_fts (rowid, name, phone, disease)
+            VALUES (new.id, new.name, new.phone, new.disease);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_patients_fts_delete
+        AFTER DELETE ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, name, phone, disease)
+            VALUES ('delete', old.id, old.name, old.phone, old.disease);
+        END
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_patients_fts_update
+        AFTER UPDATE OF name, phone, disease ON patients BEGIN
+            INSERT INTO patients_fts (patients_fts, rowid, name, phone, disease)
+            VALUES ('delete', old.id, old.name, old.phone, old.disease);
+            INSERT INTO patients_fts (rowid, name, phone, disease)
+            VALUES (new.id, new.name, new.phone, new.disease);
+        END
+        """
+    )
+    # index the existing rows in the same transaction as the triggers so
+    # no write can slip in between
+    conn.execute("INSERT INTO patients_fts (patients_fts) VALUES ('rebuild')")
+
+
+# day number of a YYYY-MM-DD[...] text date: its julian day at noon, so
+# strftime()/date() on the number give back the same calendar day.
+# Anything that is not a real calendar date is NULL.
+DAY_EXPR = (
+    "CASE WHEN date(substr({0}, 1, 10)) = substr({0}, 1, 10) "
+    "THEN CAST(julianday(substr({0}, 1, 10)) + 0.5 AS INTEGER) END"
+)
+
+
+def _migrate_day_columns(conn):
+    # integer day numbers generated from the free-form date columns; the
+    # indexes turn date ranges and per-month counts into range scans
+    for column, source in (
+        ("admission_day", "admission_date"),
+        ("followup_day", "followup_date"),
+    ):
+        _add_column(
+            conn,
+            "patients",
+            column,
+            "INTEGER GENERATED ALWAYS AS (%s) VIRTUAL" % DAY_EXPR.format(source),
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_patients_%s ON patients(%s)"
+            % (column, column)
+        )
+
+
+def _migrate_notes(conn):
+    # notes move to a side table read only when a record is opened; long
+    # ones are compressed.  The patients pages they leave half empty are
+    # compacted by a VACUUM after the migration commits.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS patient_notes (
+            patient_id INTEGER PRIMARY KEY,
+            compressed INTEGER NOT NULL DEFAULT 0,
+            body BLOB NOT NULL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_patients_notes_delete
+        AFTER DELETE ON patients BEGIN
+            DELETE FROM patient_notes WHERE patient_id = old.id;
+        END
+        """
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, notes FROM patients WHERE id > ? AND notes IS NOT NULL "
+            "ORDER BY id LIMIT ?",
+            (last_id, BATCH_SIZE),
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            SQL_NOTES_PUT,
+            [(pid,) + pack_notes(notes) for pid, notes in rows if notes],
+        )
+        last_id = rows[-1][0]
+    conn.execute("UPDATE patients SET notes = NULL WHERE notes IS NOT NULL")
+    conn.execute(
+        "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('vacuum', 1)"
+    )
+
+
+def _migrate_risk(conn):
+    # ai_helpers.risk_flag / admission_recommendation stored per row so the
+    # table can be filtered and sorted by risk; risk_rank indexes
+    # ai_helpers.RISK_LEVELS (0 = High).  Existing rows are scored by
+    # backfill.recompute_risk().
+    _add_column(conn, "patients", "risk_rank", "INTEGER")
+    _add_column(conn, "patients", "admission_rec", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_patients_risk ON patients(risk_rank)")
+
+
+def _migrate_change_counter(conn):
+    # a write counter kept in the file: PRAGMA data_version only tells one
+    # connection that something changed since its last look, this one can
+    # be compared across connections, processes and restarts
+    conn.execute(
+        "INSERT OR IGNORE INTO store_meta (key, value) VALUES ('changes', 0)"
+    )
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS trg_patients_changes_%s "
+            "AFTER %s ON patients BEGIN "
+            "UPDATE store_meta SET value = value + 1 WHERE key = 'changes'; "
+            "END" % (event.lower(), event)
+        )
+
+
+# updates are only logged for the columns the table shows, less
+# risk_rank: it follows from the others, and a bulk rescore would log
+# every row (other workstations pick new ranks up on their next reload)
+_LOGGED_COLUMNS = ", ".join(
+    c for c in LIST_COLUMNS.split(", ") if c not in ("id", "risk_rank")
+)
+
+
+def _migrate_change_log(conn):
+    # which rows changed, for other workstations to patch their table
+    # (see change_watcher.py); AUTOINCREMENT keeps seq increasing even
+    # after the log has been pruned empty
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS patient_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            patient_id INTEGER NOT NULL
+        )
+        """
+    )
+    for name, event, ref in (
+        ("insert", "INSERT", "new"),
+        ("update", "UPDATE OF " + _LOGGED_COLUMNS, "new"),
+        ("delete", "DELETE", "old"),
+    ):
+        conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS trg_patients_log_%s "
+            "AFTER %s ON patients BEGIN "
+            "INSERT INTO patient_changes (patient_id) VALUES (%s.id); "
+            "END" % (name, event, ref)
+        )
+
+
+def _migrate_change_log_columns(conn):
+    # the update trigger used to fire on risk_rank too, so a full
+    # backfill.recompute_risk() logged every row in the table
+    conn.execute("DROP TRIGGER IF EXISTS trg_patients_log_update")
+    _migrate_change_log(conn)
+
+
+MIGRATIONS = [
+    (1, _migrate_persons),
+    (2, _migrate_dup_keys),
+    (3, _migrate_trigram),
+    (4, _migrate_day_columns),
+    (5, _migrate_notes),
+    (6, _migrate_risk),
+    (7, _migrate_change_counter),
+    (8, _migrate_change_log),
+    (9, _migrate_change_log_columns),
+]
+
+# COLUMNS with notes replaced by the patient_notes (compressed, body) pair
+_NOTES_SELECT = ", ".join(
+    "n.compressed, n.body" if c == "notes" else "p." + c for c in COLUMNS
+)
+# {patients} / {notes}: one schema's tables, main or an archive (see
+# PatientStore._lookup)
+SQL_GET = (
+    "SELECT p.id, " + _NOTES_SELECT + " FROM {patients} p "
+    "LEFT JOIN {notes} n ON n.patient_id = p.id WHERE p.id = ?"
+)
+SQL_INSERT = (
+    "INSERT INTO patients ("
+    + ", ".join(WRITE_COLUMNS)
+    + ") VALUES ("
+    + ", ".join("?" * len(WRITE_COLUMNS))
+    + ")"
+)
+SQL_UPDATE = (
+    "UPDATE patients SET "
+    + ", ".join(c + " = ?" for c in WRITE_COLUMNS)
+    + " WHERE id = ?"
+)
+SQL_DELETE = "DELETE FROM patients WHERE id = ?"
+SQL_NOTES_PUT = (
+    "INSERT OR REPLACE INTO patient_notes (patient_id, compressed, body) "
+    "VALUES (?, ?, ?)"
+)
+SQL_NOTES_DROP = "DELETE FROM patient_notes WHERE patient_id = ?"
+SQL_DUP_PHONE = (
+    "SELECT id, name, age, disease, admission_date FROM patients "
+    "WHERE phone = ? LIMIT 5"
+)
+SQL_DUP_KEY_ADD = "INSERT OR IGNORE INTO dup_keys (key, patient_id) VALUES (?, ?)"
+SQL_DUP_KEY_DROP = "DELETE FROM dup_keys WHERE patient_id = ?"
+# at most this many blocked candidates are scored per check
+DUP_CANDIDATES = 500
+# columns covered by the trigram index, and the shortest indexable term
+TRIGRAM_COLUMNS = ("name", "phone", "disease")
+TRIGRAM_MIN = 3
+SQL_TRIGRAM_HITS = "SELECT rowid FROM patients_fts WHERE patients_fts MATCH ?"
+# trigram matches joined back to their rows, streamed in id order
+SQL_TRIGRAM_SOURCE = (
+    "(SELECT rowid AS hit FROM patients_fts WHERE patients_fts MATCH ?) "
+    "JOIN patients ON id = hit"
+)
+SQL_PERSON_ID = "SELECT id FROM persons WHERE name_key = ? AND phone = ?"
+SQL_PERSON_ADD = "INSERT INTO persons (name, name_key, phone) VALUES (?, ?, ?)"
+# {patients}: the patients table, or with archives attached the
+# patients_all view over hot and archived rows
+SQL_HISTORY = (
+    "SELECT admission_date, disease, chronic FROM {patients} "
+    "WHERE person_id = ? ORDER BY admission_date"
+)
+SQL_HISTORY_FOR = (
+    "SELECT v.admission_date, v.disease, v.chronic "
+    "FROM {patients} p JOIN {patients} v ON v.person_id = p.person_id "
+    "WHERE p.id = ? ORDER BY v.admission_date"
+)
+# the row itself plus every visit of the same person, in one statement
+SQL_DETAIL = (
+    "SELECT p.id, "
+    + _NOTES_SELECT
+    + ", v.admission_date, v.disease, v.chronic "
+    "FROM patients p LEFT JOIN patient_notes n ON n.patient_id = p.id "
+    "LEFT JOIN patients v ON v.person_id = p.person_id "
+    "WHERE p.id = ? ORDER BY v.admission_date"
+)
+# one row (latest visit) per similar person
+SQL_SIMILAR = (
+    "SELECT id, name, age, gender, phone, disease, MAX(admission_date) "
+    "FROM patients WHERE disease = ? AND age BETWEEN ? AND ? GROUP BY person_id"
+)
+
+
+def person_key(name):
+    """Canonical form of a name used to group visits into persons."""
+    return " ".join((name or "").split()).lower()
+
+
+def _phone_key(phone):
+    return str(phone or "").strip()
+
+
+def pack_notes(text):
+    """(compressed, body) as stored in patient_notes."""
+    data = text.encode("utf-8")
+    if len(data) >= NOTES_COMPRESS_MIN:
+        packed = zlib.compress(data, 6)
+        if len(packed) < len(data):
+            return 1, packed
+    return 0, text
+
+
+def risk_fields(rec):
+    """(risk_rank, admission_rec) for a record in COLUMNS order."""
+    age, disease, chronic = rec[1], rec[4], rec[5]
+    risk = ai_helpers.risk_flag(age, disease, chronic)
+    advice = ai_helpers.admission_recommendation(
+        age, disease, chronic, rec[NOTES_INDEX]
+    )
+    return ai_helpers.RISK_LEVELS.index(risk), advice
+
+
+def unpack_notes(compressed, body):
+    if body is None:
+        return None
+    if compressed:
+        return zlib.decompress(body).decode("utf-8")
+    return body
+
+
+def _unpack_row(row):
+    # (id, ..., compressed, body, ...) -> (id, ..., notes, ...)
+    i = NOTES_INDEX + 1
+    return row[:i] + (unpack_notes(row[i], row[i + 1]),) + row[i + 2 :]
+
+
+# julian day number of date.min (0001-01-01)
+_ORDINAL_OFFSET = 1721425
+
+_PERIOD_RE = re.compile(r"(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?")
+_LAST_RE = re.compile(r"last\s*(\d+)\s*([dwmy])", re.IGNORECASE)
+
+
+def day_number(d):
+    """Day number of a date, as stored in admission_day/followup_day."""
+    return d.toordinal() + _ORDINAL_OFFSET
+
+
+def _months_back(d, months):
+    total = d.year * 12 + d.month - 1 - months
+    year, month = divmod(total, 12)
+    month += 1
+    # clamp the day (e.g. 31 March minus one month -> 29 February)
+    for day in range(d.day, 0, -1):
+        try:
+            return datetime.date(year, month, day)
+        except ValueError:
+            continue
+
+
+def _period(text):
+    """(first, last) date of YYYY, YYYY-MM or YYYY-MM-DD."""
+    m = _PERIOD_RE.fullmatch(text.strip())
+    if not m:
+        raise ValueError("not a date: %r" % text)
+    year, month, day = m.groups()
+    year = int(year)
+    if day:
+        d = datetime.date(year, int(month), int(day))
+        return d, d
+    if month:
+        first = datetime.date(year, int(month), 1)
+        nxt = datetime.date(year + (first.month == 12), first.month % 12 + 1, 1)
+        return first, nxt - datetime.timedelta(days=1)
+    return datetime.date(year, 1, 1), datetime.date(year, 12, 31)
+
+
+def parse_date_range(text, today=None):
+    """
+    (first, last) day numbers for a date search; either end may be None.
+
+    Accepts YYYY, YYYY-MM, YYYY-MM-DD, ranges of those written a..b (an
+    empty side leaves the range open) and "last N" with d/w/m/y units,
+    e.g. "last 90d".  Raises ValueError for anything else.
+    """
+    text = text.strip()
+    today = today or datetime.date.today()
+    m = _LAST_RE.fullmatch(text)
+    if m:
+        n, unit = int(m.group(1)), m.group(2).lower()
+        if unit == "d":
+            first = today - datetime.timedelta(days=n)
+        elif unit == "w":
+            first = today - datetime.timedelta(weeks=n)
+        else:
+            first = _months_back(today, n * 12 if unit == "y" else n)
+        return day_number(first), day_number(today)
+    if ".." in text:
+        lo, hi = text.split("..", 1)
+        first = day_number(_period(lo)[0]) if lo.strip() else None
+        last = day_number(_period(hi)[1]) if hi.strip() else None
+        if first is None and last is None:
+            raise ValueError("empty date range")
+        if first is not None and last is not None and first > last:
+            first, last = last, first
+        return first, last
+    first, last = _period(text)
+    return day_number(first), day_number(last)
+
+
+def substring_filter(columns, text, trigram=True):
+    """
+    (where, params, hits) for "any of columns contains text", with the
+    same semantics as column LIKE '%text%'.
+
+    Terms of TRIGRAM_MIN+ characters are answered by the trigram index
+    and come back as `hits`, an FTS5 match expression to pass on to
+    search_page/count_capped (several can be joined with " AND ").
+    Shorter terms, terms using LIKE wildcards, and databases without the
+    index (trigram=False) fall back to a scan and come back as a WHERE
+    fragment.
+    """
+    if (
+        trigram
+        and len(text) >= TRIGRAM_MIN
+        and "%" not in text
+        and "_" not in text
+        and all(c in TRIGRAM_COLUMNS for c in columns)
+    ):
+        phrase = '"' + text.replace('"', '""') + '"'
+        return None, (), "{%s}: %s" % (" ".join(columns), phrase)
+    pattern = f"%{text}%"
+    where = " OR ".join("%s LIKE ?" % c for c in columns)
+    if len(columns) > 1:
+        where = "(" + where + ")"
+    return where, (pattern,) * len(columns), None
+
+
+def day_range_clause(column, first, last):
+    """(where, params) for first <= column <= last (None = open end)."""
+    if first is not None and last is not None:
+        return "%s BETWEEN ? AND ?" % column, (first, last)
+    if first is not None:
+        return "%s >= ?" % column, (first,)
+    return "%s <= ?" % column, (last,)
+
+
+def _chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+class PatientStore:
+    """Thread-aware access to the patients table (one connection per thread)."""
+
+    def __init__(self, db_path=DB_FILE, timeout=10, read_only=False, cache=True):
+        self.db_path = os.path.expanduser(db_path)
+        self.timeout = timeout
+        # for files nothing writes to any more (report snapshots): no
+        # locks and no change checks at all
+        self.read_only = read_only
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        self._has_trigram = None
+        # (change_count, years): archive_years() without a listdir per call
+        self._archive_years = None
+        # generation() is per connection (PRAGMA data_version), so one
+        # cache cannot serve many reading threads: servers pass cache=False
+        self.cache = QueryCache() if cache else None
+
+    # --- connections / transactions ---
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.read_only:
+                conn = sqlite3.connect(
+                    "file:%s?mode=ro&immutable=1" % pathname2url(self.db_path),
+                    uri=True,
+                    isolation_level=None,
+                )
+            else:
+                conn = sqlite3.connect(
+                    self.db_path, timeout=self.timeout, isolation_level=None
+                )
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, rolled back if the block raises."""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        self._bump_writes()
+
+    def _bump_writes(self):
+        with self._writes_lock:
+            self._writes += 1
+
+    def generation(self):
+        """Changes whenever this process or another one commits a write."""
+        version = self.connect().execute("PRAGMA data_version").fetchone()[0]
+        return version, self._writes
+
+    def change_count(self):
+        """
+        Persistent count of writes to patients, the same for every
+        connection and process; cheap enough to poll.
+        """
+        row = (
+            self.connect()
+            .execute("SELECT value FROM store_meta WHERE key = 'changes'")
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def ensure_schema(self):
+        conn = self.connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.executescript(SCHEMA)
+        current = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target, migrate in MIGRATIONS:
+            if current >= target:
+                continue
+            with self.transaction() as c:
+                # re-read inside the write lock: another workstation may
+                # have migrated the file in the meantime
+                version = c.execute("PRAGMA user_version").fetchone()[0]
+                if version < target:
+                    migrate(c)
+                    c.execute("PRAGMA user_version = %d" % target)
+        self.backfill_persons()
+        self.backfill_dup_keys()
+        self._vacuum_if_pending(conn)
+        self._bump_writes()
+
+    def _vacuum_if_pending(self, conn):
+        # requested by migrations that leave lots of free space behind;
+        # VACUUM can't run inside a transaction, so it happens here
+        try:
+            pending = conn.execute(
+                "SELECT 1 FROM store_meta WHERE key = 'vacuum'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return
+        if pending:
+            conn.execute("VACUUM")
+            conn.execute("DELETE FROM store_meta WHERE key = 'vacuum'")
+
+    def backfill_persons(self, batch_size=BATCH_SIZE):
+        """
+        Group rows written without a person_id into persons.
+
+        Walks the table in id order, one short transaction per batch, so it
+        can run on a live database.  Returns the number of rows linked.
+        """
+        conn = self.connect()
+        first = conn.execute(
+            "SELECT MIN(id) FROM patients WHERE person_id IS NULL"
+        ).fetchone()[0]
+        if first is None:
+            return 0
+        linked = 0
+        last_id = first - 1
+        while True:
+            # walk the primary key; filtering in Python keeps this a range
+            # scan instead of a sort over the person_id index
+            rows = conn.execute(
+                "SELECT id, name, phone, person_id FROM patients "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+            if not rows:
+                break
+            with self.transaction() as c:
+                updates = [
+                    (self.person_id(c, name, phone), pid)
+                    for pid, name, phone, person in rows
+                    if person is None
+                ]
+                c.executemany("UPDATE patients SET person_id = ? WHERE id = ?", updates)
+            linked += len(updates)
+            last_id = rows[-1][0]
+        return linked
+
+    def backfill_dup_keys(self, batch_size=BATCH_SIZE):
+        """
+        File rows written before the dup_keys table existed under their
+        blocking keys.  Progress is saved with every batch, so an
+        interrupted backfill resumes where it stopped.
+        """
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                "SELECT value FROM store_meta WHERE key = 'dup_keys_backfill'"
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return 0
+        if row is None:
+            return 0
+        last_id = row[0]
+        done = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, name, age, phone, admission_date FROM patients "
+                "WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size),
+            ).fetchall()
+            with self.transaction() as c:
+                if not rows:
+                    c.execute("DELETE FROM store_meta WHERE key = 'dup_keys_backfill'")
+                    break
+                for pid, name, age, phone, adm in rows:
+                    self._index_dup_keys(c, pid, name, age, phone, adm)
+                last_id = rows[-1][0]
+                c.execute(
+                    "UPDATE store_meta SET value = ? WHERE key = 'dup_keys_backfill'",
+                    (last_id,),
+                )
+            done += len(rows)
+        return done
+
+    def _index_dup_keys(self, conn, patient_id, name, age, phone, adm):
+        conn.executemany(
+            SQL_DUP_KEY_ADD,
+            [(k, patient_id) for k in dedupe.blocking_keys(name, age, phone, adm)],
+        )
+
+    def _index_record(self, conn, patient_id, rec):
+        # rec is in COLUMNS order
+        self._index_dup_keys(conn, patient_id, rec[0], rec[1], rec[3], rec[6])
+
+    def person_id(self, conn, name, phone):
+        """Id of the person (name, phone), created if new.  Needs a write
+        transaction on conn."""
+        key = person_key(name)
+        phone = _phone_key(phone)
+        row = conn.execute(SQL_PERSON_ID, (key, phone)).fetchone()
+        if row:
+            return row[0]
+        cur = conn.execute(SQL_PERSON_ADD, ((name or "").strip(), key, phone))
+        return cur.lastrowid
+
+    def _write_params(self, conn, rec):
+        rec = tuple(rec)
+        row = rec[:NOTES_INDEX] + rec[NOTES_INDEX + 1 :]
+        return row + (self.person_id(conn, rec[0], rec[3]),) + risk_fields(rec)
+
+    def _write_notes(self, conn, patient_id, notes, replace=True):
+        if notes:
+            conn.execute(SQL_NOTES_PUT, (patient_id,) + pack_notes(notes))
+        elif replace:
+            conn.execute(SQL_NOTES_DROP, (patient_id,))
+
+    # --- archives (filled by archive.py) ---
+    def archive_path(self, year):
+        directory = os.path.dirname(self.db_path)
+        return os.path.join(directory, "%s%d.db" % (ARCHIVE_PREFIX, year))
+
+    def archive_years(self):
+        """
+        Admission years that have an archive file, oldest first.  The
+        directory is listed again only after a write (archiving deletes
+        from patients, which moves change_count()) or refresh_archives().
+        """
+        changes = self.change_count()
+        cached = self._archive_years
+        if cached is not None and cached[0] == changes:
+            return cached[1]
+        try:
+            names = os.listdir(os.path.dirname(self.db_path) or ".")
+        except OSError:
+            names = []
+        years = sorted(
+            int(m.group(1)) for m in map(_ARCHIVE_RE.fullmatch, names) if m
+        )
+        self._archive_years = (changes, years)
+        return years
+
+    def refresh_archives(self):
+        """Forget the cached archive list (the archive job calls this)."""
+        self._archive_years = None
+
+    def attach_archive(self, conn, year):
+        """ATTACH one year's archive (created if missing) as archive_<year>."""
+        schema = "archive_%d" % year
+        if schema not in {row[1] for row in conn.execute("PRAGMA database_list")}:
+            conn.execute(
+                "ATTACH DATABASE ? AS %s" % schema, (self.archive_path(year),)
+            )
+            conn.execute("PRAGMA %s.journal_mode=WAL" % schema)
+            conn.executescript(ARCHIVE_SCHEMA.format(schema))
+        return schema
+
+    def archive_sources(self):
+        """
+        (patients, notes) to read from when archived rows count too: the
+        plain tables while there is no archive, otherwise this thread's
+        TEMP views patients_all / patient_notes_all, which UNION ALL the
+        hot tables with every attached archive.  Archives that appeared
+        since the last call are attached first.
+        """
+        schemas = self._archive_schemas()
+        if not schemas:
+            return "patients", "patient_notes"
+        if getattr(self._local, "archive_views", None) != schemas:
+            conn = self.connect()
+            cols = ", ".join(ARCHIVE_COLUMNS)
+            # a row sits in both for a moment while it is being moved
+            patients = ["SELECT %s FROM main.patients" % cols] + [
+                "SELECT %s FROM %s.patients a WHERE NOT EXISTS "
+                "(SELECT 1 FROM main.patients h WHERE h.id = a.id)" % (cols, s)
+                for s in schemas
+            ]
+            notes = ["SELECT patient_id, compressed, body FROM main.patient_notes"]
+            notes += [
+                "SELECT patient_id, compressed, body FROM %s.patient_notes a "
+                "WHERE NOT EXISTS (SELECT 1 FROM main.patient_notes h "
+                "WHERE h.patient_id = a.patient_id)" % s
+                for s in schemas
+            ]
+            for view, parts in (
+                ("patients_all", patients),
+                ("patient_notes_all", notes),
+            ):
+                conn.execute("DROP VIEW IF EXISTS temp.%s" % view)
+                conn.execute(
+                    "CREATE TEMP VIEW %s AS %s" % (view, " UNION ALL ".join(parts))
+                )
+            self._local.archive_views = schemas
+        return "patients_all", "patient_notes_all"
+
+    def _archive_schemas(self):
+        """This thread's attached archive schemas, attaching new ones."""
+        years = self.archive_years()
+        if getattr(self._local, "archive_years", None) != years:
+            conn = self.connect()
+            self._local.archive_schemas = [
+                self.attach_archive(conn, year) for year in years
+            ]
+            self._local.archive_years = years
+        return self._local.archive_schemas if years else []
+
+    def _lookup(self, sql, patient_id):
+        """
+        The first row `sql` ({patients}/{notes}) returns for patient_id,
+        from the hot tables first and then each archive.  Joining the
+        archive views instead makes SQLite materialize patient_notes_all,
+        a scan of every note, for each lookup.
+        """
+        conn = self.connect()
+        sources = ["main"] + self._archive_schemas()
+        for schema in sources:
+            q = sql.format(
+                patients=schema + ".patients", notes=schema + ".patient_notes"
+            )
+            row = conn.execute(q, (patient_id,)).fetchone()
+            if row:
+                return row
+        return None
+
+    def _search_source(self, archive, hits):
+        if not archive:
+            return "patients"
+        if hits is not None:
+            raise ValueError("archive searches take no trigram match")
+        return self.archive_sources()[0]
+
+    # --- reads ---
+    def query(self, sql, params=(), cache=False):
+        if not cache or self.cache is None:
+            return self.connect().execute(sql, params).fetchall()
+        key = self.cache.make_key(sql, params)
+        generation = self.generation()
+        rows = self.cache.get(key, generation)
+        if rows is None:
+            rows = self.connect().execute(sql, params).fetchall()
+            self.cache.put(key, generation, rows)
+        return rows
+
+    def get(self, patient_id):
+        """Full row: (id, name, age, gender, phone, disease, chronic,
+        admission_date, notes, followup_date) or None."""
+        row = self._lookup(SQL_GET, patient_id)
+        return _unpack_row(row) if row else None
+
+    def search(self, where=None, params=(), order_by="id", limit=None):
+        """Table rows (LIST_COLUMNS) matching an optional WHERE fragment."""
+        q = "SELECT " + LIST_COLUMNS + " FROM patients"
+        if where:
+            q += " WHERE " + where
+        q += " ORDER BY " + order_by
+        if limit is not None:
+            q += " LIMIT %d" % int(limit)
+        return self.query(q, params, cache=True)
+
+    def search_page(
+        self,
+        where=None,
+        params=(),
+        after=None,
+        limit=PAGE_SIZE,
+        order_key="id",
+        hits=None,
+        archive=False,
+    ):
+        """
+        One keyset page ordered by (order_key, id).
+
+        `after` is the cursor returned for the previous page (None for the
+        first one).  Returns (rows, next_cursor); next_cursor is None once
+        the last page has been read.  Each page is an index range scan, so
+        its cost does not grow with the page number.
+
+        `hits` is the trigram match from substring_filter().  With the
+        default id order the trigram index drives the query and each page
+        stops after `limit` matches.
+
+        archive=True pages through the archived rows as well; the
+        archives have no trigram index, so `hits` must be None.
+        """
+        cols = LIST_COLUMNS if order_key == "id" else LIST_COLUMNS + ", " + order_key
+        clauses = ["(" + where + ")"] if where else []
+        args = list(params)
+        source = self._search_source(archive, hits)
+        key = "id"
+        if hits is not None:
+            if order_key == "id":
+                source = SQL_TRIGRAM_SOURCE
+                key = "hit"
+            else:
+                clauses.append("id IN (" + SQL_TRIGRAM_HITS + ")")
+                args.append(hits)
+        if after is not None:
+            if order_key == "id":
+                clauses.append(key + " > ?")
+                args.append(after[0])
+            else:
+                clauses.append("(" + order_key + ", id) > (?, ?)")
+                args.extend(after)
+        if source == SQL_TRIGRAM_SOURCE:
+            args.insert(0, hits)
+        q = "SELECT " + cols + " FROM " + source
+        if clauses:
+            q += " WHERE " + " AND ".join(clauses)
+        if order_key == "id":
+            q += " ORDER BY " + key
+        else:
+            q += " ORDER BY " + order_key + ", id"
+        q += " LIMIT %d" % int(limit)
+        rows = self.query(q, args, cache=True)
+        if not rows:
+            return [], None
+        last = rows[-1]
+        if order_key == "id":
+            cursor = (last[0],)
+        else:
+            cursor = (last[-1], last[0])
+            rows = [r[:-1] for r in rows]
+        return rows, (cursor if len(rows) == limit else None)
+
+    def has_trigram(self):
+        if self._has_trigram is None:
+            self._has_trigram = (
+                self.connect()
+                .execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'patients_fts'"
+                )
+                .fetchone()
+                is not None
+            )
+        return self._has_trigram
+
+    def substring_filter(self, columns, text):
+        """substring_filter() using the trigram index if this database has
+        one."""
+        return substring_filter(columns, text, self.has_trigram())
+
+    def count_capped(
+        self, where=None, params=(), cap=COUNT_CAP, hits=None, archive=False
+    ):
+        """
+        (count, exact) -- stops counting after `cap` matches.  As with
+        search_page(), archive=True counts archived rows as well and then
+        takes no trigram `hits`.
+        """
+        args = list(params)
+        # raises for archive with hits, rather than counting only hot rows
+        source = self._search_source(archive, hits)
+        if hits is not None:
+            source = SQL_TRIGRAM_SOURCE
+            args.insert(0, hits)
+        q = "SELECT 1 FROM " + source
+        if where:
+            q += " WHERE " + where
+        q = "SELECT COUNT(*) FROM (" + q + " LIMIT %d)" % (int(cap) + 1)
+        n = self.query(q, args, cache=True)[0][0]
+        return (n, True) if n <= cap else (cap, False)
+
+    def count(self, where=None, params=()):
+        q = "SELECT COUNT(*) FROM patients"
+        if where:
+            q += " WHERE " + where
+        return self.query(q, params, cache=True)[0][0]
+
+    # --- bulk writes ---
+    def insert_rows(self, conn, records):
+        """Insert inside the caller's transaction; returns the new ids."""
+        ids = []
+        cur = conn.cursor()
+        for rec in records:
+            cur.execute(SQL_INSERT, self._write_params(conn, rec))
+            ids.append(cur.lastrowid)
+            self._index_record(conn, cur.lastrowid, rec)
+            self._write_notes(conn, cur.lastrowid, rec[NOTES_INDEX], replace=False)
+        return ids
+
+    def insert_many(self, records, batch_size=BATCH_SIZE):
+        """Insert records (tuples in COLUMNS order); returns the new ids."""
+        ids = []
+        for chunk in _chunks(records, batch_size):
+            with self.transaction() as conn:
+                ids.extend(self.insert_rows(conn, chunk))
+        return ids
+
+    def insert(self, record):
+        return self.insert_many([record])[0]
+
+    def update_rows(self, conn, items):
+        """Update inside the caller's transaction; returns rows changed."""
+        changed = 0
+        for pid, rec in items:
+            pid = int(pid)
+            params = self._write_params(conn, rec) + (pid,)
+            if not conn.execute(SQL_UPDATE, params).rowcount:
+                # gone, or archived: no keys or notes for a missing row
+                continue
+            changed += 1
+            conn.execute(SQL_DUP_KEY_DROP, (pid,))
+            self._index_record(conn, pid, rec)
+            self._write_notes(conn, pid, rec[NOTES_INDEX])
+        return changed
+
+    def update_many(self, items, batch_size=BATCH_SIZE):
+        """items: iterable of (id, record) pairs; returns rows changed."""
+        changed = 0
+        for chunk in _chunks(items, batch_size):
+            with self.transaction() as conn:
+                changed += self.update_rows(conn, chunk)
+        return changed
+
+    def update(self, patient_id, record):
+        return self.update_many([(patient_id, record)])
+
+    def delete_rows(self, conn, ids):
+        """Delete inside the caller's transaction; returns rows deleted."""
+        return conn.executemany(SQL_DELETE, [(int(i),) for i in ids]).rowcount
+
+    def delete_many(self, ids, batch_size=BATCH_SIZE):
+        deleted = 0
+        for chunk in _chunks(ids, batch_size):
+            with self.transaction() as conn:
+                deleted += self.delete_rows(conn, chunk)
+        return deleted
+
+    def delete(self, patient_id):
+        return self.delete_many([patient_id])
+
+    # --- patient level helpers ---
+    def find_duplicates(self, name, phone, disease, age, admission_date=None):
+        """
+        Possible duplicates for a new record, as dicts with type/id/text.
+
+        Exact phone matches come first; then rows sharing a blocking key
+        (dedupe.probe_keys), ranked by dedupe.similarity.
+        """
+        conn = self.connect()
+        dup_list = []
+
+        # 1) Strong phone match (exact)
+        if phone:
+            for r in conn.execute(SQL_DUP_PHONE, (phone,)):
+                dup_list.append(
+                    {
+                        "type": "phone",
+                        "id": r[0],
+                        "text": f"{r[1]} | age {r[2]} | {r[3]} | adm {r[4]}",
+                    }
+                )
+
+        # 2) Fuzzy matches: candidates from the blocking-key index only
+        keys = dedupe.probe_keys(name, age, phone, admission_date)
+        if not keys:
+            return dup_list
+        seen = {d["id"] for d in dup_list}
+        rows = conn.execute(
+            "SELECT id, name, age, phone, disease, admission_date FROM patients "
+            "WHERE id IN (SELECT patient_id FROM dup_keys WHERE key IN ("
+            + ", ".join("?" * len(keys))
+            + ") LIMIT %d)" % DUP_CANDIDATES,
+            keys,
+        ).fetchall()
+        new = {
+            "name": name,
+            "age": age,
+            "phone": phone,
+            "disease": disease,
+            "admission_date": admission_date,
+        }
+        scored = []
+        for pid, r_name, r_age, r_phone, r_disease, r_adm in rows:
+            if pid in seen:
+                continue
+            old = {
+                "name": r_name,
+                "age": r_age,
+                "phone": r_phone,
+                "disease": r_disease,
+                "admission_date": r_adm,
+            }
+            score = dedupe.similarity(new, old)
+            if score >= dedupe.MIN_SCORE:
+                scored.append((score, pid, r_name, r_phone, r_adm))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        for score, pid, r_name, r_phone, r_adm in scored[:10]:
+            dup_list.append(
+                {
+                    "type": "similar",
+                    "id": pid,
+                    "score": score,
+                    "text": f"{r_name} | phone {r_phone} | adm {r_adm} "
+                    f"| {int(score * 100)}% match",
+                }
+            )
+        return dup_list
+
+    def find_person(self, name, phone):
+        row = (
+            self.connect()
+            .execute(SQL_PERSON_ID, (person_key(name), _phone_key(phone)))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def visit_history(self, name, phone):
+        """(admission_date, disease, chronic) for every visit of a patient."""
+        person = self.find_person(name, phone)
+        if person is None:
+            return []
+        patients, _ = self.archive_sources()
+        return self.query(SQL_HISTORY.format(patients=patients), (person,))
+
+    def visit_history_for(self, patient_id):
+        """Visit history of the person a patients row belongs to."""
+        patients, _ = self.archive_sources()
+        return self.query(SQL_HISTORY_FOR.format(patients=patients), (patient_id,))
+
+    def patient_detail(self, patient_id):
+        """
+        Everything needed to open a record: the full row, its notes and
+        follow-up date, and the visit history of the same person.
+        Returns None if the id does not exist.  Archived rows and visits
+        are included.
+        """
+        if self._archive_schemas():
+            # row and history apart: see _lookup()
+            row = self._lookup(SQL_GET, patient_id)
+            if row is None:
+                return None
+            row = _unpack_row(row)
+            history = self.visit_history_for(patient_id)
+        else:
+            rows = self.connect().execute(SQL_DETAIL, (patient_id,)).fetchall()
+            if not rows:
+                return None
+            n = len(COLUMNS) + 2
+            row = _unpack_row(rows[0][:n])
+            history = [
+                r[n:] for r in rows if r[n] is not None or r[n + 1] is not None
+            ]
+        return {
+            "row": row,
+            "notes": row[COLUMNS.index("notes") + 1] or "",
+            "followup_date": row[COLUMNS.index("followup_date") + 1],
+            "history": history,
+        }
+
+    def upcoming_followups(self, first_day, last_day):
+        """(id, followup_date) with first_day <= followup_day <= last_day,
+        read as a range scan on idx_patients_followup_day."""
+        return self.query(
+            "SELECT id, followup_date FROM patients "
+            "WHERE followup_day BETWEEN ? AND ? ORDER BY followup_day",
+            (first_day, last_day),
+        )
+
+    def list_rows(self, ids, where=None, params=(), hits=None):
+        """
+        LIST_COLUMNS rows for the given ids (missing ids are skipped),
+        optionally only those that also match a search's where/hits.
+        """
+        extra = ""
+        args = []
+        if where:
+            extra += " AND (" + where + ")"
+            args.extend(params)
+        if hits is not None:
+            extra += " AND id IN (" + SQL_TRIGRAM_HITS + ")"
+            args.append(hits)
+        rows = []
+        for chunk in _chunks([int(i) for i in ids], 500):
+            rows.extend(
+                self.query(
+                    "SELECT " + LIST_COLUMNS + " FROM patients "
+                    "WHERE id IN (" + ", ".join("?" * len(chunk)) + ")" + extra,
+                    chunk + args,
+                )
+            )
+        return rows
+
+    # --- change log (patient_changes) ---
+    def last_change(self):
+        row = self.connect().execute(
+            "SELECT MAX(seq) FROM patient_changes"
+        ).fetchone()
+        return row[0] or 0
+
+    def changes_since(self, seq, limit=BATCH_SIZE):
+        """(first seq still logged, [(seq, patient_id)] after `seq`)."""
+        conn = self.connect()
+        first = conn.execute("SELECT MIN(seq) FROM patient_changes").fetchone()[0]
+        rows = conn.execute(
+            "SELECT seq, patient_id FROM patient_changes WHERE seq > ? "
+            "ORDER BY seq LIMIT ?",
+            (seq, limit),
+        ).fetchall()
+        return first, rows
+
+    def prune_changes(self, keep):
+        """Forget all but the last `keep` change-log entries."""
+        with self.transaction() as c:
+            c.execute(
+                "DELETE FROM patient_changes WHERE seq <= "
+                "(SELECT MAX(seq) FROM patient_changes) - ?",
+                (keep,),
+            )
+
+    def followup_rows(self, ids):
+        """(id, name, phone, disease, followup_date) for the given ids."""
+        ids = [int(i) for i in ids]
+        rows = []
+        for chunk in _chunks(ids, 500):
+            rows.extend(
+                self.query(
+                    "SELECT id, name, phone, disease, followup_date FROM patients "
+                    "WHERE id IN (" + ", ".join("?" * len(chunk)) + ")",
+                    chunk,
+                )
+            )
+        order = {pid: i for i, pid in enumerate(ids)}
+        return sorted(rows, key=lambda r: order[r[0]])
+
+    def find_similar(self, age, disease):
+        age = int(age)
+        return self.query(SQL_SIMILAR, (disease, age - 5, age + 5))
+
+    # --- aggregates (reports / charts) ---
+    def gender_counts(self):
+        return self.query(
+            "SELECT gender, COUNT(*) FROM patients GROUP BY gender", cache=True
+        )
+
+    def type_counts(self):
+        return self.query(
+            "SELECT chronic, COUNT(*) FROM patients GROUP BY chronic", cache=True
+        )
+
+    def disease_counts(self, limit=None):
+        q = (
+            "SELECT disease, COUNT(*) AS cnt FROM patients "
+            "WHERE disease IS NOT NULL AND disease != '' "
+            "GROUP BY disease ORDER BY cnt DESC"
+        )
+        if limit is not None:
+            q += " LIMIT %d" % int(limit)
+        return self.query(q, cache=True)
+
+    def calendar_counts(self, year, month):
+        """
+        {day of month: (admissions, follow-ups)} for one calendar month.
+        One GROUP BY over two range scans (admission_day, followup_day);
+        served from the query cache until the data changes.
+        """
+        first = datetime.date(year, month, 1)
+        nxt = datetime.date(year + (month == 12), month % 12 + 1, 1)
+        lo, hi = day_number(first), day_number(nxt) - 1
+        rows = self.query(
+            "SELECT day, SUM(kind = 0), SUM(kind = 1) FROM ("
+            "SELECT admission_day AS day, 0 AS kind FROM patients "
+            "WHERE admission_day BETWEEN ? AND ? "
+            "UNION ALL "
+            "SELECT followup_day, 1 FROM patients "
+            "WHERE followup_day BETWEEN ? AND ?"
+            ") GROUP BY day",
+            (lo, hi, lo, hi),
+            cache=True,
+        )
+        return {day - lo + 1: (adm, fu) for day, adm, fu in rows}
+
+    def monthly_counts(self, since=None):
+        """
+        (YYYY-MM, count) ordered by month, for admissions on or after the
+        date `since` (all of them by default).  Rows without a valid
+        admission date are not counted.
+        """
+        first = day_number(since) if since is not None else 0
+        # per-day counts come straight off idx_patients_admission_day;
+        # only the few hundred day rows are folded into months
+        return self.query(
+            "SELECT strftime('%Y-%m', day) AS ym, SUM(n) FROM "
+            "(SELECT admission_day AS day, COUNT(*) AS n FROM patients "
+            "WHERE admission_day >= ? GROUP BY admission_day) "
+            "GROUP BY ym ORDER BY ym",
+            (first,),
+            cache=True,
+        )
+
+    def person_counts(self):
+        """(unique patients, patients with more than one visit)."""
+        row = self.query(
+            "SELECT COUNT(*), COALESCE(SUM(n > 1), 0) FROM "
+            "(SELECT COUNT(*) AS n FROM patients "
+            "WHERE person_id IS NOT NULL GROUP BY person_id)",
+            cache=True,
+        )[0]
+        return row[0], row[1]
+
+    def age_disease_pairs(self):
+        return self.query(
+            "SELECT age, disease FROM patients WHERE age IS NOT NULL", cache=True
+        )
+
+    def gender_by_disease(self, diseases):
+        """{disease: {gender: count}} for the given diseases in one query."""
+        diseases = list(diseases)
+        if not diseases:
+            return {}
+        marks = ", ".join("?" * len(diseases))
+        out = {d: {} for d in diseases}
+        for disease, gender, cnt in self.query(
+            "SELECT disease, gender, COUNT(*) FROM patients "
+            "WHERE disease IN (" + marks + ") GROUP BY disease, gender",
+            diseases,
+            cache=True,
+        ):
+            out[disease][gender if gender else "Unknown"] = cnt
+        return out
@@ -0,0 +1,156 @@
+# query_cache.py
+"""
+Result cache for read queries against the PRMS database.
+
+Entries are keyed by (normalized SQL, params) and stamped with a
+"generation": PatientStore uses (PRAGMA data_version, local write counter),
+which changes whenever any connection commits.  When the generation moves
+on, every entry is stale and the cache is emptied in one go.
+
+Eviction is LRU, bounded both by the total number of cached rows and by
+an estimate of their memory footprint.  DetailCache applies the same
+stamping to the per-patient detail shown when a row is opened.
+"""
+
+import sys
+import threading
+from collections import OrderedDict
+
+
+def normalize_sql(sql):
+    """Collapse whitespace so equivalent query strings share one entry."""
+    return " ".join(sql.split())
+
+
+def estimate_size(rows, sample=500):
+    """Rough byte size of a list of row tuples (sampled for big results)."""
+    n = len(rows)
+    step = max(1, n // sample)
+    picked = rows[::step]
+    size = 0
+    for row in picked:
+        size += sys.getsizeof(row)
+        for v in row:
+            size += sys.getsizeof(v)
+    if picked:
+        size = size * n // len(picked)
+    return sys.getsizeof(rows) + size
+
+
+class QueryCache:
+    def __init__(self, max_rows=200000, max_bytes=64 * 1024 * 1024):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (rows, nrows, nbytes)
+        self._generation = None
+        self._rows = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(sql, params=()):
+        return normalize_sql(sql), tuple(params)
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            self._entries.clear()
+            self._rows = 0
+            self._bytes = 0
+            self._generation = generation
+
+    def get(self, key, generation):
+        """Cached rows for key, or None if missing/stale."""
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, generation, rows):
+        nrows = len(rows)
+        nbytes = estimate_size(rows)
+        # results bigger than the whole budget are never cached
+        if nrows > self.max_rows or nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._rows -= old[1]
+                self._bytes -= old[2]
+            self._entries[key] = (rows, nrows, nbytes)
+            self._rows += nrows
+            self._bytes += nbytes
+            while self._rows > self.max_rows or self._bytes > self.max_bytes:
+                _, (_, r, b) = self._entries.popitem(last=False)
+                self._rows -= r
+                self._bytes -= b
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._rows = 0
+            self._bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "rows": self._rows,
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class DetailCache:
+    """
+    LRU of per-patient detail dicts (notes, follow-up, visit history).
+
+    Uses the same generation stamp as QueryCache.  Background prefetches
+    pass the generation captured when they were scheduled; if the
+    database moved on while they ran, their result is dropped instead of
+    being mixed into a newer cache.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+    def get(self, patient_id, generation):
+        with self._lock:
+            self._check_generation(generation)
+            detail = self._entries.get(patient_id)
+            if detail is not None:
+                self._entries.move_to_end(patient_id)
+            return detail
+
+    def __contains__(self, patient_id):
+        return patient_id in self._entries
+
+    def put(self, patient_id, generation, detail):
+        with self._lock:
+            if generation != self._generation:
+                if self._generation is not None:
+                    return
+                self._generation = generation
+            self._entries[patient_id] = detail
+            self._entries.move_to_end(patient_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,132 @@
+# dedupe.py
+"""
+Blocking keys and similarity scoring for fuzzy duplicate detection.
+
+Comparing a new record against every stored row is O(n).  Instead each row
+is filed under a few short "blocking keys" (stored in the dup_keys side
+table by PatientStore), and a new record only gets compared with rows that
+share at least one key:
+
+    np:<name code>|<last 4 phone digits>
+    nb:<name code>|<birth-year band>
+
+The name code is the Soundex of every name token, sorted, so "Farhan Ali",
+"Farhaan Ali" and "Ali Farhan" all block together.  Candidates are then
+ranked with similarity().
+"""
+
+import datetime
+from difflib import SequenceMatcher
+
+# width of a birth-year band in years
+BAND_YEARS = 5
+# minimum similarity() score worth showing to the user
+MIN_SCORE = 0.75
+
+_SOUNDEX = {}
+for _letters, _digit in (
+    ("bfpv", "1"),
+    ("cgjkqsxz", "2"),
+    ("dt", "3"),
+    ("l", "4"),
+    ("mn", "5"),
+    ("r", "6"),
+):
+    for _ch in _letters:
+        _SOUNDEX[_ch] = _digit
+
+
+def soundex(word):
+    """Classic 4-character American Soundex ('' for words without letters)."""
+    letters = [ch for ch in word.lower() if ch.isalpha()]
+    if not letters:
+        return ""
+    first = letters[0]
+    code = [first.upper()]
+    prev = _SOUNDEX.get(first, "")
+    for ch in letters[1:]:
+        digit = _SOUNDEX.get(ch, "")
+        if digit and digit != prev:
+            code.append(digit)
+            if len(code) == 4:
+                break
+        # h and w do not separate letters with the same code
+        if ch not in "hw":
+            prev = digit
+    return "".join(code).ljust(4, "0")
+
+
+def name_code(name):
+    codes = sorted(c for c in (soundex(t) for t in (name or "").split()) if c)
+    return " ".join(codes)
+
+
+def phone_suffix(phone):
+    digits = "".join(ch for ch in str(phone or "") if ch.isdigit())
+    return digits[-4:] if len(digits) >= 4 else ""
+
+
+def birth_band(age, admission_date):
+    """Band of the approximate birth year, or None if it can't be derived."""
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return None
+    try:
+        year = int(str(admission_date)[:4])
+    except (TypeError, ValueError):
+        year = datetime.date.today().year
+    return (year - age) // BAND_YEARS
+
+
+def blocking_keys(name, age, phone, admission_date):
+    """Keys a stored record is filed under."""
+    code = name_code(name)
+    if not code:
+        return []
+    keys = []
+    suffix = phone_suffix(phone)
+    if suffix:
+        keys.append(f"np:{code}|{suffix}")
+    band = birth_band(age, admission_date)
+    if band is not None:
+        keys.append(f"nb:{code}|{band}")
+    return keys
+
+
+def probe_keys(name, age, phone, admission_date):
+    """Keys to look up for a new record (neighbouring birth bands too,
+    since an age is only accurate to a year or so)."""
+    keys = blocking_keys(name, age, phone, admission_date)
+    band = birth_band(age, admission_date)
+    if band is not None and keys:
+        code = name_code(name)
+        keys.append(f"nb:{code}|{band - 1}")
+        keys.append(f"nb:{code}|{band + 1}")
+    return keys
+
+
+def similarity(new, old):
+    """
+    Score in [0, 1] between two records given as dicts with name, age,
+    phone, disease and admission_date.
+    """
+    a = " ".join((new.get("name") or "").lower().split())
+    b = " ".join((old.get("name") or "").lower().split())
+    score = 0.7 * SequenceMatcher(None, a, b).ratio()
+
+    pa = str(new.get("phone") or "")
+    pb = str(old.get("phone") or "")
+    if pa and pa == pb:
+        score += 0.2
+    elif phone_suffix(pa) and phone_suffix(pa) == phone_suffix(pb):
+        score += 0.1
+
+    ba = birth_band(new.get("age"), new.get("admission_date"))
+    bb = birth_band(old.get("age"), old.get("admission_date"))
+    if ba is not None and bb is not None and abs(ba - bb) <= 1:
+        score += 0.1
+
+    if new.get("disease") and new.get("disease") == old.get("disease"):
+        score += 0.1
+    return round(min(score, 1.0), 3)
@@ -0,0 +1,117 @@
+# prms_bench.py
+"""
+Substring search benchmark: LIKE '%x%' scan vs the trigram index.
+
+Builds synthetic databases of growing size and times the first result
+page and the capped match count for a few terms, once through a plain
+LIKE scan and once through PatientStore.substring_filter().
+
+    python prms_bench.py                 # 10k, 100k, 1M rows
+    python prms_bench.py 50000 200000    # custom sizes
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from patient_store import PAGE_SIZE, PatientStore
+
+FIRST = ["Farhan", "Ayesha", "Rahul", "Priya", "Imran", "Sara", "Vikram", "Neha"]
+LAST = ["Ali", "Khan", "Sharma", "Patel", "Reddy", "Das", "Iyer", "Singh"]
+DISEASES = [
+    "Diabetes",
+    "Hypertension",
+    "Asthma",
+    "Dengue",
+    "Malaria",
+    "Migraine",
+    "Typhoid",
+    "Zika Virus",
+]
+# (column, term): broad and rare terms, plus one below the trigram minimum
+TERMS = [
+    ("name", "farhan ali"),
+    ("name", "qzx"),
+    ("phone", "12345"),
+    ("disease", "dia"),
+    ("disease", "ty"),
+]
+
+
+def make_db(path, n, seed=1):
+    rng = random.Random(seed)
+    store = PatientStore(path)
+    store.ensure_schema()
+    rows = []
+    for _ in range(n):
+        rows.append(
+            (
+                f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+                rng.randint(1, 90),
+                rng.choice(["Male", "Female"]),
+                str(rng.randint(6000000000, 9999999999)),
+                rng.choice(DISEASES),
+                rng.randint(0, 1),
+                "2024-%02d-%02d" % (rng.randint(1, 12), rng.randint(1, 28)),
+                "",
+                None,
+            )
+        )
+    store.insert_many(rows)
+    return store
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def bench(store, column, term):
+    pattern = (f"%{term}%",)
+    scan = "%s LIKE ?" % column
+    where, params, hits = store.substring_filter((column,), term)
+    conn = store.connect()
+
+    def like_page():
+        conn.execute(
+            "SELECT id FROM patients WHERE " + scan + " ORDER BY id LIMIT ?",
+            pattern + (PAGE_SIZE,),
+        ).fetchall()
+
+    def index_page():
+        store.cache.clear()
+        store.search_page(where, params, hits=hits)
+
+    def index_count():
+        store.cache.clear()
+        store.count_capped(where, params, hits=hits)
+
+    return timed(like_page), timed(index_page), timed(index_count), hits is not None
+
+
+def main(sizes):
+    print(
+        "%9s  %-8s %-12s %10s %10s %10s  %s"
+        % ("rows", "column", "term", "like ms", "page ms", "count ms", "index")
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            store = make_db(os.path.join(tmp, "bench_%d.db" % n), n)
+            for column, term in TERMS:
+                like, page, count, indexed = bench(store, column, term)
+                print(
+                    "%9d  %-8s %-12s %10.1f %10.1f %10.1f  %s"
+                    % (n, column, term, like, page, count, "yes" if indexed else "no")
+                )
+            store.close()
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,228 @@
+# search_query.py
+"""
+Search-bar query language for PRMS (no tkinter imports here).
+
+A query is a list of field:value terms, all of which must match:
+
+    disease:diabetes age:50-70 gender:Female adm:2024
+    name:"farhan ali" phone:98765 adm:"last 90d"
+
+Fields: id, name, age, gender, phone, disease, type, adm, risk.  age
+takes N, A-B, >N, <N, >=N or <=N; adm takes everything
+parse_date_range() understands; risk takes High, Medium or Low.  Words
+without a field search name and disease.  Text with no field:value term
+at all is searched in the field picked in the combobox, exactly like
+before.
+
+compile_query() turns the text into one parameterized WHERE fragment
+plus at most one trigram match expression (every substring term shares
+it), validated with the same rules as the single-field search.  Compiled
+plans are memoized, so re-running a search only re-executes the SQL.
+"""
+
+import datetime
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+from ai_helpers import RISK_LEVELS
+from patient_store import day_range_clause, parse_date_range, substring_filter
+
+GENDER_CHOICES = ["Male", "Female", "Other"]
+TYPE_CHOICES = ["Chronic", "Acute"]
+
+# combobox label -> query field
+FIELD_LABELS = {
+    "ID": "id",
+    "Name": "name",
+    "Age": "age",
+    "Gender": "gender",
+    "Phone": "phone",
+    "Disease": "disease",
+    "Type": "type",
+    "Admission Date": "adm",
+    "Risk": "risk",
+}
+
+FIELD_ALIASES = {
+    "sex": "gender",
+    "dx": "disease",
+    "date": "adm",
+    "admission": "adm",
+    "admitted": "adm",
+    "triage": "risk",
+}
+
+# evaluation order of the WHERE terms: index-backed predicates first,
+# then cheap equality checks on unindexed columns, LIKE scans last
+FIELD_RANK = {
+    "id": 0,
+    "adm": 1,
+    "risk": 2,
+    "age": 3,
+    "type": 4,
+    "gender": 5,
+    "phone": 6,
+    "name": 7,
+    "disease": 8,
+    "any": 9,
+}
+
+_TERM_RE = re.compile(r'(?:([A-Za-z]+):)?("[^"]*"?|\S+)')
+_AGE_CMP_RE = re.compile(r"(>=|<=|>|<)\s*(\d+)")
+
+CompiledQuery = namedtuple("CompiledQuery", "where params hits order_key")
+
+
+class QueryError(ValueError):
+    """Invalid search text; the message is meant for the user."""
+
+
+def tokenize(text):
+    """[(field or None, value)] with quotes removed."""
+    terms = []
+    for field, value in _TERM_RE.findall(text):
+        if not field and value.endswith(":") and value[:-1].isalpha():
+            # "name:" with nothing after it
+            field, value = value[:-1], ""
+        elif value.startswith('"'):
+            value = value[1:-1] if value.endswith('"') and len(value) > 1 else value[1:]
+        terms.append((field.lower() or None, value.strip()))
+    return terms
+
+
+def _is_structured(terms):
+    return any(
+        field in FIELD_RANK or field in FIELD_ALIASES for field, _ in terms
+    )
+
+
+def _age_clause(value):
+    m = _AGE_CMP_RE.fullmatch(value)
+    if m:
+        return "age %s ?" % m.group(1), (int(m.group(2)),)
+    if "-" in value:
+        parts = value.split("-", 1)
+        try:
+            a = int(parts[0].strip())
+            b = int(parts[1].strip())
+        except ValueError:
+            raise QueryError(
+                "Age range invalid. Use e.g. 20-30 or a single age like 45."
+            )
+        return "age BETWEEN ? AND ?", (min(a, b), max(a, b))
+    try:
+        return "age = ?", (int(value),)
+    except ValueError:
+        raise QueryError("Age must be a number or range (20-30).")
+
+
+def _choice(value, choices, label):
+    for c in choices:
+        if c.lower() == value.lower():
+            return c
+    raise QueryError(f"{label} must be one of: {', '.join(choices)}.")
+
+
+def compile_term(field, value, trigram=True, today=None):
+    """
+    (where, params, hits, order_key) for one field:value term; any of the
+    first three may be empty.  Raises QueryError.
+    """
+    if field == "id":
+        try:
+            return "id = ?", (int(value),), None, None
+        except ValueError:
+            raise QueryError("ID must be an integer.")
+    if field == "name":
+        if any(ch.isdigit() for ch in value):
+            raise QueryError(
+                "Name search cannot contain numbers. "
+                "Enter alphabetic characters only."
+            )
+        return substring_filter(("name",), value, trigram) + (None,)
+    if field == "age":
+        return _age_clause(value) + (None, None)
+    if field == "gender":
+        gender = _choice(value, GENDER_CHOICES, "Gender")
+        return "LOWER(gender) = LOWER(?)", (gender,), None, None
+    if field == "phone":
+        return substring_filter(("phone",), value, trigram) + (None,)
+    if field == "disease":
+        if value.isdigit():
+            raise QueryError("Disease search cannot be numeric. Type a disease name.")
+        return substring_filter(("disease",), value, trigram) + (None,)
+    if field == "type":
+        kind = _choice(value, TYPE_CHOICES, "Type")
+        return "chronic = ?", (1 if kind == "Chronic" else 0,), None, None
+    if field == "adm":
+        try:
+            first, last = parse_date_range(value, today)
+        except ValueError:
+            raise QueryError(
+                "Enter YYYY, YYYY-MM or YYYY-MM-DD, a range such as "
+                "2024-01-01..2024-03-31, or e.g. 'last 90d'."
+            )
+        # page through the date index in date order
+        where, params = day_range_clause("admission_day", first, last)
+        return where, params, None, "admission_day"
+    if field == "risk":
+        level = _choice(value, RISK_LEVELS, "Risk")
+        return "risk_rank = ?", (RISK_LEVELS.index(level),), None, None
+    if field == "any":
+        return substring_filter(("name", "disease"), value, trigram) + (None,)
+    raise QueryError(f"Unknown search field '{field}'.")
+
+
+@lru_cache(maxsize=256)
+def compile_query(text, default_field="any", trigram=True, today=None):
+    """
+    CompiledQuery for the search-bar text.  `today` anchors relative
+    dates ("last 90d") and is part of the cache key, so pass
+    datetime.date.today() rather than leaving it to the parser.
+    """
+    text = text.strip()
+    terms = tokenize(text)
+    if not _is_structured(terms):
+        # plain text: one term for the field picked in the combobox
+        terms = [(default_field, text)]
+    else:
+        loose = " ".join(v for f, v in terms if f is None)
+        terms = [(FIELD_ALIASES.get(f, f), v) for f, v in terms if f is not None]
+        if loose:
+            terms.append(("any", loose))
+    today = today or datetime.date.today()
+
+    compiled = []
+    for field, value in terms:
+        if field not in FIELD_RANK:
+            raise QueryError(
+                f"Unknown search field '{field}'. "
+                "Use id, name, age, gender, phone, disease, type, adm or risk."
+            )
+        if not value:
+            raise QueryError(f"Missing value after '{field}:'.")
+        compiled.append((FIELD_RANK[field], compile_term(field, value, trigram, today)))
+    compiled.sort(key=lambda item: item[0])
+
+    clauses = []
+    params = []
+    hits = []
+    order_key = "id"
+    for _, (where, args, match, order) in compiled:
+        if where:
+            clauses.append(where)
+            params.extend(args)
+        if match:
+            hits.append(match)
+        if order:
+            order_key = order
+    if hits:
+        # the trigram index drives the query and already returns id order
+        order_key = "id"
+    return CompiledQuery(
+        " AND ".join(clauses) or None,
+        tuple(params),
+        " AND ".join(hits) or None,
+        order_key,
+    )
@@ -0,0 +1,119 @@
+# reminders.py
+"""
+Follow-up reminder queue for PRMS (no tkinter imports here).
+
+Upcoming follow-ups are loaded once with an indexed range query on
+followup_day and kept in a min-heap ordered by due time, so the GUI only
+needs a single timer armed for the earliest entry instead of polling.
+
+Writes are merged incrementally: update() pushes a new heap entry and
+remembers it as the patient's current one; entries that no longer match
+(changed or removed follow-ups) are discarded lazily when they reach the
+top of the heap.
+"""
+
+import datetime
+import heapq
+
+from patient_store import day_number
+
+# follow-ups are dates; a reminder is due at this hour of that day
+REMINDER_HOUR = 9
+# how far ahead follow-ups are loaded; the queue reloads when it runs out
+HORIZON_DAYS = 30
+# longest single timer, so clock changes and suspend are caught up on
+MAX_SLEEP = 3600
+
+
+def _as_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class ReminderQueue:
+    def __init__(self, hour=REMINDER_HOUR, horizon_days=HORIZON_DAYS):
+        self.hour = hour
+        self.horizon_days = horizon_days
+        self._heap = []  # (due, patient_id)
+        self._due = {}  # patient_id -> due of its live heap entry
+        self._fired = set()  # (patient_id, due) already shown
+        self.window_end = None
+
+    def __len__(self):
+        return len(self._due)
+
+    def load(self, store, now=None):
+        """(Re)load follow-ups due from today to today + horizon_days."""
+        now = now or datetime.datetime.now()
+        today = now.date()
+        last = today + datetime.timedelta(days=self.horizon_days)
+        self._heap = []
+        self._due = {}
+        self.window_end = datetime.datetime.combine(last, datetime.time())
+        for patient_id, followup_date in store.upcoming_followups(
+            day_number(today), day_number(last)
+        ):
+            self.update(patient_id, followup_date)
+        # forget fired reminders that can no longer come back
+        start = datetime.datetime.combine(today, datetime.time())
+        self._fired = {f for f in self._fired if f[1] >= start}
+
+    def update(self, patient_id, followup_date):
+        """Merge a written follow-up (None/invalid removes the reminder)."""
+        d = _as_date(followup_date) if followup_date else None
+        due = datetime.datetime.combine(d, datetime.time(self.hour)) if d else None
+        if (
+            due is None
+            or (self.window_end is not None and due >= self.window_end)
+            or (patient_id, due) in self._fired
+        ):
+            self._due.pop(patient_id, None)
+            return
+        if self._due.get(patient_id) == due:
+            return
+        self._due[patient_id] = due
+        heapq.heappush(self._heap, (due, patient_id))
+
+    def remove(self, patient_id):
+        self._due.pop(patient_id, None)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._due.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_due(self):
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now=None):
+        """Patient ids whose reminder is due, earliest first."""
+        now = now or datetime.datetime.now()
+        ids = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return ids
+            due, patient_id = heapq.heappop(self._heap)
+            del self._due[patient_id]
+            self._fired.add((patient_id, due))
+            ids.append(patient_id)
+
+    def expired(self, now=None):
+        """True once the loaded window has run out and load() is due."""
+        now = now or datetime.datetime.now()
+        return self.window_end is None or now >= self.window_end
+
+    def seconds_until_next(self, now=None):
+        """Seconds to sleep before the next reminder or window reload."""
+        now = now or datetime.datetime.now()
+        wake = self.next_due()
+        if self.window_end is not None and (wake is None or self.window_end < wake):
+            wake = self.window_end
+        if wake is None:
+            return MAX_SLEEP
+        return min(max((wake - now).total_seconds(), 0), MAX_SLEEP)
@@ -0,0 +1,288 @@
+# backfill.py
+"""
+Resumable backfill of derived columns (no tkinter imports here).
+
+A derivation computes one or more patients columns from others, e.g.
+followup_date from admission_date and disease.  Rows written before a
+derivation existed are filled in by BackfillRunner, which walks the
+table in id order, one short BEGIN IMMEDIATE transaction per chunk, so
+other workstations are never locked out for long.  The last id done is
+saved in store_meta with every chunk: an interrupted run resumes where
+it stopped, and a later run only looks at rows added since.
+
+    python backfill.py                 # every registered derivation
+    python backfill.py followup_date   # just one
+    python backfill.py --reset followup_date
+    python backfill.py --risk          # re-score risk after a rule change
+"""
+
+import sys
+import time
+from collections import namedtuple
+
+import ai_helpers
+from patient_store import BATCH_SIZE, PatientStore, unpack_notes
+
+# name: store_meta key suffix; inputs/outputs: patients columns;
+# needs(row) -> bool picks the rows to fill; compute(row) -> tuple of
+# output values, or None to leave the row alone
+Derivation = namedtuple("Derivation", "name inputs outputs needs compute")
+
+DERIVATIONS = {}
+
+
+def register(name, inputs, outputs, needs, compute):
+    DERIVATIONS[name] = Derivation(
+        name, tuple(inputs), tuple(outputs), needs, compute
+    )
+
+
+def _followup(row):
+    followup = ai_helpers.suggest_followup_date(row["admission_date"], row["disease"])
+    return (followup,) if followup else None
+
+
+register(
+    "followup_date",
+    inputs=("admission_date", "disease", "followup_date"),
+    outputs=("followup_date",),
+    needs=lambda row: not row["followup_date"],
+    compute=_followup,
+)
+
+
+def _meta_key(name):
+    return "backfill:" + name
+
+
+class BackfillRunner:
+    """Fills one derivation in; progress(dict) is called after each chunk."""
+
+    def __init__(self, store, derivation, batch_size=1000, progress=None, pause=0.0):
+        if isinstance(derivation, str):
+            derivation = DERIVATIONS[derivation]
+        self.store = store
+        self.derivation = derivation
+        self.batch_size = batch_size
+        self.progress = progress
+        # seconds to sleep between chunks, to leave the write lock alone
+        self.pause = pause
+        self._select = (
+            "SELECT id, "
+            + ", ".join(derivation.inputs)
+            + " FROM patients WHERE id > ? ORDER BY id LIMIT ?"
+        )
+        self._update = (
+            "UPDATE patients SET "
+            + ", ".join(c + " = ?" for c in derivation.outputs)
+            + " WHERE id = ?"
+        )
+
+    def last_id(self):
+        row = self.store.connect().execute(
+            "SELECT value FROM store_meta WHERE key = ?",
+            (_meta_key(self.derivation.name),),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def reset(self):
+        """Forget the saved position, so the next run starts over."""
+        with self.store.transaction() as c:
+            c.execute(
+                "DELETE FROM store_meta WHERE key = ?",
+                (_meta_key(self.derivation.name),),
+            )
+
+    def run(self):
+        """Walk the rest of the table; returns the number of rows updated."""
+        conn = self.store.connect()
+        key = _meta_key(self.derivation.name)
+        last_id = self.last_id()
+        total = conn.execute(
+            "SELECT COUNT(*) FROM patients WHERE id > ?", (last_id,)
+        ).fetchone()[0]
+        inputs = self.derivation.inputs
+        started = time.perf_counter()
+        scanned = updated = 0
+        while True:
+            # read and write the chunk under one write lock, so a value
+            # another workstation writes meanwhile is not overwritten
+            with self.store.transaction() as c:
+                rows = c.execute(self._select, (last_id, self.batch_size)).fetchall()
+                if not rows:
+                    break
+                params = []
+                for row in rows:
+                    values = dict(zip(inputs, row[1:]))
+                    if not self.derivation.needs(values):
+                        continue
+                    out = self.derivation.compute(values)
+                    if out is not None:
+                        params.append(tuple(out) + (row[0],))
+                last_id = rows[-1][0]
+                if params:
+                    c.executemany(self._update, params)
+                c.execute(
+                    "INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)",
+                    (key, last_id),
+                )
+            scanned += len(rows)
+            updated += len(params)
+            if self.progress:
+                elapsed = time.perf_counter() - started
+                rate = scanned / elapsed if elapsed else 0.0
+                self.progress(
+                    {
+                        "name": self.derivation.name,
+                        "scanned": scanned,
+                        "total": total,
+                        "updated": updated,
+                        "rows_per_sec": rate,
+                        "eta": (total - scanned) / rate if rate else None,
+                    }
+                )
+            if self.pause:
+                time.sleep(self.pause)
+        return updated
+
+
+def run_all(store, names=None, progress=None, batch_size=1000):
+    """Run the named derivations (all by default); {name: rows updated}."""
+    return {
+        name: BackfillRunner(store, name, batch_size, progress).run()
+        for name in (names or list(DERIVATIONS))
+    }
+
+
+# risk_flag's int(age) and truthiness of chronic, done by SQLite; ages that
+# are neither integers nor NULL come back as NULL and go through int()
+SQL_RISK_INPUTS = (
+    "SELECT p.id, "
+    "CASE typeof(p.age) WHEN 'integer' THEN p.age WHEN 'null' THEN 0 END, "
+    "p.age, COALESCE(CAST(p.disease AS TEXT), ''), "
+    "CASE typeof(p.chronic) WHEN 'null' THEN 0 "
+    "WHEN 'integer' THEN p.chronic != 0 WHEN 'real' THEN p.chronic != 0 "
+    "ELSE length(p.chronic) > 0 END, "
+    "n.compressed, n.body, p.risk_rank, p.admission_rec "
+    "FROM patients p LEFT JOIN patient_notes n ON n.patient_id = p.id "
+    "WHERE %sp.id > ? ORDER BY p.id LIMIT ?"
+)
+# missing_only: unscored rows only, a range scan on idx_patients_risk
+SQL_RISK_MISSING = "p.risk_rank IS NULL AND "
+
+
+def _int_or_zero(value):
+    try:
+        return int(value)
+    except Exception:
+        return 0
+
+
+def _risk_changes(rows, missing_only):
+    """(risk_rank, admission_rec, id) for the SQL_RISK_INPUTS rows whose
+    stored values differ from the rules."""
+    if missing_only:
+        rows = [r for r in rows if r[7] is None]  # scored meanwhile
+    if not rows:
+        return []
+    cols = list(zip(*rows))
+    ids, ages, raw_ages, diseases, chronic = cols[:5]
+    packed, bodies, old_rank, old_rec = cols[5:]
+    ages = [
+        a if a is not None else _int_or_zero(raw) for a, raw in zip(ages, raw_ages)
+    ]
+    ranks = ai_helpers.risk_rank_array(ages, diseases, chronic)
+    notes = [unpack_notes(c, b) for c, b in zip(packed, bodies)]
+    advice = ai_helpers.admission_recommendation_array(ranks, notes)
+    return [
+        (int(r), str(a), pid)
+        for pid, r, a, o_r, o_a in zip(ids, ranks, advice, old_rank, old_rec)
+        if r != o_r or a != o_a
+    ]
+
+
+def recompute_risk(store, batch_size=BATCH_SIZE, missing_only=False, progress=None):
+    """
+    Re-score risk_rank / admission_rec for the whole table with the
+    vectorized rules (ai_helpers.risk_rank_array), e.g. after the rules
+    changed.  Only rows whose stored values differ are written, one
+    short transaction per chunk.  missing_only reads only rows that have
+    no score yet, and nothing at all (no write lock either) when every row
+    is scored.  Returns the number of rows updated.
+    """
+    conn = store.connect()
+    if missing_only:
+        sql = SQL_RISK_INPUTS % SQL_RISK_MISSING
+        total = conn.execute(
+            "SELECT COUNT(*) FROM patients WHERE risk_rank IS NULL"
+        ).fetchone()[0]
+        if not total:
+            return 0  # the usual startup case: nothing to do, no write lock
+    else:
+        sql = SQL_RISK_INPUTS % ""
+        total = conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+    started = time.perf_counter()
+    last_id = 0
+    scanned = updated = 0
+    while True:
+        # read and write the chunk under one write lock, so a score that
+        # update_rows computes from newer values is not overwritten
+        with store.transaction() as c:
+            rows = c.execute(sql, (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scanned += len(rows)
+            params = _risk_changes(rows, missing_only)
+            if params:
+                c.executemany(
+                    "UPDATE patients SET risk_rank = ?, admission_rec = ? "
+                    "WHERE id = ?",
+                    params,
+                )
+                updated += len(params)
+        if progress:
+            elapsed = time.perf_counter() - started
+            rate = scanned / elapsed if elapsed else 0.0
+            progress(
+                {
+                    "name": "risk",
+                    "scanned": scanned,
+                    "total": total,
+                    "updated": updated,
+                    "rows_per_sec": rate,
+                    "eta": (total - scanned) / rate if rate else None,
+                }
+            )
+    return updated
+
+
+def print_progress(p):
+    eta = "?" if p["eta"] is None else "%.0fs" % p["eta"]
+    print(
+        "%s: %d/%d rows, %d updated, %.0f rows/s, ETA %s"
+        % (
+            p["name"],
+            p["scanned"],
+            p["total"],
+            p["updated"],
+            p["rows_per_sec"],
+            eta,
+        )
+    )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    store = PatientStore()
+    store.ensure_schema()
+    if args[:1] == ["--reset"]:
+        for name in args[1:] or list(DERIVATIONS):
+            BackfillRunner(store, name).reset()
+        sys.exit(0)
+    if args[:1] == ["--risk"]:
+        n = recompute_risk(store, progress=print_progress)
+        print(f"risk: done, {n} rows updated")
+        sys.exit(0)
+    for name, n in run_all(store, args, print_progress, BATCH_SIZE).items():
+        print(f"{name}: done, {n} rows updated")
@@ -0,0 +1,156 @@
+# triage.py
+"""
+High-risk triage queue for PRMS (no tkinter imports here).
+
+A patient's priority combines three signals already stored on the row:
+red-flag terms in the notes (admission_rec is the urgent one), the risk
+level (risk_rank) and how many days the follow-up is overdue.
+
+TriageQueue keeps only the best `capacity` patients, a few more than
+are listed, in a min-heap keyed by priority.  load() reads them with a
+single top-N query; writes are merged with update(), which pushes the
+lowest entry out once the queue is full.  Every patient left out has a
+priority no higher than `floor`, so the held entries above it are
+exactly the top of the table; when fewer than `size` of them remain, or
+the day (and with it every overdue count) changed, a reload is due.
+"""
+
+import datetime
+import heapq
+
+from patient_store import day_number
+
+URGENT = "Recommend urgent admission"
+URGENT_WEIGHT = 1000
+# by risk_rank: High, Medium, Low
+RISK_WEIGHTS = (300, 100, 0)
+# overdue days count one point each, up to this many
+MAX_OVERDUE = 180
+
+# the same priority as priority(), computed by SQLite for load()
+SQL_TOP = (
+    "SELECT id, priority FROM ("
+    "SELECT id, (COALESCE(admission_rec = ?, 0) * ?"
+    " + CASE risk_rank WHEN 0 THEN ? WHEN 1 THEN ? WHEN 2 THEN ? ELSE 0 END"
+    " + MIN(MAX(? - COALESCE(followup_day, ?), 0), ?)) AS priority "
+    "FROM patients"
+    ") WHERE priority > 0 ORDER BY priority DESC, id LIMIT ?"
+)
+SQL_ROWS = (
+    "SELECT id, name, phone, disease, risk_rank, admission_rec, followup_date, "
+    "followup_day FROM patients WHERE id IN (%s)"
+)
+SQL_INPUTS = (
+    "SELECT id, risk_rank, admission_rec, followup_day FROM patients "
+    "WHERE id IN (%s)"
+)
+
+
+def overdue_days(followup_day, today_day):
+    if followup_day is None:
+        return 0
+    return min(max(today_day - followup_day, 0), MAX_OVERDUE)
+
+
+def priority(risk_rank, admission_rec, followup_day, today_day):
+    score = URGENT_WEIGHT if admission_rec == URGENT else 0
+    if risk_rank is not None and 0 <= risk_rank < len(RISK_WEIGHTS):
+        score += RISK_WEIGHTS[risk_rank]
+    return score + overdue_days(followup_day, today_day)
+
+
+def triage_rows(store, ids):
+    """(id, name, phone, disease, risk_rank, admission_rec, followup_date,
+    followup_day) for the given ids, in that order."""
+    ids = [int(i) for i in ids]
+    if not ids:
+        return []
+    rows = store.query(SQL_ROWS % ", ".join("?" * len(ids)), ids)
+    order = {pid: i for i, pid in enumerate(ids)}
+    return sorted(rows, key=lambda r: order[r[0]])
+
+
+class TriageQueue:
+    def __init__(self, size=50, spare=50):
+        self.size = size
+        self.capacity = size + spare
+        self._heap = []  # (priority, patient_id), lowest first
+        self._priority = {}  # patient_id -> priority of its live heap entry
+        self.floor = 0
+        self.today = None
+
+    def __len__(self):
+        return len(self._priority)
+
+    def load(self, store, today=None):
+        """Read the top `capacity` patients for `today`."""
+        self.today = today or datetime.date.today()
+        today_day = day_number(self.today)
+        rows = store.query(
+            SQL_TOP,
+            (URGENT, URGENT_WEIGHT)
+            + RISK_WEIGHTS
+            + (today_day, today_day, MAX_OVERDUE, self.capacity + 1),
+        )
+        self._heap = []
+        self._priority = {}
+        # the first row left out bounds everything that was not read
+        self.floor = rows[self.capacity][1] if len(rows) > self.capacity else 0
+        for patient_id, score in rows[: self.capacity]:
+            self._priority[patient_id] = score
+            self._heap.append((score, patient_id))
+        heapq.heapify(self._heap)
+
+    def refresh(self, store, *patient_ids):
+        """Merge written (or deleted) patients, read back from the store."""
+        ids = [int(i) for i in patient_ids]
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            rows = store.query(SQL_INPUTS % ", ".join("?" * len(chunk)), chunk)
+            found = set()
+            for patient_id, risk_rank, admission_rec, followup_day in rows:
+                found.add(patient_id)
+                self.update(patient_id, risk_rank, admission_rec, followup_day)
+            for patient_id in chunk:
+                if patient_id not in found:
+                    self.remove(patient_id)
+
+    def update(self, patient_id, risk_rank, admission_rec, followup_day):
+        if self.today is None:
+            return
+        score = priority(
+            risk_rank, admission_rec, followup_day, day_number(self.today)
+        )
+        if score <= self.floor:
+            # can no longer be told apart from the patients left out
+            self._priority.pop(patient_id, None)
+            return
+        if self._priority.get(patient_id) == score:
+            return
+        self._priority[patient_id] = score
+        heapq.heappush(self._heap, (score, patient_id))
+        while len(self._priority) > self.capacity:
+            self._drop_stale()
+            lowest, evicted = heapq.heappop(self._heap)
+            del self._priority[evicted]
+            self.floor = max(self.floor, lowest)
+
+    def remove(self, patient_id):
+        self._priority.pop(patient_id, None)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._priority.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def stale(self, today=None):
+        """True when load() is due: a new day, or too few known entries."""
+        today = today or datetime.date.today()
+        if self.today != today:
+            return True
+        return len(self._priority) < self.size and self.floor > 0
+
+    def top(self):
+        """[(patient_id, priority)] for the listed patients, highest first."""
+        ranked = sorted(self._priority.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[: self.size]
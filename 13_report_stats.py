@@ -0,0 +1,271 @@
+# report_stats.py
+"""
+NumPy statistics engine for the PRMS reports (no tkinter imports here).
+
+StatsEngine reads the columns the charts need once into NumPy arrays,
+with genders and diseases as integer codes and admission dates as
+integer month keys, and keeps them until the database changes
+(store.change_count(), which also sees other workstations' writes).
+compute() then derives every chart series with bincount / np.add.at
+over those arrays, and hands back the same result until then:
+
+    engine = StatsEngine(store)
+    stats = engine.compute()        # what ReportsWindow.render draws
+
+engine_for(store) shares one engine per store, so reopening the reports
+window does not read the table again.
+"""
+
+import datetime
+import weakref
+
+import numpy as np
+
+# day_number() of 1970-01-01, the datetime64 epoch
+EPOCH_DAY = 2440588
+# age histogram: bins of AGE_BIN years from 0 to AGE_MAX (inclusive)
+AGE_BIN = 5
+AGE_MAX = 100
+GENDERS = ("Male", "Female", "Other")
+MISSING = -(2**62)
+
+# integer and real ages as int(age) would give them; text ages are
+# parsed in Python, anything else counts as missing
+SQL_COLUMNS = (
+    "SELECT gender, chronic, disease, "
+    "CASE typeof(age) WHEN 'integer' THEN age "
+    "WHEN 'real' THEN CAST(age AS INTEGER) "
+    "WHEN 'text' THEN age END, "
+    "admission_day, person_id FROM patients"
+)
+
+
+def _age(value):
+    if value is None:
+        return MISSING
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        return MISSING
+
+
+def _codes(values, names):
+    """Integer code per value, with names[code] the value."""
+    index = {name: i for i, name in enumerate(names)}
+    out = np.empty(len(values), dtype=np.int64)
+    for i, v in enumerate(values):
+        code = index.get(v)
+        if code is None:
+            code = index[v] = len(names)
+            names.append(v)
+        out[i] = code
+    return out
+
+
+def month_key(year, month):
+    """Months since 1970-01, the key used for admission months."""
+    return (year - 1970) * 12 + month - 1
+
+
+def month_label(key):
+    return "%04d-%02d" % (1970 + key // 12, key % 12 + 1)
+
+
+class StatsEngine:
+    def __init__(self, store):
+        # weak: engine_for() keys its engines by store, and a strong
+        # reference back would keep every store (and its files) alive
+        self._store = weakref.ref(store)
+        self.version = None
+        self.size = 0
+        self._stats = None
+        self._stats_key = None
+
+    @property
+    def store(self):
+        return self._store()
+
+    def load(self):
+        """(Re)read the columns unless the data is unchanged; True if read."""
+        version = self.store.change_count()
+        if version == self.version:
+            return False
+        rows = self.store.connect().execute(SQL_COLUMNS).fetchall()
+        n = self.size = len(rows)
+        cols = list(zip(*rows)) if rows else [()] * 6
+        genders, chronic, diseases, ages, days, persons = cols
+
+        # None and "" share one label, as in the old per-row dicts
+        self.gender_names = ["Unknown"]
+        self.gender = _codes([g or "Unknown" for g in genders], self.gender_names)
+        # disease code 0 is "no disease"
+        self.disease_names = [""]
+        self.disease = _codes([d or "" for d in diseases], self.disease_names)
+        self.chronic = np.fromiter((c == 1 for c in chronic), dtype=bool, count=n)
+        self.age = np.fromiter(map(_age, ages), dtype=np.int64, count=n)
+        day = np.fromiter(
+            (MISSING if d is None else d for d in days), dtype=np.int64, count=n
+        )
+        self.month = np.where(
+            day == MISSING,
+            MISSING,
+            (day - EPOCH_DAY).astype("datetime64[D]").astype("datetime64[M]")
+            .astype(np.int64),
+        )
+        self.person = np.fromiter(
+            (-1 if p is None else p for p in persons), dtype=np.int64, count=n
+        )
+        self.version = version
+        return True
+
+    def compute(self, today=None, months=12):
+        """
+        Every series the report charts and generate_insights() use, as a
+        dict; monthly_counts covers the `months` months up to `today`.
+        """
+        self.load()
+        today = today or datetime.date.today()
+        key = (self.version, today, months)
+        if key == self._stats_key:
+            return self._stats
+        n_dis = len(self.disease_names)
+        n_gen = len(self.gender_names)
+
+        gender_totals = np.bincount(self.gender, minlength=n_gen)
+        gender_counts = {
+            self.gender_names[g]: int(c) for g, c in enumerate(gender_totals) if c
+        }
+        chronic = int(np.count_nonzero(self.chronic))
+
+        disease_totals = np.bincount(self.disease, minlength=n_dis)
+        disease_totals[0] = 0
+        order = np.argsort(-disease_totals, kind="stable")
+        disease_counts = {
+            self.disease_names[d]: int(disease_totals[d])
+            for d in order
+            if disease_totals[d]
+        }
+
+        # gender split of every disease in one bincount over pair codes
+        pairs = np.bincount(
+            self.disease * n_gen + self.gender, minlength=n_dis * n_gen
+        ).reshape(n_dis, n_gen)
+        top10 = [d for d in order[:10] if disease_totals[d]]
+        gender_by_disease = {
+            self.disease_names[d]: {
+                self.gender_names[g]: int(pairs[d, g]) for g in range(n_gen)
+            }
+            for d in top10
+        }
+
+        has_age = self.age != MISSING
+        in_range = has_age & (self.age >= 0) & (self.age <= AGE_MAX)
+        bins = np.minimum(self.age[in_range] // AGE_BIN, AGE_MAX // AGE_BIN - 1)
+        age_hist = np.bincount(bins, minlength=AGE_MAX // AGE_BIN)
+
+        # mean age per disease: sums with np.add.at, counts with bincount
+        aged = has_age & (self.disease != 0)
+        codes = self.disease[aged]
+        sums = np.zeros(n_dis, dtype=np.int64)
+        np.add.at(sums, codes, self.age[aged])
+        counts = np.bincount(codes, minlength=n_dis)
+        avg_age_by_disease = {
+            self.disease_names[d]: float(sums[d] / counts[d])
+            for d in np.flatnonzero(counts >= 2)
+        }
+
+        last = month_key(today.year, today.month)
+        first = last - months + 1
+        window = (self.month >= first) & (self.month <= last)
+        per_month = np.bincount(self.month[window] - first, minlength=months)
+        monthly_counts = {
+            month_label(first + i): int(c) for i, c in enumerate(per_month)
+        }
+
+        visits = np.bincount(self.person[self.person >= 0])
+        unique_patients = int(np.count_nonzero(visits))
+        repeat_patients = int(np.count_nonzero(visits > 1))
+
+        self._stats_key = key
+        self._stats = {
+            "version": self.version,
+            "total": self.size,
+            "gender_counts": gender_counts,
+            "chronic": chronic,
+            "acute": self.size - chronic,
+            "disease_counts": disease_counts,
+            "gender_by_disease": gender_by_disease,
+            "monthly_counts": monthly_counts,
+            "age_bins": np.arange(0, AGE_MAX + 1, AGE_BIN),
+            "age_hist": age_hist,
+            "avg_age_by_disease": avg_age_by_disease,
+            "unique_patients": unique_patients,
+            "repeat_patients": repeat_patients,
+        }
+        return self._stats
+
+    def disease_breakdown(self, names, today=None, months=12):
+        """
+        {disease: stats} for the given diseases, each with the keys of
+        compute() that make sense for one disease (gender_counts,
+        chronic/acute, age histogram, monthly_counts, total).
+        """
+        self.load()
+        today = today or datetime.date.today()
+        last = month_key(today.year, today.month)
+        first = last - months + 1
+        n_dis = len(self.disease_names)
+        n_gen = len(self.gender_names)
+        n_bins = AGE_MAX // AGE_BIN
+        index = {name: i for i, name in enumerate(self.disease_names)}
+
+        # one 2-D bincount per series over (disease, bucket) pair codes
+        def per_disease(mask, bucket, width):
+            return np.bincount(
+                self.disease[mask] * width + bucket, minlength=n_dis * width
+            ).reshape(n_dis, width)
+
+        everyone = np.ones(self.size, dtype=bool)
+        genders = per_disease(everyone, self.gender, n_gen)
+        chronic = np.bincount(self.disease[self.chronic], minlength=n_dis)
+        in_range = (self.age != MISSING) & (self.age >= 0) & (self.age <= AGE_MAX)
+        ages = per_disease(
+            in_range, np.minimum(self.age[in_range] // AGE_BIN, n_bins - 1), n_bins
+        )
+        window = (self.month >= first) & (self.month <= last)
+        monthly = per_disease(window, self.month[window] - first, months)
+
+        out = {}
+        for name in names:
+            d = index.get(name)
+            if not d:
+                continue
+            total = int(genders[d].sum())
+            out[name] = {
+                "total": total,
+                "gender_counts": {
+                    self.gender_names[g]: int(c)
+                    for g, c in enumerate(genders[d])
+                    if c
+                },
+                "chronic": int(chronic[d]),
+                "acute": total - int(chronic[d]),
+                "age_bins": np.arange(0, AGE_MAX + 1, AGE_BIN),
+                "age_hist": ages[d],
+                "monthly_counts": {
+                    month_label(first + i): int(c) for i, c in enumerate(monthly[d])
+                },
+            }
+        return out
+
+
+_ENGINES = weakref.WeakKeyDictionary()
+
+
+def engine_for(store):
+    engine = _ENGINES.get(store)
+    if engine is None:
+        engine = _ENGINES[store] = StatsEngine(store)
+    return engine
@@ -0,0 +1,71 @@
+# change_watcher.py
+"""
+Change watcher for PRMS workstations sharing one database (no tkinter
+imports here).
+
+Every write to a patient row is logged in patient_changes by triggers.
+ChangeWatcher runs on its own thread and connection: it polls PRAGMA
+data_version, which only moves when some other connection committed,
+and then reads the log past the last entry it saw.  The changed rows
+are read right away and queued for the GUI thread as
+
+    ("rows", ids, rows)    ids changed; rows are their LIST_COLUMNS rows,
+                           ids without a row were deleted
+    ("reload", None, None) too much changed (or the log was pruned past
+                           us): reload the view instead of patching it
+"""
+
+import queue
+import threading
+
+# seconds between PRAGMA data_version polls
+POLL_INTERVAL = 2.0
+# more changes than this in one poll are answered with a reload
+MAX_PATCH = 2000
+# change-log entries kept for workstations that fall behind
+KEEP_CHANGES = 100000
+
+
+class ChangeWatcher(threading.Thread):
+    def __init__(self, store, interval=POLL_INTERVAL, keep=KEEP_CHANGES):
+        super().__init__(name="prms-change-watcher", daemon=True)
+        self.store = store
+        self.interval = interval
+        self.keep = keep
+        self.events = queue.Queue()
+        self._stop_event = threading.Event()
+        # read here so writes made before start() are not replayed
+        self.last_seq = store.last_change()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        conn = self.store.connect()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        while not self._stop_event.wait(self.interval):
+            try:
+                current = conn.execute("PRAGMA data_version").fetchone()[0]
+                if current == version:
+                    continue
+                version = current
+                self.poll()
+            except Exception as e:
+                print("Warning: change watcher failed:", e)
+
+    def poll(self):
+        """Read the log past last_seq and queue what changed."""
+        first, changes = self.store.changes_since(self.last_seq, MAX_PATCH + 1)
+        if not changes:
+            return
+        if len(changes) > MAX_PATCH or (
+            first is not None and first > self.last_seq + 1 and self.last_seq
+        ):
+            self.last_seq = self.store.last_change()
+            self.events.put(("reload", None, None))
+        else:
+            self.last_seq = changes[-1][0]
+            ids = list(dict.fromkeys(pid for _, pid in changes))
+            self.events.put(("rows", ids, self.store.list_rows(ids)))
+        if first is not None and self.last_seq - first > 2 * self.keep:
+            self.store.prune_changes(self.keep)
@@ -0,0 +1,210 @@
+# write_queue.py
+"""
+Single writer thread for PRMS (no tkinter imports here).
+
+Writes are queued as commands and applied by one thread.  Whatever has
+queued up while the previous commit ran goes into the next transaction
+(group commit), each command in its own SAVEPOINT so one bad record does
+not take the others down with it.  When another workstation holds the
+write lock the whole group is retried with jittered exponential backoff
+instead of failing with "database is locked".
+
+Results come back through concurrent.futures.Future objects and an
+optional callback(result, error), both completed on the writer thread;
+the GUI hops back to Tk itself.
+
+    writer = WriteQueue(store)
+    writer.insert(record, callback=lambda new_id, error: ...)
+    writer.metrics()   # queue depth, commit latency, busy retries
+"""
+
+import collections
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+# most commands in one transaction
+MAX_BATCH = 256
+# the writer connection's own busy wait; longer waits are our retries
+BUSY_TIMEOUT_MS = 250
+# retries of one group on SQLITE_BUSY, and the backoff between them
+MAX_RETRIES = 8
+BACKOFF_BASE = 0.05
+BACKOFF_MAX = 2.0
+# commit latencies kept for the metrics percentiles
+LATENCY_WINDOW = 512
+
+_STOP = object()
+
+Command = collections.namedtuple("Command", "fn future callback queued_at")
+
+
+def is_busy(error):
+    """True for SQLITE_BUSY / SQLITE_LOCKED, worth retrying."""
+    code = getattr(error, "sqlite_errorcode", None)
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    text = str(error).lower()
+    return "locked" in text or "busy" in text
+
+
+def backoff(attempt):
+    """Seconds to wait before retry number `attempt` (0-based)."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+    return delay * random.uniform(0.5, 1.5)
+
+
+class WriteQueue:
+    def __init__(self, store, max_batch=MAX_BATCH, retries=MAX_RETRIES):
+        self.store = store
+        self.max_batch = max_batch
+        self.retries = retries
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._commits = 0
+        self._ops = 0
+        self._failed = 0
+        self._busy_retries = 0
+        self._commit_ms = collections.deque(maxlen=LATENCY_WINDOW)
+        self._wait_ms = collections.deque(maxlen=LATENCY_WINDOW)
+        self._thread = threading.Thread(
+            target=self._run, name="prms-writer", daemon=True
+        )
+        self._thread.start()
+
+    # --- commands ---
+    def submit(self, fn, callback=None):
+        """Queue fn(conn), run inside the writer's transaction; a Future."""
+        future = Future()
+        self._queue.put(Command(fn, future, callback, time.perf_counter()))
+        return future
+
+    def insert(self, record, callback=None):
+        """New id as the result."""
+        return self.submit(
+            lambda conn: self.store.insert_rows(conn, [record])[0], callback
+        )
+
+    def update(self, patient_id, record, callback=None):
+        """Rows changed as the result."""
+        return self.submit(
+            lambda conn: self.store.update_rows(conn, [(patient_id, record)]),
+            callback,
+        )
+
+    def delete(self, patient_id, callback=None):
+        """Rows deleted as the result."""
+        return self.submit(
+            lambda conn: self.store.delete_rows(conn, [patient_id]), callback
+        )
+
+    def close(self, timeout=None):
+        """Apply what is queued, then stop the thread."""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # --- metrics ---
+    def depth(self):
+        return self._queue.qsize()
+
+    def metrics(self):
+        with self._lock:
+            commit_ms = sorted(self._commit_ms)
+            wait_ms = sorted(self._wait_ms)
+            out = {
+                "depth": self._queue.qsize(),
+                "commits": self._commits,
+                "ops": self._ops,
+                "failed": self._failed,
+                "busy_retries": self._busy_retries,
+                "ops_per_commit": self._ops / self._commits if self._commits else 0.0,
+            }
+        for name, values in (("commit_ms", commit_ms), ("wait_ms", wait_ms)):
+            if values:
+                out[name + "_p50"] = values[len(values) // 2]
+                out[name + "_p95"] = values[int(len(values) * 0.95)]
+                out[name + "_max"] = values[-1]
+        return out
+
+    # --- writer thread ---
+    def _run(self):
+        self.store.connect().execute("PRAGMA busy_timeout = %d" % BUSY_TIMEOUT_MS)
+        stopping = False
+        while not stopping:
+            cmd = self._queue.get()
+            if cmd is _STOP:
+                break
+            batch = [cmd]
+            # group whatever queued up meanwhile
+            while len(batch) < self.max_batch:
+                try:
+                    cmd = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if cmd is _STOP:
+                    stopping = True
+                    break
+                batch.append(cmd)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        conn = self.store.connect()
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                results = self._apply(batch)
+                break
+            except sqlite3.Error as e:
+                # any failure of the group (BEGIN, COMMIT, a corrupt page)
+                # fails its commands; the writer thread keeps running
+                if conn.in_transaction:
+                    try:
+                        conn.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        pass
+                if not is_busy(e) or attempt == self.retries:
+                    results = [(None, e)] * len(batch)
+                    break
+                with self._lock:
+                    self._busy_retries += 1
+                time.sleep(backoff(attempt))
+        done = time.perf_counter()
+        with self._lock:
+            self._commits += 1
+            self._ops += len(batch)
+            self._failed += sum(1 for _, error in results if error is not None)
+            self._commit_ms.append((done - started) * 1000)
+            self._wait_ms.extend((done - cmd.queued_at) * 1000 for cmd in batch)
+        for cmd, (result, error) in zip(batch, results):
+            if error is None:
+                cmd.future.set_result(result)
+            else:
+                cmd.future.set_exception(error)
+            if cmd.callback is not None:
+                try:
+                    cmd.callback(result, error)
+                except Exception as e:
+                    print("Warning: write callback failed:", e)
+
+    def _apply(self, batch):
+        results = []
+        with self.store.transaction() as conn:
+            for cmd in batch:
+                conn.execute("SAVEPOINT write_cmd")
+                try:
+                    result = cmd.fn(conn)
+                except sqlite3.OperationalError as e:
+                    if is_busy(e):
+                        raise
+                    conn.execute("ROLLBACK TO write_cmd")
+                    results.append((None, e))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO write_cmd")
+                    results.append((None, e))
+                else:
+                    results.append((result, None))
+                conn.execute("RELEASE write_cmd")
+        return results
@@ -0,0 +1,319 @@
+# backup.py
+"""
+Online backups of the PRMS database (no tkinter imports here).
+
+Copying prms_patients.db while PRMS runs is unsafe: the WAL file holds
+recent commits and a plain file copy can catch a page half-written.
+backup_database() uses SQLite's backup API instead, `pages` pages per
+step with a short sleep in between, so other workstations keep writing
+while it copies.  A write from another connection makes SQLite restart
+the copy; after MAX_RESTARTS of those the rest is copied in one step,
+which in WAL mode holds a read snapshot but still blocks no writer.
+
+The copy is written next to its final name, checked with PRAGMA
+integrity_check, optionally gzip-compressed and only then renamed into
+place, so a file named like a backup is always a complete, verified
+one.  Older copies beyond `keep` are removed.
+
+BackupService runs the same on its own thread, every `interval` seconds
+counted from the newest backup on disk, and on run_now().  Every
+workstation runs one against the shared backups directory, so a
+scheduled backup is first claimed in the database (claim()): the
+services that find a fresh claim leave that backup to its holder.
+Results are queued as BackupResult tuples for the GUI.
+
+    python backup.py                  # one backup into ./backups
+    python backup.py --gzip --keep 14 /mnt/share/prms-backups
+"""
+
+import gzip
+import os
+import queue
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from patient_store import DB_FILE
+
+BACKUP_DIR = os.path.join(os.path.dirname(DB_FILE), "backups")
+# pages per backup step (4 MB at the default 4 KB page size) and the
+# pause between steps that lets writers in
+PAGES = 1024
+SLEEP = 0.01
+# copies restarted by other connections' writes before one-step copying
+MAX_RESTARTS = 3
+KEEP = 7
+INTERVAL = 24 * 3600
+# wait after a failed scheduled backup before trying again
+RETRY_DELAY = 600
+PREFIX = "prms-"
+# store_meta key holding when the last scheduled backup was claimed
+CLAIM_KEY = "backup_claimed"
+SUFFIXES = (".db", ".db.gz")
+
+BackupResult = namedtuple(
+    "BackupResult", "path size seconds restarts manual error"
+)
+
+
+class _Restarted(Exception):
+    pass
+
+
+def backup_name(when=None):
+    return PREFIX + time.strftime("%Y%m%d-%H%M%S", time.localtime(when)) + ".db"
+
+
+def list_backups(directory):
+    """Backup files in `directory`, oldest first."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    names = [n for n in names if n.startswith(PREFIX) and n.endswith(SUFFIXES)]
+    # the timestamp in the name sorts by age
+    return [os.path.join(directory, n) for n in sorted(names)]
+
+
+def rotate(directory, keep=KEEP):
+    """Remove all but the newest `keep` backups; the removed paths."""
+    old = list_backups(directory)[:-keep] if keep > 0 else []
+    for path in old:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # another workstation rotated it first
+    return old
+
+
+def verify(path):
+    """PRAGMA integrity_check on a copy; raises unless it reports ok."""
+    conn = sqlite3.connect(path)
+    try:
+        problems = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    if problems != ["ok"]:
+        raise sqlite3.DatabaseError(
+            "integrity_check failed on %s: %s" % (path, "; ".join(problems[:5]))
+        )
+
+
+def compress(path, level=6):
+    """gzip `path` to path + '.gz' and remove the original."""
+    with open(path, "rb") as src, gzip.open(path + ".gz", "wb", level) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.remove(path)
+    return path + ".gz"
+
+
+def claim(db_path, interval, timeout=10):
+    """
+    Take the scheduled backup for this workstation: False when another
+    one claimed it within the last half interval.
+    """
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT value FROM store_meta WHERE key = ?", (CLAIM_KEY,)
+        ).fetchone()
+        now = time.time()
+        if row and now - float(row[0]) < interval / 2:
+            conn.execute("ROLLBACK")
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)",
+            (CLAIM_KEY, now),
+        )
+        conn.execute("COMMIT")
+        return True
+    finally:
+        conn.close()
+
+
+def release(db_path, timeout=10):
+    """Give up a claim after a failed backup, so others may take it."""
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    try:
+        conn.execute("DELETE FROM store_meta WHERE key = ?", (CLAIM_KEY,))
+    finally:
+        conn.close()
+
+
+def copy_database(db_path, dest_path, pages=PAGES, sleep=SLEEP, timeout=10):
+    """Incremental copy; the number of restarts it took."""
+    restarts = 0
+    remaining = [None]
+
+    def progress(status, left, total):
+        # pages left going up again means another connection wrote and
+        # SQLite started over
+        nonlocal restarts
+        if remaining[0] is not None and left > remaining[0]:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted()
+        remaining[0] = left
+        if left and sleep:
+            time.sleep(sleep)
+
+    source = sqlite3.connect(db_path, timeout=timeout)
+    try:
+        dest = sqlite3.connect(dest_path)
+        try:
+            try:
+                source.backup(dest, pages=pages, progress=progress)
+            except _Restarted:
+                # busy database: copy the rest from one read snapshot
+                source.backup(dest, pages=-1)
+        finally:
+            dest.close()
+    finally:
+        source.close()
+    return restarts
+
+
+def backup_database(
+    db_path=DB_FILE,
+    directory=BACKUP_DIR,
+    keep=KEEP,
+    gzip_copy=False,
+    pages=PAGES,
+    sleep=SLEEP,
+    timeout=10,
+):
+    """Copy, verify, (compress,) rename and rotate; (path, restarts)."""
+    os.makedirs(directory, exist_ok=True)
+    final = os.path.join(directory, backup_name())
+    part = final + ".part"
+    try:
+        restarts = copy_database(db_path, part, pages, sleep, timeout)
+        verify(part)
+        if gzip_copy:
+            part = compress(part)
+            final += ".gz"
+        os.replace(part, final)
+    except BaseException:
+        for leftover in (part, part + ".gz"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+    rotate(directory, keep)
+    return final, restarts
+
+
+class BackupService(threading.Thread):
+    def __init__(
+        self,
+        db_path=DB_FILE,
+        directory=BACKUP_DIR,
+        interval=INTERVAL,
+        keep=KEEP,
+        gzip_copy=False,
+    ):
+        super().__init__(name="prms-backup", daemon=True)
+        self.db_path = db_path
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.gzip_copy = gzip_copy
+        self.results = queue.Queue()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._manual = False
+        self._not_before = 0.0
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+    def run_now(self):
+        self._manual = True
+        self._wake.set()
+
+    def next_due(self):
+        """Epoch seconds of the next scheduled backup."""
+        backups = list_backups(self.directory)
+        if not backups:
+            return time.time()
+        return os.path.getmtime(backups[-1]) + self.interval
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self.interval:
+                due = max(self.next_due(), self._not_before)
+                delay = max(0.0, due - time.time())
+            else:
+                delay = None  # run_now() only
+            self._wake.wait(delay)
+            self._wake.clear()
+            if self._stop_event.is_set():
+                break
+            manual, self._manual = self._manual, False
+            if not manual and not self._claim():
+                # another workstation is on it; look again once its
+                # copy should be on disk
+                self._not_before = time.time() + RETRY_DELAY
+                continue
+            result = self.backup(manual)
+            if result.error is not None:
+                self._not_before = time.time() + RETRY_DELAY
+                if not manual:
+                    self._release()
+            self.results.put(result)
+
+    def _claim(self):
+        try:
+            return claim(self.db_path, self.interval)
+        except sqlite3.Error as e:
+            print("Warning: could not claim backup:", e)
+            return True  # better two backups than none
+
+    def _release(self):
+        try:
+            release(self.db_path)
+        except sqlite3.Error as e:
+            print("Warning: could not release backup claim:", e)
+
+    def backup(self, manual=False):
+        started = time.perf_counter()
+        try:
+            path, restarts = backup_database(
+                self.db_path, self.directory, self.keep, self.gzip_copy
+            )
+        except Exception as e:
+            print("Warning: backup failed:", e)
+            return BackupResult(
+                None, 0, time.perf_counter() - started, 0, manual, e
+            )
+        return BackupResult(
+            path,
+            os.path.getsize(path),
+            time.perf_counter() - started,
+            restarts,
+            manual,
+            None,
+        )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    use_gzip = "--gzip" in args
+    if use_gzip:
+        args.remove("--gzip")
+    keep = KEEP
+    if "--keep" in args:
+        i = args.index("--keep")
+        keep = int(args[i + 1])
+        del args[i : i + 2]
+    target = args[0] if args else BACKUP_DIR
+    started = time.perf_counter()
+    path, restarts = backup_database(DB_FILE, target, keep, use_gzip)
+    print(
+        f"backup: {path} ({os.path.getsize(path)} bytes, "
+        f"{time.perf_counter() - started:.1f}s, {restarts} restarts)"
+    )
@@ -0,0 +1,124 @@
+# archive.py
+"""
+Hot/cold archival of old admissions (no tkinter imports here).
+
+Rows admitted before a cutoff (ARCHIVE_YEARS years back by default) move
+out of the patients table into one archive file per admission year,
+prms_archive_<year>.db next to the database, together with their notes.
+The hot table keeps only recent work, so scans and index lookups on it
+stay small; PatientStore.archive_sources() brings the archives back for
+"include archive" searches and for every history lookup.
+
+The job walks the old rows in admission order, one batch at a time and
+one year's archive at a time.  A transaction over the main database and
+an attached one is not atomic in WAL mode, so every batch is moved in
+two steps: the rows are copied and committed, then copied again (picking
+up edits made in between) and deleted from the hot table.  A crash can
+leave a batch in both places, never in neither; the next run finishes
+it, and the archive views hide the archived copy meanwhile.
+
+    python archive.py                    # older than ARCHIVE_YEARS years
+    python archive.py --years 5
+    python archive.py --before 2022-01-01
+"""
+
+import datetime
+import sys
+import time
+
+from patient_store import (
+    ARCHIVE_COLUMNS,
+    BATCH_SIZE,
+    PatientStore,
+    day_number,
+)
+
+ARCHIVE_YEARS = 2
+
+SQL_OLDEST = (
+    "SELECT admission_date FROM patients WHERE admission_day < ? "
+    "ORDER BY admission_day LIMIT 1"
+)
+SQL_BATCH = (
+    "SELECT id FROM patients WHERE admission_day < ? "
+    "ORDER BY admission_day LIMIT ?"
+)
+SQL_COPY_ROWS = "INSERT OR REPLACE INTO %s.patients (%s) SELECT %s FROM main.patients "
+SQL_COPY_NOTES = (
+    "INSERT OR REPLACE INTO %s.patient_notes (patient_id, compressed, body) "
+    "SELECT patient_id, compressed, body FROM main.patient_notes "
+)
+SQL_DROP_ROWS = "DELETE FROM main.patients "
+
+
+def cutoff_day(years=ARCHIVE_YEARS, today=None):
+    """Day number of the date `years` years before today."""
+    today = today or datetime.date.today()
+    try:
+        cutoff = today.replace(year=today.year - years)
+    except ValueError:  # 29 February
+        cutoff = today.replace(year=today.year - years, day=28)
+    return day_number(cutoff)
+
+
+def _move(store, schema, ids):
+    conn = store.connect()
+    cols = ", ".join(ARCHIVE_COLUMNS)
+    where = "WHERE id IN (%s)" % ", ".join("?" * len(ids))
+    notes_where = "WHERE patient_id IN (%s)" % ", ".join("?" * len(ids))
+    copy_rows = SQL_COPY_ROWS % (schema, cols, cols) + where
+    copy_notes = SQL_COPY_NOTES % schema + notes_where
+    with store.transaction():
+        conn.execute(copy_rows, ids)
+        conn.execute(copy_notes, ids)
+    with store.transaction():
+        conn.execute(copy_rows, ids)
+        conn.execute(copy_notes, ids)
+        # the delete triggers drop the notes, trigram and dup_keys entries
+        return conn.execute(SQL_DROP_ROWS + where, ids).rowcount
+
+
+def archive_before(store, cutoff, batch_size=BATCH_SIZE, progress=None):
+    """
+    Move every row with admission_day < cutoff into its year's archive.
+    Returns {year: rows moved}.  progress(year, moved, rows_per_s), if
+    given, is called after every batch.
+    """
+    conn = store.connect()
+    moved = {}
+    started = time.perf_counter()
+    total = 0
+    while True:
+        row = conn.execute(SQL_OLDEST, (cutoff,)).fetchone()
+        if row is None:
+            break
+        year = int(row[0][:4])
+        # this batch stays inside one admission year
+        upto = min(cutoff, day_number(datetime.date(year + 1, 1, 1)))
+        ids = [r[0] for r in conn.execute(SQL_BATCH, (upto, batch_size))]
+        schema = store.attach_archive(conn, year)
+        n = _move(store, schema, ids)
+        moved[year] = moved.get(year, 0) + n
+        total += n
+        if progress:
+            progress(year, moved[year], total / (time.perf_counter() - started))
+    store.refresh_archives()
+    return moved
+
+
+def print_progress(year, moved, rate):
+    print("%d: %d rows archived, %.0f rows/s" % (year, moved, rate))
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    store = PatientStore()
+    store.ensure_schema()
+    if args[:1] == ["--before"]:
+        cutoff = day_number(datetime.date.fromisoformat(args[1]))
+    elif args[:1] == ["--years"]:
+        cutoff = cutoff_day(int(args[1]))
+    else:
+        cutoff = cutoff_day()
+    for year, n in archive_before(store, cutoff, progress=print_progress).items():
+        print(f"{year}: done, {n} rows in {store.archive_path(year)}")
@@ -0,0 +1,182 @@
+# snapshot.py
+"""
+Read-only reporting snapshots of the PRMS database (no tkinter imports
+here).
+
+Report aggregates read every row.  Run against the live database, such a
+read holds one WAL snapshot open for seconds, and checkpoints cannot get
+past it while clerks keep writing.  Reports read a copy instead.
+take_snapshot() makes it with the incremental copy from backup.py,
+switches it to a rollback journal and records when it was taken and the
+change count it reflects.  The copy is then opened with
+mode=ro&immutable=1, so reading it takes no locks at all.
+
+Every snapshot gets a new file name, because a reader may still have
+the previous one open (and Windows cannot replace an open file).  Older
+snapshots are removed once nothing holds them.
+
+SnapshotService keeps the newest one fresh on its own thread.  It takes
+a new snapshot every `interval` seconds, but only if something was
+written since the last one, and on run_now().  It loads the report
+columns before publishing the snapshot as `current`, so a reports
+window switches over without a pause.
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from backup import copy_database
+from patient_store import DB_FILE, PatientStore
+from report_stats import engine_for
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(DB_FILE), "snapshots")
+SNAPSHOT_INTERVAL = 30 * 60
+# how often an overdue snapshot looks for writes before recopying
+CHECK_INTERVAL = 60
+PREFIX = "report-"
+
+# store: a read-only PatientStore on the copy; taken_at: epoch seconds;
+# changes: the live change_count() the copy reflects
+Snapshot = namedtuple("Snapshot", "path store taken_at changes")
+
+
+def list_snapshots(directory):
+    """Snapshot files in `directory`, oldest first."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    names = [n for n in names if n.startswith(PREFIX) and n.endswith(".db")]
+    return [os.path.join(directory, n) for n in sorted(names)]
+
+
+def take_snapshot(db_path=DB_FILE, directory=SNAPSHOT_DIR):
+    """Copy the live database into a new snapshot file; its path."""
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+    name = "%s%s-%03d.db" % (PREFIX, stamp, now % 1 * 1000)
+    final = os.path.join(directory, name)
+    part = final + ".part"
+    try:
+        copy_database(db_path, part)
+        conn = sqlite3.connect(part, isolation_level=None)
+        try:
+            # immutable readers cannot use a WAL file
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) "
+                "VALUES ('snapshot_at', ?)",
+                (now,),
+            )
+        finally:
+            conn.close()
+        os.replace(part, final)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+    return final
+
+
+def open_snapshot(path):
+    store = PatientStore(path, read_only=True)
+    rows = store.query("SELECT value FROM store_meta WHERE key = 'snapshot_at'")
+    taken_at = rows[0][0] if rows else os.path.getmtime(path)
+    return Snapshot(path, store, taken_at, store.change_count())
+
+
+def prune(directory, keep_path):
+    """Remove every snapshot but keep_path; files still open are skipped."""
+    for path in list_snapshots(directory):
+        if path != keep_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class SnapshotService(threading.Thread):
+    def __init__(self, store, directory=SNAPSHOT_DIR, interval=SNAPSHOT_INTERVAL):
+        super().__init__(name="prms-snapshot", daemon=True)
+        self.live = store
+        self.directory = directory
+        self.interval = interval
+        self.current = None
+        self.errors = queue.Queue()
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+        self._forced = False
+        self.busy = False
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake.set()
+
+    def run_now(self):
+        self._forced = True
+        self._wake.set()
+
+    def age(self):
+        """Seconds since the current snapshot was taken (None if none)."""
+        return None if self.current is None else time.time() - self.current.taken_at
+
+    def behind(self):
+        """Writes to the live database since the current snapshot."""
+        if self.current is None:
+            return None
+        return self.live.change_count() - self.current.changes
+
+    def run(self):
+        # a snapshot left by the last session is good until it is due
+        existing = list_snapshots(self.directory)
+        if existing:
+            try:
+                self._publish(open_snapshot(existing[-1]))
+            except Exception as e:
+                print("Warning: could not open snapshot:", e)
+        while not self._stop_event.is_set():
+            if self._due():
+                self.refresh()
+            self._wake.wait(self._delay())
+            self._wake.clear()
+
+    def _due(self):
+        if self._forced or self.current is None:
+            return True
+        if self.age() < self.interval:
+            return False
+        return self.behind() != 0
+
+    def _delay(self):
+        if self.current is None:
+            return self.interval
+        left = self.interval - self.age()
+        return left if left > 0 else CHECK_INTERVAL
+
+    def refresh(self):
+        self._forced = False
+        self.busy = True
+        try:
+            path = take_snapshot(self.live.db_path, self.directory)
+            snapshot = open_snapshot(path)
+            self._publish(snapshot)
+        except Exception as e:
+            print("Warning: snapshot failed:", e)
+            self.errors.put(e)
+        finally:
+            self.busy = False
+
+    def _publish(self, snapshot):
+        # read the report columns here, off the GUI thread
+        engine_for(snapshot.store).load()
+        previous, self.current = self.current, snapshot
+        if previous is not None:
+            # this thread's connection to the old copy; the rest close
+            # as their users move on and the store is collected
+            previous.store.close()
+        prune(self.directory, snapshot.path)
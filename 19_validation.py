@@ -0,0 +1,259 @@
+# validation.py
+"""
+Record validation shared by the PRMS window and the JSON API (no
+tkinter imports here).
+
+These are the checks the Add / Update forms have always made.  The
+window shows their messages in dialogs, and api_server.py returns them
+as 400 responses.  validate_record() runs all of them over a dict of
+form fields and builds the record tuple PatientStore.insert() takes.
+"""
+
+import datetime
+
+import ai_helpers
+from search_query import GENDER_CHOICES, TYPE_CHOICES
+
+DISEASES = sorted(
+    list(
+        {
+            "Hypertension",
+            "Diabetes",
+            "Coronary Artery Disease",
+            "Asthma",
+            "Chronic Obstructive Pulmonary Disease",
+            "COPD",
+            "Pneumonia",
+            "Bronchitis",
+            "Influenza",
+            "Common Cold",
+            "COVID-19",
+            "SARS-CoV-2 Infection",
+            "Tuberculosis",
+            "Hepatitis A",
+            "Hepatitis B",
+            "Hepatitis C",
+            "HIV/AIDS",
+            "Malaria",
+            "Dengue",
+            "Typhoid",
+            "Cholera",
+            "Urinary Tract Infection",
+            "UTI",
+            "Kidney Stones",
+            "Chronic Kidney Disease",
+            "CKD",
+            "Gastritis",
+            "Peptic Ulcer",
+            "Gastroesophageal Reflux Disease",
+            "GERD",
+            "Irritable Bowel Syndrome",
+            "IBS",
+            "Celiac Disease",
+            "Appendicitis",
+            "Pancreatitis",
+            "Stroke",
+            "Ischemic Stroke",
+            "Hemorrhagic Stroke",
+            "Migraine",
+            "Tension Headache",
+            "Epilepsy",
+            "Seizure Disorder",
+            "Parkinson's Disease",
+            "Alzheimer's Disease",
+            "Dementia",
+            "Multiple Sclerosis",
+            "Rheumatoid Arthritis",
+            "Osteoarthritis",
+            "Gout",
+            "Anemia",
+            "Iron Deficiency Anemia",
+            "Leukemia",
+            "Lymphoma",
+            "Breast Cancer",
+            "Lung Cancer",
+            "Colorectal Cancer",
+            "Prostate Cancer",
+            "Skin Cancer",
+            "Basal Cell Carcinoma",
+            "Melanoma",
+            "Psoriasis",
+            "Eczema",
+            "Dermatitis",
+            "Depression",
+            "Anxiety Disorder",
+            "Bipolar Disorder",
+            "Schizophrenia",
+            "Obsessive Compulsive Disorder",
+            "OCD",
+            "Autism Spectrum Disorder",
+            "Attention Deficit Hyperactivity Disorder",
+            "ADHD",
+            "Hypothyroidism",
+            "Hyperthyroidism",
+            "Goiter",
+            "Polycystic Ovary Syndrome",
+            "PCOS",
+            "Endometriosis",
+            "Infertility",
+            "Preeclampsia",
+            "Gestational Diabetes",
+            "Premature Birth Complication",
+            "Chickenpox",
+            "Measles",
+            "Mumps",
+            "Rubella",
+            "Whooping Cough",
+            "Pertussis",
+            "Ear Infection",
+            "Otitis Media",
+            "Sinusitis",
+            "Allergic Rhinitis",
+            "Allergy",
+            "Food Allergy",
+            "Anaphylaxis",
+            "Liver Cirrhosis",
+            "Fatty Liver Disease",
+            "Nonalcoholic Fatty Liver Disease",
+            "NAFLD",
+            "Alcoholic Liver Disease",
+            "Peripheral Arterial Disease",
+            "Varicose Veins",
+            "Deep Vein Thrombosis",
+            "DVT",
+            "Pulmonary Embolism",
+            "Sepsis",
+            "Cellulitis",
+            "Skin Infection",
+            "Appendicitis",
+            "Acute Respiratory Distress Syndrome",
+            "ARDS",
+            "Acute Bronchiolitis",
+            "Bronchiectasis",
+            "Eye Infection",
+            "Conjunctivitis",
+            "Glaucoma",
+            "Cataract",
+            "Periodontal Disease",
+            "Tooth Decay",
+            "Oral Cancer",
+            "Laryngitis",
+            "Thyroid Cancer",
+            "Pancreatic Cancer",
+            "Endocarditis",
+            "Myocarditis",
+            "Arrhythmia",
+            "Atrial Fibrillation",
+            "Heart Failure",
+            "Congestive Heart Failure",
+            "Heart Attack",
+            "Myocardial Infarction",
+            "Rheumatic Fever",
+            "Sickle Cell Disease",
+            "Hemophilia",
+            "Vitiligo",
+            "Nutritional Deficiency",
+            "Obesity",
+            "Metabolic Syndrome",
+        }
+    )
+)
+
+
+class ValidationError(ValueError):
+    """Invalid record field; the message is meant for the user."""
+
+
+def validate_name(name):
+    """(ok, reason): no digits and at least one letter."""
+    if any(ch.isdigit() for ch in name):
+        return False, "Name must not contain digits."
+    if not any(ch.isalpha() for ch in name):
+        return False, "Name must contain alphabetic characters."
+    return True, ""
+
+
+def validate_phone(phone):
+    return phone.isdigit() and len(phone) == 10
+
+
+def validate_date(text):
+    """YYYY-MM-DD and a real calendar day (no 2024-02-30)."""
+    try:
+        return len(text) == 10 and bool(datetime.datetime.strptime(text, "%Y-%m-%d"))
+    except ValueError:
+        return False
+
+
+def canonical_disease(disease):
+    """(ok, canonical name or reason): one of DISEASES, in any case."""
+    if not disease:
+        return False, "Disease is required."
+    for d in DISEASES:
+        if d.lower() == disease.lower():
+            return True, d
+    return False, "Disease must be chosen from suggestions (select one)."
+
+
+def _text(fields, key):
+    value = fields.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def validate_record(fields):
+    """
+    Record tuple (PatientStore COLUMNS order, follow-up date suggested)
+    for a dict with name, age, gender, phone, disease, type,
+    admission_date and notes; raises ValidationError.
+    """
+    name = _text(fields, "name")
+    if not name:
+        raise ValidationError("Name is required.")
+    ok, reason = validate_name(name)
+    if not ok:
+        raise ValidationError(reason)
+
+    gender = _text(fields, "gender")
+    if gender not in GENDER_CHOICES:
+        raise ValidationError("Please select a gender: Male / Female / Other.")
+
+    age = _text(fields, "age")
+    if age:
+        try:
+            age = int(age)
+        except ValueError:
+            raise ValidationError("Age must be a valid integer.") from None
+        if age <= 0 or age > 120:
+            raise ValidationError("Age must be between 1 and 120.")
+    else:
+        age = None
+
+    phone = _text(fields, "phone")
+    if phone and not validate_phone(phone):
+        raise ValidationError("Phone number must be exactly 10 digits (digits only).")
+
+    ok, disease = canonical_disease(_text(fields, "disease"))
+    if not ok:
+        raise ValidationError(disease)
+
+    kind = _text(fields, "type")
+    if kind not in TYPE_CHOICES:
+        raise ValidationError(f"Type must be one of: {', '.join(TYPE_CHOICES)}.")
+
+    adm = _text(fields, "admission_date")
+    if adm and not validate_date(adm):
+        raise ValidationError(
+            f"Admission date '{adm}' is not a valid date. Expected YYYY-MM-DD."
+        )
+
+    return (
+        name,
+        age,
+        gender,
+        phone,
+        disease,
+        1 if kind == "Chronic" else 0,
+        adm,
+        _text(fields, "notes"),
+        ai_helpers.suggest_followup_date(adm, disease),
+    )
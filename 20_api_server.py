@@ -0,0 +1,406 @@
+# api_server.py
+"""
+Local JSON API over the PRMS database (no tkinter imports here).
+
+For the other tools in the clinic (lab intake, front desk kiosk) that
+need to look patients up and add them without the Tk window:
+
+    GET  /patients?q=disease:diabetes age:50-70&limit=200&after=123
+    GET  /patients?q=...&stream=1      every match as NDJSON
+    GET  /patients/<id>                record, notes and visit history
+    POST /patients                     JSON form fields -> new id
+    GET  /stats                        the report figures, with their
+                                       age and the writes since
+
+Searches take the search-bar language (search_query.compile_query) and
+page through PatientStore.search_page; new records are checked by
+validation.validate_record and written through a WriteQueue, so
+concurrent adds share commits.  Requests run on a fixed pool of worker
+threads, each keeping its own connection (a WAL reader) for its
+lifetime, instead of a new thread and connection per request.  The
+store's query cache is off: its generation check is per connection.
+
+    python api_server.py                    # 127.0.0.1:8765
+    python api_server.py --port 9000 --host 0.0.0.0
+"""
+
+import datetime
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from urllib.parse import parse_qs, urlsplit
+
+from ai_helpers import RISK_LEVELS
+from patient_store import PatientStore
+from report_stats import engine_for
+from search_query import FIELD_LABELS, QueryError, compile_query
+from validation import ValidationError, validate_record
+from write_queue import WriteQueue
+
+HOST = "127.0.0.1"
+PORT = 8765
+WORKERS = 16
+# an open keep-alive connection holds a worker; idle ones are closed
+# after this many seconds, busy ones after their next response when
+# other connections are waiting for a worker
+KEEPALIVE_TIMEOUT = 5
+# connections the listening socket queues before refusing more
+BACKLOG = 128
+# rows per JSON page, and the most a client may ask for
+PAGE_LIMIT = 200
+MAX_LIMIT = 1000
+# request bodies larger than this are refused
+MAX_BODY = 64 * 1024
+# seconds an add waits for its commit
+WRITE_TIMEOUT = 30
+# /stats figures are reused for this many seconds: every write would
+# otherwise make the next call re-read all report columns
+STATS_MAX_AGE = 30
+
+
+class ApiError(Exception):
+    """An error response: status plus {"error": message, **extra}."""
+
+    def __init__(self, status, message, **extra):
+        super().__init__(message)
+        self.status = status
+        self.body = {"error": message, **extra}
+
+
+def row_json(row):
+    """A LIST_COLUMNS row as the table shows it."""
+    _id, name, age, gender, phone, disease, chronic, adm, risk = row[:9]
+    return {
+        "id": _id,
+        "name": name,
+        "age": age,
+        "gender": gender,
+        "phone": phone,
+        "disease": disease,
+        "type": "Chronic" if chronic == 1 else "Acute",
+        "admission_date": adm,
+        "risk": RISK_LEVELS[risk] if risk is not None else None,
+    }
+
+
+def _int_param(query, name, default):
+    try:
+        return int(query.get(name, [default])[0])
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"'{name}' must be an integer.")
+
+
+class PatientApi:
+    """The endpoints, independent of HTTP; every method returns JSON data."""
+
+    def __init__(self, store, writer):
+        self.store = store
+        self.writer = writer
+        # StatsEngine keeps state between calls: one request at a time
+        self._stats_lock = Lock()
+        self._stats = None
+        self._stats_at = 0.0
+        self._stats_changes = 0
+
+    def compile(self, query):
+        text = query.get("q", [""])[0].strip()
+        if not text:
+            return None, (), None, "id"
+        field = FIELD_LABELS.get(query.get("field", ["Name"])[0], "any")
+        try:
+            q = compile_query(
+                text, field, self.store.has_trigram(), datetime.date.today()
+            )
+        except QueryError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        return q.where, q.params, q.hits, q.order_key
+
+    def search(self, query):
+        where, params, hits, order_key = self.compile(query)
+        limit = min(max(_int_param(query, "limit", PAGE_LIMIT), 1), MAX_LIMIT)
+        after = query.get("after", [None])[0]
+        if after is not None:
+            try:
+                after = tuple(int(v) for v in after.split(","))
+            except ValueError:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "Bad 'after' cursor.")
+        rows, cursor = self.store.search_page(
+            where, params, after=after, limit=limit, order_key=order_key, hits=hits
+        )
+        return {
+            "rows": [row_json(r) for r in rows],
+            "next": ",".join(map(str, cursor)) if cursor else None,
+        }
+
+    def stream(self, query):
+        """Every match, page by page, as row dicts."""
+        where, params, hits, order_key = self.compile(query)
+        cursor = None
+        while True:
+            rows, cursor = self.store.search_page(
+                where,
+                params,
+                after=cursor,
+                limit=MAX_LIMIT,
+                order_key=order_key,
+                hits=hits,
+            )
+            for row in rows:
+                yield row_json(row)
+            if cursor is None:
+                return
+
+    def get(self, patient_id):
+        detail = self.store.patient_detail(patient_id)
+        if detail is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No patient {patient_id}.")
+        row = detail["row"]
+        return {
+            "id": row[0],
+            "name": row[1],
+            "age": row[2],
+            "gender": row[3],
+            "phone": row[4],
+            "disease": row[5],
+            "type": "Chronic" if row[6] == 1 else "Acute",
+            "admission_date": row[7],
+            "notes": detail["notes"],
+            "followup_date": detail["followup_date"],
+            "history": [
+                {"admission_date": adm, "disease": disease, "chronic": chronic}
+                for adm, disease, chronic in detail["history"]
+            ],
+        }
+
+    def add(self, fields):
+        if not isinstance(fields, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Expected a JSON object.")
+        try:
+            record = validate_record(fields)
+        except ValidationError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        name, age, _gender, phone, disease, _chronic, adm = record[:7]
+        if not fields.get("allow_duplicate"):
+            duplicates = self.store.find_duplicates(name, phone, disease, age, adm)
+            if duplicates:
+                raise ApiError(
+                    HTTPStatus.CONFLICT,
+                    'Possible duplicates; resend with "allow_duplicate": true '
+                    "to add anyway.",
+                    duplicates=duplicates,
+                )
+        new_id = self.writer.insert(record).result(WRITE_TIMEOUT)
+        return {"id": new_id, "followup_date": record[-1]}
+
+    def stats(self):
+        with self._stats_lock:
+            if self._stats is None or time.time() - self._stats_at > STATS_MAX_AGE:
+                self._stats_changes = self.store.change_count()
+                self._stats = self._compute_stats()
+                self._stats_at = time.time()
+            return {
+                **self._stats,
+                "age": round(time.time() - self._stats_at, 1),
+                "behind": self.store.change_count() - self._stats_changes,
+            }
+
+    def _compute_stats(self):
+        s = engine_for(self.store).compute()
+        return {
+            "total": s["total"],
+            "gender_counts": s["gender_counts"],
+            "chronic": s["chronic"],
+            "acute": s["acute"],
+            "disease_counts": s["disease_counts"],
+            "monthly_counts": s["monthly_counts"],
+            "age_bins": s["age_bins"].tolist(),
+            "age_hist": s["age_hist"].tolist(),
+            "unique_patients": s["unique_patients"],
+            "repeat_patients": s["repeat_patients"],
+        }
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # keep-alive, so clients are not reconnecting for every request
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    # headers and body go out as separate writes; with Nagle on, the
+    # second one waits for the client's delayed ACK (~40 ms a request)
+    disable_nagle_algorithm = True
+
+    @property
+    def api(self):
+        return self.server.api
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [p for p in url.path.split("/") if p]
+        self._handle(lambda: self._route_get(parts, query))
+
+    def do_POST(self):
+        parts = [p for p in urlsplit(self.path).path.split("/") if p]
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            # the body is left unread, so the connection cannot be reused
+            self.close_connection = True
+            self._send_json(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Body too large."}
+            )
+            return
+        body = self.rfile.read(length)
+        self._handle(lambda: self._route_post(parts, body))
+
+    def _route_get(self, parts, query):
+        if parts == ["patients"]:
+            if query.get("stream", ["0"])[0] not in ("0", ""):
+                return self._send_stream(self.api.stream(query))
+            return self.api.search(query)
+        if len(parts) == 2 and parts[0] == "patients":
+            try:
+                patient_id = int(parts[1])
+            except ValueError:
+                raise ApiError(HTTPStatus.NOT_FOUND, "Patient ids are integers.")
+            return self.api.get(patient_id)
+        if parts == ["stats"]:
+            return self.api.stats()
+        raise ApiError(HTTPStatus.NOT_FOUND, "Unknown endpoint.")
+
+    def _route_post(self, parts, body):
+        if parts != ["patients"]:
+            raise ApiError(HTTPStatus.NOT_FOUND, "Unknown endpoint.")
+        try:
+            fields = json.loads(body or b"null")
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON.")
+        return HTTPStatus.CREATED, self.api.add(fields)
+
+    def _handle(self, route):
+        try:
+            result = route()
+            if result is None:
+                return  # streamed
+            status, body = (
+                result if isinstance(result, tuple) else (HTTPStatus.OK, result)
+            )
+            self._send_json(status, body)
+        except ApiError as e:
+            self._send_json(e.status, e.body)
+        except Exception as e:
+            # logged even without --verbose (log_error is not: it also
+            # reports every idle keep-alive connection timing out)
+            super().log_message("%s failed: %r", self.path, e)
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+
+    def end_headers(self):
+        if self.close_connection or self.server.crowded():
+            # also sets close_connection
+            self.send_header("Connection", "close")
+        super().end_headers()
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, rows):
+        # the first page is read before the headers go out, so a bad
+        # query still gets a plain 400
+        rows = iter(rows)
+        first = next(rows, None)
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        lines = []
+        try:
+            if first is not None:
+                lines.append(json.dumps(first, default=str))
+                for row in rows:
+                    lines.append(json.dumps(row, default=str))
+                    if len(lines) == MAX_LIMIT:
+                        self._send_chunk("\n".join(lines) + "\n")
+                        lines = []
+            if lines:
+                self._send_chunk("\n".join(lines) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except Exception as e:
+            # the 200 is already out: a second response would corrupt the
+            # stream, so drop the connection without the closing chunk and
+            # the client sees the body cut short
+            super().log_message("%s failed mid-stream: %r", self.path, e)
+            self.close_connection = True
+
+    def _send_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+class ApiServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer whose requests run on a fixed pool of worker
+    threads; PatientStore gives each worker one connection, kept open
+    and reused across requests.
+    """
+
+    daemon_threads = True
+    request_queue_size = BACKLOG
+
+    def __init__(self, address, store, workers=WORKERS, verbose=False):
+        super().__init__(address, ApiHandler)
+        self.store = store
+        self.writer = WriteQueue(store)
+        self.api = PatientApi(store, self.writer)
+        self.verbose = verbose
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="prms-api")
+        self._waiting = 0
+        self._waiting_lock = Lock()
+
+    def process_request(self, request, client_address):
+        with self._waiting_lock:
+            self._waiting += 1
+        self._pool.submit(self._serve, request, client_address)
+
+    def _serve(self, request, client_address):
+        with self._waiting_lock:
+            self._waiting -= 1
+        self.process_request_thread(request, client_address)
+
+    def crowded(self):
+        """True while accepted connections are waiting for a worker."""
+        return self._waiting > 0
+
+    def server_close(self):
+        super().server_close()
+        self._pool.shutdown(wait=True)
+        self.writer.close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    host, port = HOST, PORT
+    if "--host" in args:
+        host = args[args.index("--host") + 1]
+    if "--port" in args:
+        port = int(args[args.index("--port") + 1])
+    store = PatientStore(cache=False)
+    store.ensure_schema()
+    server = ApiServer((host, port), store, verbose="--verbose" in args)
+    print(f"PRMS API on http://{host}:{port}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
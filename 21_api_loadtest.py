@@ -0,0 +1,172 @@
+# api_loadtest.py
+"""
+Load test for api_server.py: concurrent keep-alive clients.
+
+Without --url it builds a synthetic database (prms_bench.make_db) and
+starts ApiServer on it in this process; with --url it drives a server
+that is already running.  Every client holds one HTTP/1.1 connection
+and loops over a mix of searches, record lookups and report stats (and
+adds, with --writes) until the time is up.  Prints requests per second
+and p50/p95 latency per endpoint.
+
+    python api_loadtest.py                      # 100k rows, 32 clients, 10 s
+    python api_loadtest.py --rows 500000 --clients 64 --seconds 30
+    python api_loadtest.py --url http://127.0.0.1:8765 --writes
+"""
+
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlsplit
+
+from prms_bench import FIRST, LAST, make_db
+from validation import DISEASES
+
+ROWS = 100_000
+CLIENTS = 32
+SECONDS = 10
+SEARCHES = [
+    "disease:diabetes",
+    "age:50-70",
+    "disease:asthma age:>60",
+    "khan",
+    "priya sharma",
+]
+# share of requests per kind; "add" only with --writes
+MIX = [("search", 60), ("get", 30), ("stats", 5), ("add", 5)]
+
+
+def _pick(rng, mix):
+    kinds = [k for k, _ in mix]
+    return rng.choices(kinds, weights=[w for _, w in mix])[0]
+
+
+def _new_patient(rng):
+    return {
+        "name": f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+        "age": rng.randint(1, 90),
+        "gender": rng.choice(["Male", "Female"]),
+        "phone": str(rng.randint(6000000000, 9999999999)),
+        "disease": rng.choice(DISEASES),
+        "type": rng.choice(["Chronic", "Acute"]),
+        "admission_date": "2024-%02d-%02d" % (rng.randint(1, 12), rng.randint(1, 28)),
+        "allow_duplicate": True,
+    }
+
+
+def client(host, port, deadline, max_id, mix, seed, results):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    times = {}
+    errors = 0
+    while time.perf_counter() < deadline:
+        kind = _pick(rng, mix)
+        method, body = "GET", None
+        if kind == "search":
+            path = "/patients?q=" + quote(rng.choice(SEARCHES))
+        elif kind == "get":
+            path = "/patients/%d" % rng.randint(1, max_id)
+        elif kind == "stats":
+            path = "/stats"
+        else:
+            method, path = "POST", "/patients"
+            body = json.dumps(_new_patient(rng))
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            # 4xx counts too: a rejected add or a missing id is a
+            # request the server did not serve
+            if not 200 <= response.status < 300:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        times.setdefault(kind, []).append(time.perf_counter() - started)
+    conn.close()
+    results.append((times, errors))
+
+
+def run(host, port, clients, seconds, max_id, writes):
+    mix = MIX if writes else [(k, w) for k, w in MIX if k != "add"]
+    results = []
+    deadline = time.perf_counter() + seconds
+    threads = [
+        threading.Thread(
+            target=client,
+            args=(host, port, deadline, max_id, mix, i, results),
+        )
+        for i in range(clients)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    report(results, elapsed, clients)
+
+
+def report(results, elapsed, clients):
+    by_kind = {}
+    errors = 0
+    for times, n in results:
+        errors += n
+        for kind, values in times.items():
+            by_kind.setdefault(kind, []).extend(values)
+    total = sum(len(v) for v in by_kind.values())
+    print(
+        f"{clients} clients, {elapsed:.1f}s: {total} requests, "
+        f"{total / elapsed:,.0f} req/s, {errors} errors"
+    )
+    for kind, values in sorted(by_kind.items()):
+        values.sort()
+        p50 = values[len(values) // 2] * 1000
+        p95 = values[int(len(values) * 0.95)] * 1000
+        print(
+            f"  {kind:<7} {len(values):>8} {len(values) / elapsed:>8,.0f}/s  "
+            f"p50 {p50:7.1f} ms  p95 {p95:7.1f} ms"
+        )
+
+
+def _arg(args, name, default, kind=int):
+    if name in args:
+        return kind(args[args.index(name) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    rows = _arg(args, "--rows", ROWS)
+    clients = _arg(args, "--clients", CLIENTS)
+    seconds = _arg(args, "--seconds", SECONDS, float)
+    writes = "--writes" in args
+    url = _arg(args, "--url", None, str)
+    if url:
+        # --rows: the highest id worth asking for
+        parts = urlsplit(url)
+        run(parts.hostname, parts.port or 80, clients, seconds, rows, writes)
+    else:
+        from api_server import ApiServer
+        from patient_store import PatientStore
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "loadtest.db")
+            print(f"building {rows} rows...")
+            make_db(path, rows)
+            server = ApiServer(("127.0.0.1", 0), PatientStore(path, cache=False))
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            try:
+                host, port = server.server_address
+                run(host, port, clients, seconds, rows, writes)
+            finally:
+                server.shutdown()
+                server.server_close()
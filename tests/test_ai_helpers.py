@@ -0,0 +1,34 @@
+import importlib.util
+import os
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+spec = importlib.util.spec_from_file_location(
+    "ai_helpers", os.path.join(HERE, os.pardir, "02_ai_helpers.py")
+)
+ai_helpers = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(ai_helpers)
+
+
+def test_admission_recommendation_array_matches_scalar():
+    rows = [
+        (30, "Asthma", 0, None),
+        (70, "Asthma", 0, ""),
+        (40, "Migraine", 1, "Complains of CHEST PAIN at night"),
+        (52, "Diabetes", 1, "stable"),
+    ]
+    ages, diseases, chronic, notes = zip(*rows)
+    ranks = ai_helpers.risk_rank_array(ages, diseases, chronic)
+    advice = ai_helpers.admission_recommendation_array(ranks, list(notes))
+    assert list(advice) == [
+        ai_helpers.admission_recommendation(a, d, c, n) for a, d, c, n in rows
+    ]
+
+
+def test_admission_recommendation_array_one_long_note():
+    # one long note among many short ones must not size every row to it
+    n = 50000
+    notes = ["ok"] * (n - 1) + ["x" * 200_000 + " breathless"]
+    ranks = ai_helpers.risk_rank_array([30] * n, ["Asthma"] * n, [0] * n)
+    advice = ai_helpers.admission_recommendation_array(ranks, notes)
+    assert advice[-1] == "Recommend urgent admission"
+    assert advice[0] == "Outpatient / Monitor"
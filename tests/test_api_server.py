@@ -0,0 +1,127 @@
+import http.client
+import json
+import threading
+
+import pytest
+from conftest import make_record
+
+from api_server import ApiServer
+from patient_store import PatientStore
+
+FORM = {
+    "name": "Farhan Ali",
+    "age": 64,
+    "gender": "Male",
+    "phone": "9876543210",
+    "disease": "diabetes",
+    "type": "Chronic",
+    "admission_date": "2024-03-01",
+    "notes": "follow up on sugar levels",
+}
+
+
+@pytest.fixture
+def server(store):
+    srv = ApiServer(("127.0.0.1", 0), PatientStore(store.db_path, cache=False))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def call(server):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+
+    def call(method, path, body=None):
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body)
+        conn.request(method, path, body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        data = response.read()
+        ctype = response.getheader("Content-Type")
+        if ctype == "application/json":
+            data = json.loads(data)
+        return response.status, data
+
+    yield call
+    conn.close()
+
+
+def test_add_then_get(call):
+    status, body = call("POST", "/patients", FORM)
+    assert status == 201
+    status, record = call("GET", "/patients/%d" % body["id"])
+    assert status == 200
+    # validation canonicalized the disease name
+    assert record["disease"] == "Diabetes"
+    assert record["notes"] == FORM["notes"]
+    assert record["followup_date"] == body["followup_date"]
+    assert record["history"] == [
+        {"admission_date": "2024-03-01", "disease": "Diabetes", "chronic": 1}
+    ]
+
+
+def test_add_rejects_invalid_forms_and_duplicates(call):
+    status, body = call("POST", "/patients", dict(FORM, phone="12"))
+    assert status == 400 and "10 digits" in body["error"]
+    assert call("POST", "/patients", b"{not json")[0] == 400
+    assert call("POST", "/patients", [FORM])[0] == 400
+
+    assert call("POST", "/patients", FORM)[0] == 201
+    status, body = call("POST", "/patients", FORM)
+    assert status == 409
+    assert body["duplicates"][0]["type"] == "phone"
+    assert call("POST", "/patients", dict(FORM, allow_duplicate=True))[0] == 201
+
+
+def test_search_pages_with_a_cursor(store, call):
+    store.insert_many(
+        [make_record("Diab %d" % i, age=60 + i) for i in range(5)]
+        + [make_record("Asthma", disease="Asthma")]
+    )
+    status, page = call("GET", "/patients?q=disease:diab%20age:%3E60&limit=2")
+    assert status == 200
+    seen = [r["name"] for r in page["rows"]]
+    while page["next"]:
+        page = call(
+            "GET", "/patients?q=disease:diab%20age:%3E60&limit=2&after=" + page["next"]
+        )[1]
+        seen += [r["name"] for r in page["rows"]]
+    assert seen == ["Diab 1", "Diab 2", "Diab 3", "Diab 4"]
+
+    status, body = call("GET", "/patients?q=age:old")
+    assert status == 400 and "Age" in body["error"]
+    assert call("GET", "/patients?after=x")[0] == 400
+
+
+def test_stream_returns_every_match(store, call):
+    store.insert_many([make_record("P%d" % i) for i in range(1500)])
+    status, data = call("GET", "/patients?q=disease:diab&stream=1")
+    assert status == 200
+    rows = [json.loads(line) for line in data.decode().splitlines()]
+    assert len(rows) == 1500
+    assert rows[0]["disease"] == "Diabetes"
+    # the connection is still usable after the chunked response
+    assert call("GET", "/stats")[0] == 200
+
+
+def test_stream_failing_midway_is_cut_short(server, call):
+    def broken(query):
+        yield from ({"id": i} for i in range(1500))
+        raise RuntimeError("disk gone")
+
+    server.api.stream = broken
+    with pytest.raises(http.client.IncompleteRead):
+        call("GET", "/patients?stream=1")
+
+
+def test_lookup_errors_and_stats(store, call):
+    assert call("GET", "/patients/99")[0] == 404
+    assert call("GET", "/patients/abc")[0] == 404
+    assert call("GET", "/nowhere")[0] == 404
+    store.insert(make_record())
+    status, stats = call("GET", "/stats")
+    assert status == 200
+    assert stats["total"] == 1 and stats["chronic"] == 1
+    assert stats["behind"] == 0
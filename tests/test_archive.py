@@ -0,0 +1,79 @@
+import datetime
+from contextlib import contextmanager
+
+import pytest
+from conftest import make_record
+
+import archive
+from patient_store import PatientStore, day_number
+
+CUTOFF = day_number(datetime.date(2023, 1, 1))
+
+
+class Crash(Exception):
+    pass
+
+
+def _old_and_new(store):
+    old = store.insert_many(
+        [
+            make_record("Old %d" % i, admission_date="2021-02-%02d" % (i + 1))
+            for i in range(4)
+        ]
+    )
+    store.update(
+        old[0], make_record("Old 0", admission_date="2021-02-01", notes="x" * 500)
+    )
+    new = store.insert(make_record("New", admission_date="2024-05-01"))
+    return old, new
+
+
+def test_archive_moves_old_rows_by_year(store):
+    old, new = _old_and_new(store)
+    assert archive.archive_before(store, CUTOFF, batch_size=3) == {2021: 4}
+    conn = store.connect()
+    assert [r[0] for r in conn.execute("SELECT id FROM patients")] == [new]
+    assert store.archive_years() == [2021]
+    # archived rows are still found, notes included
+    assert store.get(old[0])[8] == "x" * 500
+    patients, _ = store.archive_sources()
+    assert conn.execute("SELECT COUNT(*) FROM " + patients).fetchone()[0] == 5
+
+
+def test_move_finishes_after_a_crash_between_its_steps(store, monkeypatch):
+    old, new = _old_and_new(store)
+    real = store.transaction
+    entered = []
+
+    @contextmanager
+    def crash_on_second(*args):
+        entered.append(1)
+        if len(entered) == 2:
+            raise Crash()
+        with real(*args) as conn:
+            yield conn
+
+    monkeypatch.setattr(store, "transaction", crash_on_second)
+    with pytest.raises(Crash):
+        archive.archive_before(store, CUTOFF)
+    monkeypatch.undo()
+
+    # restarted: the batch is in both files, the views show it once
+    store = PatientStore(store.db_path)
+    conn = store.connect()
+    patients, _ = store.archive_sources()
+    cold = store._archive_schemas()[0] + ".patients"
+    assert conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == 5
+    assert conn.execute("SELECT COUNT(*) FROM " + cold).fetchone()[0] == 4
+    assert conn.execute("SELECT COUNT(*) FROM " + patients).fetchone()[0] == 5
+    # an edit made before the rerun is what ends up archived
+    store.update(old[1], make_record("Old 1 edited", admission_date="2021-02-02"))
+
+    assert archive.archive_before(store, CUTOFF) == {2021: 4}
+    assert [r[0] for r in conn.execute("SELECT id FROM patients")] == [new]
+    patients, _ = store.archive_sources()
+    assert conn.execute("SELECT COUNT(*) FROM " + patients).fetchone()[0] == 5
+    assert store.get(old[1])[1] == "Old 1 edited"
+    assert store.get(old[0])[8] == "x" * 500
+    # a run with nothing left to move is a no-op
+    assert archive.archive_before(store, CUTOFF) == {}
@@ -0,0 +1,53 @@
+import gzip
+import os
+import sqlite3
+
+from conftest import make_record
+
+import backup
+
+
+def test_claim_is_taken_once_per_half_interval(store, monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(backup.time, "time", lambda: now[0])
+    assert backup.claim(store.db_path, interval=3600)
+    assert not backup.claim(store.db_path, interval=3600)
+    now[0] += 1801
+    assert backup.claim(store.db_path, interval=3600)
+    # a released claim can be taken again right away
+    backup.release(store.db_path)
+    assert backup.claim(store.db_path, interval=3600)
+
+
+def test_rotate_keeps_the_newest_backups(tmp_path):
+    names = [
+        "prms-20240101-010000.db",
+        "prms-20240102-010000.db.gz",
+        "prms-20240103-010000.db",
+        "prms-20240104-010000.db.part",
+        "notes.db",
+    ]
+    for name in names:
+        (tmp_path / name).write_bytes(b"")
+    removed = backup.rotate(str(tmp_path), keep=2)
+    assert [os.path.basename(p) for p in removed] == ["prms-20240101-010000.db"]
+    assert sorted(os.listdir(tmp_path)) == sorted(names[1:])
+    # keep=0 means keep everything, not delete everything
+    assert backup.rotate(str(tmp_path), keep=0) == []
+
+
+def test_backup_database_writes_a_verified_copy(store, tmp_path):
+    store.insert_many([make_record("P%d" % i) for i in range(50)])
+    directory = str(tmp_path / "backups")
+    path, restarts = backup.backup_database(
+        store.db_path, directory, gzip_copy=True, sleep=0
+    )
+    assert path.endswith(".db.gz") and restarts == 0
+    assert os.listdir(directory) == [os.path.basename(path)]
+
+    copy = str(tmp_path / "restored.db")
+    with gzip.open(path) as src, open(copy, "wb") as dst:
+        dst.write(src.read())
+    conn = sqlite3.connect(copy)
+    assert conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0] == 50
+    conn.close()
@@ -0,0 +1,43 @@
+from conftest import make_record
+
+import dedupe
+
+
+def test_soundex():
+    assert dedupe.soundex("Robert") == "R163"
+    assert dedupe.soundex("Rupert") == "R163"
+    # h and w do not separate letters with the same code
+    assert dedupe.soundex("Ashcraft") == "A261"
+    # the first letter's own code is not repeated
+    assert dedupe.soundex("Pfister") == "P236"
+    assert dedupe.soundex("Lee") == "L000"
+    assert dedupe.soundex("42") == ""
+
+
+def test_name_code_ignores_token_order_and_spelling():
+    assert dedupe.name_code("Farhan Ali") == dedupe.name_code("Ali Farhaan")
+
+
+def test_similarity():
+    new = {
+        "name": "Farhan Ali",
+        "age": 40,
+        "phone": "9876543210",
+        "disease": "Asthma",
+        "admission_date": "2024-01-10",
+    }
+    assert dedupe.similarity(new, dict(new)) == 1.0
+    near = dict(new, name="Farhaan Ali", phone="9000003210", age=41)
+    assert dedupe.MIN_SCORE <= dedupe.similarity(new, near) < 1.0
+    other = dict(new, name="Priya Sharma", phone="", age=12, disease="Flu")
+    assert dedupe.similarity(new, other) < dedupe.MIN_SCORE
+    assert dedupe.similarity(new, near) == dedupe.similarity(near, new)
+
+
+def test_store_finds_fuzzy_duplicates_by_blocking_key(store):
+    pid = store.insert(make_record("Farhaan Ali", age=41, phone="9000003210"))
+    store.insert(make_record("Priya Sharma", age=12, phone="9111111111"))
+    found = store.find_duplicates(
+        "Farhan Ali", "9876543210", "Diabetes", 40, "2024-03-01"
+    )
+    assert [(d["type"], d["id"]) for d in found] == [("similar", pid)]
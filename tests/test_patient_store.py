@@ -0,0 +1,100 @@
+import datetime
+import sqlite3
+
+import pytest
+from conftest import make_record
+
+import patient_store
+from patient_store import MIGRATIONS, PatientStore
+
+
+def _page_all(store, **kwargs):
+    rows, cursor = store.search_page(limit=3, **kwargs)
+    pages = [rows]
+    while cursor is not None:
+        rows, cursor = store.search_page(after=cursor, limit=3, **kwargs)
+        pages.append(rows)
+    return pages
+
+
+def test_keyset_pages_cover_every_row_once(store):
+    ids = store.insert_many(
+        [make_record("Patient %d" % i, age=20 + i % 7) for i in range(10)]
+    )
+    pages = _page_all(store)
+    assert [len(p) for p in pages] == [3, 3, 3, 1]
+    assert [r[0] for p in pages for r in p] == ids
+
+
+def test_keyset_pages_by_other_key_break_ties_on_id(store):
+    store.insert_many([make_record("P%d" % i, age=30 + i % 3) for i in range(8)])
+    pages = _page_all(store, order_key="age", where="age > ?", params=(30,))
+    rows = [r for p in pages for r in p]
+    assert [(r[2], r[0]) for r in rows] == sorted((r[2], r[0]) for r in rows)
+    assert len(rows) == 5
+    # the order key is only used for the cursor, not returned
+    assert all(len(r) == len(patient_store.LIST_COLUMNS.split(", ")) for r in rows)
+
+
+def test_migrates_an_unversioned_database(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(patient_store.SCHEMA)
+    conn.execute(
+        "INSERT INTO patients (name, age, gender, phone, disease, chronic, "
+        "admission_date, notes) VALUES "
+        "('Ravi Kumar', 61, 'Male', '9123456780', 'Asthma', 1, '2023-05-02', "
+        "?)",
+        ("wheezing " * 100,),
+    )
+    conn.commit()
+    conn.close()
+
+    store = PatientStore(path)
+    store.ensure_schema()
+    conn = store.connect()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == MIGRATIONS[-1][0]
+    # notes moved to patient_notes (compressed), backfills filled in
+    assert conn.execute("SELECT notes FROM patients").fetchone()[0] is None
+    assert store.get(1)[8] == "wheezing " * 100
+    assert conn.execute("SELECT person_id FROM patients").fetchone()[0]
+    assert conn.execute("SELECT COUNT(*) FROM dup_keys").fetchone()[0]
+    day = conn.execute("SELECT admission_day FROM patients").fetchone()[0]
+    assert day == patient_store.day_number(datetime.date(2023, 5, 2))
+    # a second run is a no-op
+    store.ensure_schema()
+    store.close()
+
+
+def test_change_log_skips_risk_rescores(store):
+    pid = store.insert(make_record())
+    before = store.last_change()
+    with store.transaction() as conn:
+        conn.execute("UPDATE patients SET risk_rank = 2 WHERE id = ?", (pid,))
+    assert store.last_change() == before
+    store.update(pid, make_record(age=70))
+    assert store.last_change() > before
+
+
+def _trigram_ids(store, text):
+    hits = store.substring_filter(["name", "phone", "disease"], text)[2]
+    rows, _ = store.search_page(hits=hits)
+    return [r[0] for r in rows]
+
+
+def test_trigram_index_follows_writes(store):
+    if not store.has_trigram():
+        pytest.skip("SQLite without the trigram tokenizer")
+    pid = store.insert(make_record("Meera Iyer"))
+    other = store.insert(make_record("Karan Mehta", disease="Asthma"))
+    assert _trigram_ids(store, "eera") == [pid]
+    assert _trigram_ids(store, "sthm") == [other]
+
+    store.update(pid, make_record("Meena Iyer"))
+    assert _trigram_ids(store, "eera") == []
+    assert _trigram_ids(store, "eena") == [pid]
+
+    store.delete(pid)
+    assert _trigram_ids(store, "eena") == []
+    hits = store.substring_filter(["name"], "aran")[2]
+    assert store.count_capped(hits=hits) == (1, True)
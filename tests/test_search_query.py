@@ -0,0 +1,71 @@
+import datetime
+
+import pytest
+from conftest import make_record
+
+from search_query import QueryError, compile_query
+
+TODAY = datetime.date(2024, 6, 30)
+
+
+def test_terms_are_ordered_index_first():
+    q = compile_query("gender:female age:50-70 adm:2024", today=TODAY)
+    assert q.where == (
+        "admission_day BETWEEN ? AND ? AND age BETWEEN ? AND ? "
+        "AND LOWER(gender) = LOWER(?)"
+    )
+    assert q.params[2:] == (50, 70, "Female")
+    assert q.hits is None
+    # a date range pages through the date index
+    assert q.order_key == "admission_day"
+
+
+def test_substring_terms_share_one_trigram_match():
+    q = compile_query('disease:diab name:"farhan ali" age:>60', today=TODAY)
+    assert q.where == "age > ?"
+    assert q.params == (60,)
+    assert q.hits == '{name}: "farhan ali" AND {disease}: "diab"'
+    assert q.order_key == "id"
+
+
+def test_without_trigram_substrings_are_like_scans():
+    q = compile_query("disease:diab", trigram=False, today=TODAY)
+    assert (q.where, q.params, q.hits) == ("disease LIKE ?", ("%diab%",), None)
+
+
+def test_plain_text_searches_the_picked_field():
+    assert compile_query("98765", "phone", today=TODAY).hits == '{phone}: "98765"'
+    q = compile_query("khan", today=TODAY)
+    assert q.hits == '{name disease}: "khan"'
+    # loose words next to field terms search name and disease
+    q = compile_query("risk:high khan", today=TODAY)
+    assert (q.where, q.params) == ("risk_rank = ?", (0,))
+    assert q.hits == '{name disease}: "khan"'
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "age:old",
+        "gender:robot",
+        "id:x",
+        "name:r2d2",
+        "age:40 colour:red",
+        "disease:",
+        "adm:soon",
+    ],
+)
+def test_invalid_terms(text):
+    with pytest.raises(QueryError):
+        compile_query(text, today=TODAY)
+
+
+def test_compiled_query_runs_on_the_store(store):
+    want = store.insert(make_record("Farhan Ali", age=64, disease="Diabetes"))
+    store.insert(make_record("Farhan Ali", age=40, disease="Diabetes"))
+    store.insert(make_record("Priya Sharma", age=64, disease="Asthma"))
+    for trigram in (True, False):
+        q = compile_query("disease:diab age:>60", trigram=trigram, today=TODAY)
+        rows, _ = store.search_page(q.where, q.params, hits=q.hits)
+        assert [r[0] for r in rows] == [want]
+        assert store.count_capped(q.where, q.params, hits=q.hits) == (1, True)
@@ -0,0 +1,84 @@
+import sqlite3
+import threading
+
+import pytest
+from conftest import make_record
+
+import write_queue
+from write_queue import WriteQueue
+
+
+@pytest.fixture
+def writer(store):
+    w = WriteQueue(store)
+    yield w
+    w.close(timeout=10)
+
+
+def _names(store):
+    return [r[0] for r in store.connect().execute("SELECT name FROM patients")]
+
+
+def test_failing_command_rolls_back_alone(store, writer):
+    # hold the writer so the next three commands share one transaction
+    running, gate = threading.Event(), threading.Event()
+    writer.submit(lambda conn: running.set() or gate.wait(10))
+    running.wait(10)
+
+    def half_done(conn):
+        store.insert_rows(conn, [make_record("Half Done")])
+        raise ValueError("bad record")
+
+    first = writer.insert(make_record("First Patient"))
+    failed = writer.submit(half_done)
+    last = writer.insert(make_record("Last Patient"))
+    gate.set()
+
+    assert first.result(10) and last.result(10)
+    with pytest.raises(ValueError):
+        failed.result(10)
+    assert _names(store) == ["First Patient", "Last Patient"]
+    metrics = writer.metrics()
+    assert metrics["commits"] == 2
+    assert metrics["ops"] == 4
+    assert metrics["failed"] == 1
+
+
+def test_group_is_retried_while_another_connection_holds_the_lock(
+    store, writer, monkeypatch
+):
+    monkeypatch.setattr(write_queue, "BACKOFF_BASE", 0.01)
+    other = sqlite3.connect(
+        store.db_path, isolation_level=None, check_same_thread=False
+    )
+    other.execute("BEGIN IMMEDIATE")
+    done = []
+    future = writer.insert(
+        make_record("Waited Patient"), callback=lambda r, e: done.append((r, e))
+    )
+    # the first attempt needs the busy timeout to run out
+    threading.Timer(0.6, other.execute, ("COMMIT",)).start()
+
+    new_id = future.result(10)
+    other.close()
+    assert done == [(new_id, None)]
+    assert _names(store) == ["Waited Patient"]
+    assert writer.metrics()["busy_retries"] >= 1
+
+
+def test_busy_group_fails_after_the_last_retry(store, monkeypatch):
+    monkeypatch.setattr(write_queue, "BACKOFF_BASE", 0.01)
+    writer = WriteQueue(store, retries=1)
+    other = sqlite3.connect(
+        store.db_path, isolation_level=None, check_same_thread=False
+    )
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        future = writer.insert(make_record())
+        with pytest.raises(sqlite3.OperationalError):
+            future.result(10)
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+        writer.close(timeout=10)
+    assert writer.metrics()["busy_retries"] == 1